@@ -33,8 +33,11 @@ from .resources import qInitResources
 
 # Import the code for the dialog
 from .delta_lake_dialog import DeltaLakeDialog
-from .provider.delta_lake_metadata import DeltaLakeProviderMetadata
+from .provider.delta_lake_grid_provider import DeltaLakeGridProvider
+from .provider.delta_lake_metadata import DeltaLakeGridProviderMetadata, DeltaLakeProviderMetadata
 from .provider.delta_lake_provider import DeltaLakeProvider
+from .provider import load_pool
+from .provider.memory_governor import memory_governor
 
 from .__about__ import (
         __uri_homepage__,
@@ -201,6 +204,8 @@ class DeltaLake:
                 self.tr(u'&DeltaLake'),
                 action)
             self.iface.removeToolBarIcon(action)
+        load_pool.shutdown()
+        memory_governor().clear_spilled()
 
     def run(self):
         """Run method that performs all the real work"""
@@ -247,8 +252,12 @@ def register_delta_lake_provider() -> None:
     registry = QgsProviderRegistry.instance()
     provider_metadata = DeltaLakeProviderMetadata()
     registry.registerProvider(provider_metadata)
+    registry.registerProvider(DeltaLakeGridProviderMetadata())
 
     QgsProject.instance().layersWillBeRemoved.connect(_on_layers_removal)
+    QgsProject.instance().layersAdded.connect(_update_layer_visibility)
+    QgsProject.instance().readProject.connect(_update_layer_visibility)
+    QgsProject.instance().layerTreeRoot().visibilityChanged.connect(_update_layer_visibility)
 
 
 def _on_layers_removal(layer_ids: list[str]) -> None:
@@ -261,5 +270,28 @@ def _on_layers_removal(layer_ids: list[str]) -> None:
     for layer_id in layer_ids:
         layer = QgsProject.instance().mapLayer(layer_id)
         provider = layer.dataProvider()
-        if provider and provider.name() == DeltaLakeProvider.providerKey():
+        if provider and provider.name() in (
+            DeltaLakeProvider.providerKey(), DeltaLakeGridProvider.providerKey()
+        ):
             provider.disconnect_database()
+
+
+def _update_layer_visibility(*_) -> None:
+    """Tells the memory governor which tables are displayed: tables of hidden layers
+    are evicted first when the loaded tables exceed the memory budget
+    """
+    visible_loaders = {}
+    for layer_node in QgsProject.instance().layerTreeRoot().findLayers():
+        layer = layer_node.layer()
+        provider = layer.dataProvider() if layer is not None else None
+        if provider and provider.name() in (
+            DeltaLakeProvider.providerKey(), DeltaLakeGridProvider.providerKey()
+        ):
+            loader = provider.get_table_loader()
+            if loader is not None:
+                # a table shown by any of its layers is visible
+                visible_loaders[loader] = (
+                    visible_loaders.get(loader, False) or layer_node.isVisible()
+                )
+    for loader, visible in visible_loaders.items():
+        memory_governor().set_visible(loader, visible)
@@ -0,0 +1,167 @@
+"""
+    Aggregation grids: counts and column aggregates of the features of a table, by cell.
+"""
+
+# standard
+from __future__ import annotations
+
+from typing import Union
+
+# 3rd party
+import numpy as np
+import pandas as pd
+import shapely
+
+# project
+from .kernels import hex_bins, hex_centers, square_bins
+
+# shapes of the cells
+GRID_SHAPES = ("square", "hex")
+# aggregate functions of the grid_aggregates uri parameter
+GRID_FUNCTIONS = ("sum", "mean", "min", "max")
+# number of levels of the pyramid, the first one has a few cells covering the table
+GRID_LEVELS = 16
+# cell coordinates are packed in one integer: each one is shifted to be non-negative
+_KEY_OFFSET = 2 ** 26
+_KEY_SPAN = 2 ** 27
+
+
+def parse_grid_aggregates(grid_aggregates: Union[str, None]) -> tuple[tuple[str, str], ...]:
+    """Parses the grid_aggregates uri parameter
+
+    :param grid_aggregates: comma separated ``function:column`` pairs, e.g. ``sum:pop,mean:income``
+    :type grid_aggregates: Union[str, None]
+    :return: (function, column) pairs
+    :rtype: tuple
+    :raises ValueError: if a pair is malformed or its function is not supported
+    """
+    aggregates = []
+    for item in (grid_aggregates or "").split(","):
+        if not item.strip():
+            continue
+        function, separator, column = item.partition(":")
+        function, column = function.strip().lower(), column.strip()
+        if not separator or not column or function not in GRID_FUNCTIONS:
+            raise ValueError(f"Invalid grid aggregate: {item}")
+        aggregates.append((function, column))
+    return tuple(aggregates)
+
+
+def format_grid_aggregates(aggregates: tuple[tuple[str, str], ...]) -> str:
+    """Formats (function, column) pairs as the grid_aggregates uri parameter"""
+    return ",".join(f"{function}:{column}" for function, column in aggregates)
+
+
+def aggregate_field_name(function: str, column: str) -> str:
+    """Returns the name of the grid field holding an aggregate"""
+    return f"{function}_{column}"
+
+
+class AggregationGrid:
+    """Occupied cells of a grid, with the number of features in each cell and
+    aggregates of some of their columns.
+
+    Features are located by the center of their bounding box. Cells are square or
+    pointy-top hexagons of a given width, anchored at the origin of the CRS, so that
+    square grids whose sizes are powers of two nest into each other.
+
+    Use :meth:`from_points` to build a grid.
+    """
+
+    def __init__(self, shape: str, cell_size: float, cell_ids: np.ndarray, counts: np.ndarray,
+                 values: dict[str, np.ndarray]):
+        self.shape = shape
+        self.cell_size = cell_size
+        self.cell_ids = cell_ids
+        self.counts = counts
+        self.values = values
+        columns = cell_ids // _KEY_SPAN - _KEY_OFFSET
+        rows = cell_ids % _KEY_SPAN - _KEY_OFFSET
+        if shape == "hex":
+            self.polygons, self.bounds = self._hexagons(columns, rows)
+        else:
+            self.polygons, self.bounds = self._squares(columns, rows)
+
+    @classmethod
+    def from_points(cls, x: np.ndarray, y: np.ndarray, shape: str, cell_size: float,
+                    columns: dict[tuple[str, str], pd.Series]) -> AggregationGrid:
+        """Bins points into the cells of a grid
+
+        :param x: x coordinates, NaN for features without geometry, which are left out
+        :type x: np.ndarray
+        :param y: y coordinates
+        :type y: np.ndarray
+        :param shape: shape of the cells, one of GRID_SHAPES
+        :type shape: str
+        :param cell_size: width of the cells, in the units of the coordinates
+        :type cell_size: float
+        :param columns: values to aggregate by (function, column), aligned with the points
+        :type columns: dict
+        """
+        located = np.isfinite(x) & np.isfinite(y)
+        bins = hex_bins if shape == "hex" else square_bins
+        grid_columns, grid_rows = bins(x[located], y[located], cell_size)
+        keys = (grid_columns + _KEY_OFFSET) * _KEY_SPAN + (grid_rows + _KEY_OFFSET)
+        codes, cell_ids = pd.factorize(keys, sort=True)
+        counts = np.bincount(codes, minlength=len(cell_ids))
+        values = {}
+        for (function, column_name), column in columns.items():
+            # nulls are skipped, a cell without values gets a null aggregate
+            numbers = pd.to_numeric(column, errors="coerce").to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+            grouped = pd.Series(numbers[located]).groupby(codes)
+            if function == "sum":
+                aggregated = grouped.sum(min_count=1)
+            else:
+                aggregated = grouped.agg(function)
+            values[aggregate_field_name(function, column_name)] = \
+                aggregated.reindex(np.arange(len(cell_ids))).to_numpy()
+        return cls(shape, cell_size, np.asarray(cell_ids, dtype=np.int64), counts, values)
+
+    def _squares(self, columns: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        bounds = np.column_stack(
+            (columns, rows, columns + 1, rows + 1)
+        ).astype(np.float64) * self.cell_size
+        return shapely.to_wkb(shapely.box(*bounds.T)), bounds
+
+    def _hexagons(self, columns: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        center_x, center_y = hex_centers(columns, rows, self.cell_size)
+        radius = self.cell_size / np.sqrt(3)
+        # vertices of pointy-top hexagons, the first one repeated to close the ring
+        angles = np.deg2rad(30 + 60 * np.arange(7))
+        coordinates = np.stack((
+            center_x[:, None] + radius * np.cos(angles),
+            center_y[:, None] + radius * np.sin(angles),
+        ), axis=-1)
+        bounds = np.column_stack((
+            center_x - self.cell_size / 2, center_y - radius,
+            center_x + self.cell_size / 2, center_y + radius,
+        ))
+        return shapely.to_wkb(shapely.polygons(coordinates)), bounds
+
+    def __len__(self) -> int:
+        return len(self.cell_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.cell_ids.nbytes + self.counts.nbytes + self.bounds.nbytes
+            + sum(values.nbytes for values in self.values.values())
+            + sum(len(polygon) for polygon in self.polygons)
+        )
+
+    def cells_in_rect(self, rect: tuple[float, float, float, float]) -> np.ndarray:
+        """Returns the positions of the cells intersecting a rectangle"""
+        xmin, ymin, xmax, ymax = rect
+        return np.flatnonzero(
+            (self.bounds[:, 0] <= xmax) & (self.bounds[:, 2] >= xmin)
+            & (self.bounds[:, 1] <= ymax) & (self.bounds[:, 3] >= ymin)
+        )
+
+    def cells_for_ids(self, cell_ids) -> np.ndarray:
+        """Returns the positions of the cells with some ids, unknown ids are ignored"""
+        cell_ids = np.asarray(list(cell_ids), dtype=np.int64)
+        positions = np.searchsorted(self.cell_ids, cell_ids)
+        positions = positions[positions < len(self.cell_ids)]
+        return np.unique(positions[np.isin(self.cell_ids[positions], cell_ids)])
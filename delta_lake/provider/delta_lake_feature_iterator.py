@@ -2,18 +2,145 @@
 from __future__ import (
     annotations,   # used to manage type annotation for method that return Self in Python < 3.11
 )
+import queue
+import threading
+import time
+import weakref
+from typing import Union
+
+# 3rd party
+import numpy as np
 
 # PyQGIS
 from qgis.core import (
     QgsAbstractFeatureIterator,
     QgsCoordinateTransform,
+    QgsCsException,
     QgsFeature,
     QgsFeatureRequest,
     QgsGeometry,
-    QgsPoint,
+    QgsSimplifyMethod,
+    QgsUnitTypes,
 )
 
-from shapely import wkt, wkb, from_wkb, from_wkt
+from .indexes import ExpressionPlanner
+from .kernels import python_values, sortable
+from .toolbelt.instrumentation import instrumentation
+
+# number of features prepared at once
+BATCH_SIZE = 4096
+# number of prepared batches the read-ahead worker may hold, bounding its memory use
+READ_AHEAD_BATCHES = 2
+# in the thinned display mode, number of features below which all of them are rendered
+THINNING_MIN_FEATURES = 100000
+# field of thinned layers holding the number of features each rendered feature stands for
+THINNED_COUNT_FIELD = "thinned_count"
+# resolution used to estimate the size of a pixel from the map scale
+_REFERENCE_DPI = 96
+
+
+def units_per_pixel(request: QgsFeatureRequest, crs) -> Union[float, None]:
+    """Returns the size of a pixel of the map rendering a request comes from
+
+    :param request: feature request
+    :type request: QgsFeatureRequest
+    :param crs: CRS of the layer, the size is given in its units
+    :type crs: QgsCoordinateReferenceSystem
+    :return: size of a pixel, None if the request does not come from a map rendering
+    :rtype: Union[float, None]
+    """
+    context = request.expressionContext()
+    if context is None or not context.hasVariable("map_scale"):
+        return None
+    simplify_method = request.simplifyMethod()
+    if simplify_method.methodType() != QgsSimplifyMethod.NoSimplification \
+            and simplify_method.tolerance() > 0:
+        # renderers ask for geometries simplified to the size of a pixel
+        pixel_size = simplify_method.tolerance()
+    else:
+        meters_per_pixel = float(context.variable("map_scale")) * 0.0254 / _REFERENCE_DPI
+        pixel_size = meters_per_pixel * QgsUnitTypes.fromUnitToUnitFactor(
+            QgsUnitTypes.DistanceMeters, crs.mapUnits()
+        )
+    return pixel_size if pixel_size > 0 else None
+
+
+class _ReadAheadReader:
+    """Prepares the next batches of an iterator on a worker thread.
+
+    While the iterator hands out batch N, the worker prepares batch N+1. The queue
+    between them is bounded, so the worker never gets more than
+    ``READ_AHEAD_BATCHES`` batches ahead.
+
+    The worker only holds a weak reference to the iterator: an iterator dropped
+    without being closed, e.g. by a cancelled rendering, stops its worker.
+
+    :param iterator: iterator whose batches are prepared, with its _prepare_batch function
+    :type iterator: DeltaLakeFeatureIterator
+    :param count: number of features to prepare
+    :type count: int
+    """
+
+    _END = object()
+
+    def __init__(self, iterator: DeltaLakeFeatureIterator, count: int):
+        self._queue = queue.Queue(maxsize=READ_AHEAD_BATCHES)
+        self._stopped = threading.Event()
+        self._iterator = weakref.ref(iterator)
+        self._finalizer = weakref.finalize(iterator, self._stopped.set)
+        self._thread = threading.Thread(
+            target=self._run, args=(count,), name="delta_lake_read_ahead", daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stopped.is_set() and self._iterator() is not None:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, count: int) -> None:
+        try:
+            for start in range(0, count, BATCH_SIZE):
+                iterator = self._iterator()
+                if iterator is None or self._stopped.is_set():
+                    return
+                batch = iterator._prepare_batch(start, min(start + BATCH_SIZE, count))
+                # not kept while waiting for room in the queue
+                del iterator
+                if not self._put(batch):
+                    return
+        except Exception as exc:
+            self._put(exc)
+        self._put(self._END)
+
+    def next_batch(self) -> list:
+        """Returns the next prepared batch, an empty one at the end"""
+        if self._stopped.is_set():
+            return []
+        item = self._queue.get()
+        if item is self._END:
+            self._stopped.set()
+            return []
+        if isinstance(item, Exception):
+            self._stopped.set()
+            raise item
+        return item
+
+    def stop(self) -> None:
+        """Stops the worker and drops the batches it prepared"""
+        self._finalizer.detach()
+        self._stopped.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+
 
 class DeltaLakeFeatureIterator(QgsAbstractFeatureIterator):
     def __init__(
@@ -22,29 +149,39 @@ class DeltaLakeFeatureIterator(QgsAbstractFeatureIterator):
         request: QgsFeatureRequest,
     ):
         """Constructor"""
-        # FIXME: Handle QgsFeatureRequest.FilterExpression
         super().__init__(request)
         self._index = None
-        self._iterator_tuples = None
-        self._provider = source.get_provider()
-        self._index_geometry_column = self._provider.get_index_geometry_column()
-        ### !TODO
+        self._rows = None
+        self._filter_resolved = False
+        # features each row stands for in a thinned rendering, aligned with _rows
+        self._counts = None
+        self._table = None
+        self._geometries = None
+        self._batch = []
+        self._batch_position = 0
+        self._batch_start = 0
+        self._read_ahead_reader = None
+        self._source = source
+        # fields of the source, read when iterating starts
         self._current_fields = None
         self._iter_cnt = 0
         self._iter_max = None
+        self._iteration_start = None
 
-        if not self._provider.isValid():
+        if not self._source.isValid():
             return
 
         self._request = request if request is not None else QgsFeatureRequest()
+        self._limit = self._request.limit()
+        self._select_paths()
         self._transform = QgsCoordinateTransform()
 
         if (
             self._request.destinationCrs().isValid()
-            and self._request.destinationCrs() != self._provider.crs()
+            and self._request.destinationCrs() != self._source.crs()
         ):
             self._transform = QgsCoordinateTransform(
-                self._provider.crs(),
+                self._source.crs(),
                 self._request.destinationCrs(),
                 self._request.transformContext(),
             )
@@ -58,60 +195,417 @@ class DeltaLakeFeatureIterator(QgsAbstractFeatureIterator):
         :return: True if success
         :rtype: bool
         """
-        if not self._provider.isValid():
+        if not self._source.isValid():
             f.setValid(False)
             return False
 
-        if self._index >= self._iter_max:
-            f.setValid(False)
-            raise StopIteration
-
-        next_result = self._iterator_tuples[self._index]
+        if self._batch_position >= len(self._batch):
+            self._batch = self._next_batch()
+            self._batch_position = 0
+            if not self._batch:
+                f.setValid(False)
+                return False
+        fid, attributes, geometry_wkb = self._batch[self._batch_position]
+        self._batch_position += 1
 
         f.setFields(self._current_fields)
 
         f.setValid(True)
 
-        # try:
-        #     wktstring = from_wkb(next_result[self._index_geometry_column]).wkt
-        #     #wkbblob = from_wkb(next_result[self._index_geometry_column]).wkb
-        # except:
-        #     wktstring = 'POLYGONZ (200000 6700000 0, 200000 6700010 0, 200010 6700010 0, 200000 6700000 0)'
-        #     #wkbblob = b'01030000000100000008000000c8826e431ca40f416bb568ccfc105941d06f1a7513a40f4145b5232cfd105941207bdf49f4a30f41af963e74fc105941d4973318fda30f41b8968314fc105941d4973318fda30f41be968314fc1059419eb587e605a40f41ed96c8b4fb1059411a23eb0f25a40f41f86f0a6cfc105941c8826e431ca40f416bb568ccfc105941'
-        # geometry = QgsGeometry.fromWkt(wktstring)
+        if attributes is not None:
+            f.setAttributes(attributes)
 
-        geom_update: QgsGeometry = f.geometry()  # gets feature's existing geometry
-        geom_update.fromWkb(next_result[self._index_geometry_column])  # overwrites geometry from wkb
-        f.setGeometry(geom_update)
+        if self._fetch_geometry:
+            if geometry_wkb is None:
+                f.clearGeometry()
+            else:
+                geom_update: QgsGeometry = f.geometry()  # gets feature's existing geometry
+                geom_update.fromWkb(geometry_wkb)  # overwrites geometry from wkb
+                f.setGeometry(geom_update)
 
-        # !TODO - trenger vi å transformere geo?
-        self.geometryToDestinationCrs(f, self._transform)
+                # to the destination CRS of the request, if any: an invalid transform
+                # leaves the geometry as is
+                self.geometryToDestinationCrs(f, self._transform)
 
-        f.setId(self._index)
+        f.setId(fid)
         self._index += 1
 
-        # for i in range(len(self._provider.fields())):
-        #     if i < 1:
-        #         pass
-        #     if self._index < 3:
-        #         pass
-        #     else:
-        #         f.setAttribute(i, next_result[i])
-        #
         return True
 
     def __iter__(self) -> DeltaLakeFeatureIterator:
         """Returns self as an iterator object"""
         self._iter_cnt = self._iter_cnt + 1
-        # !TODO -remove this-
-        print(f'-- Feature iterator {self._iter_cnt} --')
-        self._current_fields = self._provider.fields()
-        df = self._provider.get_dataframe()
-        self._iter_max = len(df.index)
-        self._iterator_tuples = df.values.tolist()
-        self._index = 0
+        layer = self._source.layer_key()
+        instrumentation.count(layer, "iterators_opened")
+        if instrumentation.timing:
+            self._iteration_start = time.perf_counter()
+        self._current_fields = self._source.fields()
+        # a limit-only request does not need the whole table: only the first rows are fetched
+        self._table = self._source.table(self._limit if self._is_limit_only() else -1)
+        # identical requests reuse the rows selected the first time
+        signature = self._request_signature()
+        selection = None if signature is None else self._table.request_cache().get(signature)
+        if selection is None:
+            instrumentation.count(layer, "request_cache_misses")
+            with instrumentation.timed(layer, "row_selection"):
+                selection = self._select_rows()
+            if signature is not None:
+                self._table.request_cache().put(signature, selection)
+        else:
+            instrumentation.count(layer, "request_cache_hits")
+        self._rows, self._filter_resolved, self._counts = selection
+        self._iter_max = self._table.row_count() if self._rows is None else len(self._rows)
+        # with a filter left to QGIS, features beyond the limit may still be needed
+        filter_pending = self._request.filterType() == QgsFeatureRequest.FilterExpression \
+            and not self._filter_resolved
+        if self._limit >= 0 and not filter_pending:
+            self._iter_max = min(self._iter_max, self._limit)
+        # no copy of the table: features are read by position from the geometry column
+        self._geometries = self._request_geometries() if self._fetch_geometry else None
+        self._start_batches()
         return self
 
+    def _request_geometries(self) -> np.ndarray:
+        """Returns the geometries to serve, simplified when the request asks for it.
+
+        Map renderers ask for geometries simplified to the size of a pixel: serving a
+        cached, simplified level of detail makes overview rendering proportional to
+        the screen rather than to the vertices of the table.
+        """
+        simplify_method = self._request.simplifyMethod()
+        method_type = simplify_method.methodType()
+        if (
+            method_type == QgsSimplifyMethod.NoSimplification
+            or simplify_method.forceLocalOptimization()
+            or simplify_method.tolerance() <= 0
+        ):
+            return self._table.geometries()
+        # the tolerance is given in the CRS of the layer
+        return self._table.simplified_geometries(
+            simplify_method.tolerance(), method_type == QgsSimplifyMethod.PreserveTopology
+        )
+
+    def providerCanSimplify(self, methodType) -> bool:
+        """Tells QGIS that geometries are simplified here, not once more by the iterator"""
+        return methodType in (
+            QgsSimplifyMethod.OptimizeForRendering, QgsSimplifyMethod.PreserveTopology
+        )
+
+    def _start_batches(self) -> None:
+        """Positions the iterator before its first batch"""
+        self._stop_read_ahead()
+        self._index = 0
+        self._batch = []
+        self._batch_position = 0
+        self._batch_start = 0
+        # reading ahead pays off only when there is more than one batch
+        if self._source.read_ahead() and self._iter_max > BATCH_SIZE:
+            self._read_ahead_reader = _ReadAheadReader(self, self._iter_max)
+
+    def _stop_read_ahead(self) -> None:
+        if self._read_ahead_reader is not None:
+            self._read_ahead_reader.stop()
+            self._read_ahead_reader = None
+
+    def _next_batch(self) -> list:
+        """Returns the next batch of prepared features, an empty one at the end"""
+        if self._read_ahead_reader is not None:
+            return self._read_ahead_reader.next_batch()
+        start = self._batch_start
+        stop = min(start + BATCH_SIZE, self._iter_max)
+        self._batch_start = stop
+        return self._prepare_batch(start, stop) if start < stop else []
+
+    def _select_rows(self) -> tuple[Union[np.ndarray, None], bool, Union[np.ndarray, None]]:
+        """Returns the rows to iterate over, in order, whether they exactly match the
+        filter expression of the request, and the number of features each row stands
+        for when they are thinned (None otherwise)
+        """
+        rows, filter_resolved = self._filtered_rows()
+        counts = None
+        cell_size = self._thinning_cell_size()
+        feature_count = self._table.row_count() if rows is None else len(rows)
+        if cell_size is not None and feature_count > THINNING_MIN_FEATURES:
+            filter_type = self._request.filterType()
+            if filter_type == QgsFeatureRequest.FilterNone:
+                # the grid of the whole layer is computed once per level, then clipped
+                thinned_rows, thinned_counts = self._source.thinned_rows(self._table, cell_size)
+                if rows is None:
+                    rows, counts = thinned_rows, thinned_counts
+                else:
+                    rows, _, positions = np.intersect1d(
+                        rows, thinned_rows, assume_unique=True, return_indices=True
+                    )
+                    counts = thinned_counts[positions]
+            elif filter_type == QgsFeatureRequest.FilterExpression and filter_resolved:
+                rows, counts = self._table.thinned_rows(cell_size, rows)
+        # walk the cached sort permutation instead of the table order
+        order_keys = self._order_keys(self._request.orderBy().list())
+        if order_keys:
+            permutation = self._table.order_permutation(order_keys)
+            if rows is None:
+                rows = permutation
+            else:
+                ordered_rows = permutation[np.isin(permutation, rows)]
+                if counts is not None:
+                    # rows are sorted before ordering
+                    counts = counts[np.searchsorted(rows, ordered_rows)]
+                rows = ordered_rows
+        return rows, filter_resolved, counts
+
+    def _request_signature(self) -> Union[tuple, None]:
+        """Returns the normalised signature of the rows selected by the request.
+
+        The rectangle is taken in the CRS of the table, so requests only differing by
+        their destination CRS share their selection. None if the selection cannot be
+        reused, e.g. when the filter depends on variables of the calling context.
+        """
+        request = self._request
+        filter_type = request.filterType()
+        if filter_type == QgsFeatureRequest.FilterFid:
+            filter_key = request.filterFid()
+        elif filter_type == QgsFeatureRequest.FilterFids:
+            filter_key = tuple(sorted(request.filterFids()))
+        elif filter_type == QgsFeatureRequest.FilterExpression:
+            expression = request.filterExpression()
+            if expression.referencedVariables():
+                return None
+            filter_key = expression.expression()
+        else:
+            filter_key = None
+        return (
+            filter_type,
+            filter_key,
+            self._filter_rect(),
+            bool(request.flags() & QgsFeatureRequest.ExactIntersect),
+            self._order_keys(request.orderBy().list()),
+            self._source.subset_string(),
+            self._thinning_cell_size(),
+        )
+
+    def _thinning_cell_size(self) -> Union[float, None]:
+        """Returns the size of the cells map renderings of a thinned layer are reduced
+        to, about a pixel, None if the features are not thinned.
+
+        The size is rounded down to a power of two, so that successive zoom levels
+        share a few grids.
+        """
+        if not self._source.thinned() or not self._fetch_geometry:
+            return None
+        pixel_size = units_per_pixel(self._request, self._source.crs())
+        if pixel_size is None:
+            return None
+        return 2.0 ** np.floor(np.log2(pixel_size))
+
+    def _filter_rect(self) -> Union[tuple[float, float, float, float], None]:
+        """Returns the filter rectangle of the request in the CRS of the table, None
+        without rectangle
+        """
+        rect = self._request.filterRect()
+        if rect.isNull():
+            return None
+        if self._transform.isValid():
+            try:
+                rect = self._transform.transformBoundingBox(
+                    rect, QgsCoordinateTransform.ReverseTransform
+                )
+            except QgsCsException:
+                return None
+        return rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()
+
+    def _filtered_rows(self) -> tuple[Union[np.ndarray, None], bool]:
+        """Returns the rows selected by the subset string and request filter, None for all rows.
+
+        Filter expressions are narrowed with the indexes of the table. When the indexes
+        answer the whole expression, QGIS does not evaluate it again.
+        """
+        rows = None
+        filter_resolved = False
+        if self._request.filterType() == QgsFeatureRequest.FilterFid:
+            rows = self._table.rows_for_feature_ids([self._request.filterFid()])
+        elif self._request.filterType() == QgsFeatureRequest.FilterFids:
+            rows = self._table.rows_for_feature_ids(self._request.filterFids())
+        elif self._request.filterType() == QgsFeatureRequest.FilterExpression:
+            planner = ExpressionPlanner(
+                self._table, self._current_fields, self._request.expressionContext()
+            )
+            rows, filter_resolved = planner.candidate_rows(self._request.filterExpression())
+        rect = self._filter_rect()
+        if rect is not None and self._source.index_geometry_column() is not None:
+            exact = bool(self._request.flags() & QgsFeatureRequest.ExactIntersect)
+            rect_rows = self._table.rows_in_rect(rect, exact)
+            rows = rect_rows if rows is None \
+                else np.intersect1d(rows, rect_rows, assume_unique=True)
+        subset_rows = self._source.subset_rows(self._table)
+        if subset_rows is not None:
+            rows = subset_rows if rows is None \
+                else np.intersect1d(rows, subset_rows, assume_unique=True)
+        return rows, filter_resolved
+
+    def _select_paths(self) -> None:
+        """Selects how features are prepared from the request flags.
+
+        Requests without geometry (attribute table, statistics) never read the geometry
+        column, and requests without attributes (rendering) never convert attributes.
+        """
+        fields = self._source.fields()
+        self._field_count = fields.count()
+        self._count_field = self._source.thinned_count_field()
+        flags = self._request.flags()
+        self._fetch_geometry = not (flags & QgsFeatureRequest.NoGeometry)
+        if flags & QgsFeatureRequest.SubsetOfAttributes:
+            attribute_indexes = set(self._request.subsetOfAttributes())
+        else:
+            attribute_indexes = set(range(fields.count()))
+        # attributes and geometry needed by QGIS to filter and sort the features
+        attribute_indexes |= set(self._request.orderBy().usedAttributeIndices(fields))
+        if self._request.filterType() == QgsFeatureRequest.FilterExpression:
+            filter_expression = self._request.filterExpression()
+            attribute_indexes |= set(filter_expression.referencedAttributeIndexes(fields))
+            self._fetch_geometry = self._fetch_geometry or filter_expression.needsGeometry()
+        # the geometry column is served as the feature geometry, never as an attribute
+        attribute_indexes.discard(self._source.index_geometry_column())
+        if self._source.index_geometry_column() is None:
+            self._fetch_geometry = False
+        self._attribute_indexes = sorted(attribute_indexes)
+
+        # a name rather than a bound method: the iterator would reference itself, and an
+        # iterator dropped without being closed would outlive its last reference
+        if not self._attribute_indexes:
+            self._batch_path = "_prepare_geometries_only"
+        elif not self._fetch_geometry:
+            self._batch_path = "_prepare_attributes_only"
+        else:
+            self._batch_path = "_prepare_features"
+
+    def _prepare_batch(self, start: int, stop: int) -> list:
+        """Prepares the features between two positions of the iteration, with the path
+        selected by _select_paths, recording its time and the rows it materialises
+        """
+        prepare_batch = getattr(type(self), self._batch_path)
+        if not instrumentation.timing:
+            return prepare_batch(self, start, stop)
+        layer = self._source.layer_key()
+        with instrumentation.timed(layer, "batch_preparation"):
+            batch = prepare_batch(self, start, stop)
+        instrumentation.count(layer, "rows_materialised", len(batch))
+        return batch
+
+    def _rows_between(self, start: int, stop: int) -> np.ndarray:
+        """Returns the rows of the table between two positions of the iteration"""
+        return np.arange(start, stop) if self._rows is None else self._rows[start:stop]
+
+    def _attributes(self, start: int, stop: int, rows: np.ndarray) -> list:
+        """Gathers the requested attributes of the rows between two positions of the
+        iteration, column by column
+        """
+        columns = [[None] * len(rows)] * self._field_count
+        for field_index in self._attribute_indexes:
+            if field_index == self._count_field:
+                # features not thinned stand for themselves
+                columns[field_index] = [1] * len(rows) if self._counts is None \
+                    else self._counts[start:stop].tolist()
+            else:
+                columns[field_index] = python_values(self._table.column(field_index), rows)
+        return [list(values) for values in zip(*columns)]
+
+    def _geometries_wkb(self, rows: np.ndarray) -> list:
+        """Gathers the WKB geometries of rows, normalised to bytes or None"""
+        return [
+            bytes(geometry_wkb)
+            if isinstance(geometry_wkb, (bytes, bytearray, memoryview)) and len(geometry_wkb) > 0
+            else None
+            for geometry_wkb in self._geometries.take(rows)
+        ]
+
+    # Batch preparation: everything that does not need QGIS objects is done there,
+    # so that it can run on the read-ahead worker thread. Each function returns
+    # (feature id, attributes, WKB geometry) for the features between two positions
+    # of the iteration.
+
+    def _prepare_features(self, start: int, stop: int) -> list:
+        rows = self._rows_between(start, stop)
+        fids = self._table.feature_ids(rows).tolist()
+        return list(zip(fids, self._attributes(start, stop, rows), self._geometries_wkb(rows)))
+
+    def _prepare_attributes_only(self, start: int, stop: int) -> list:
+        rows = self._rows_between(start, stop)
+        fids = self._table.feature_ids(rows).tolist()
+        return list(zip(fids, self._attributes(start, stop, rows), [None] * len(rows)))
+
+    def _prepare_geometries_only(self, start: int, stop: int) -> list:
+        rows = self._rows_between(start, stop)
+        fids = self._table.feature_ids(rows).tolist()
+        return list(zip(fids, [None] * len(rows), self._geometries_wkb(rows)))
+
+    def _order_keys(self, order_by_clauses) -> Union[tuple[tuple[str, bool, bool], ...], None]:
+        """Converts order-by clauses to sort keys, if they only refer to columns
+
+        :param order_by_clauses: clauses of the request order by
+        :type order_by_clauses: list[QgsFeatureRequest.OrderByClause]
+        :return: (column name, ascending, nulls first) for each clause, or None if
+            a clause cannot be sorted by the provider
+        :rtype: Union[tuple, None]
+        """
+        if self._table is None:
+            return None
+        order_keys = []
+        for clause in order_by_clauses:
+            expression = clause.expression()
+            if not expression.isField():
+                return None
+            field_index = self._current_fields.lookupField(
+                next(iter(expression.referencedColumns()))
+            )
+            # fields beyond the columns of the table, e.g. the thinned count, are computed
+            if field_index < 0 or field_index >= self._table.column_count():
+                return None
+            # struct and array columns are sorted by QGIS
+            if not sortable(self._table.column(field_index)):
+                return None
+            order_keys.append(
+                (
+                    self._current_fields.field(field_index).name(),
+                    clause.ascending(), clause.nullsFirst(),
+                )
+            )
+        return tuple(order_keys)
+
+    def prepareOrderBy(self, orderBys) -> bool:
+        """Tells QGIS whether the provider sorts the features itself
+
+        :param orderBys: clauses of the request order by
+        :type orderBys: list[QgsFeatureRequest.OrderByClause]
+        :return: True if all clauses are sorted by the provider
+        :rtype: bool
+        """
+        if self._current_fields is None:
+            self._current_fields = self._source.fields()
+        return self._order_keys(orderBys) is not None
+
+    def _is_limit_only(self) -> bool:
+        """Tells whether the request only asks for the first features of the table"""
+        return (
+            self._limit >= 0
+            and self._request.filterType() == QgsFeatureRequest.FilterNone
+            and self._request.filterRect().isNull()
+            and not self._request.orderBy().list()
+            and not self._source.has_subset()
+        )
+
+    def nextFeatureFilterExpression(self, f: QgsFeature) -> bool:
+        """Fetches the next feature matching the filter expression
+
+        :param f: Next feature
+        :type f: QgsFeature
+        :return: True if success
+        :rtype: bool
+        """
+        if self._filter_resolved:
+            # the rows are exactly those matching the expression
+            return self.fetchFeature(f)
+        return super().nextFeatureFilterExpression(f)
+
     def __next__(self) -> QgsFeature:
         """Returns the next value till current is lower than high"""
         f = QgsFeature()
@@ -124,12 +618,21 @@ class DeltaLakeFeatureIterator(QgsAbstractFeatureIterator):
         """reset the iterator to the starting position"""
         if self._index < 0:
             return False
-        self._index = 0
+        self._start_batches()
         return True
 
     def close(self) -> bool:
         """end of iterating: free the resources / lock"""
         # virtual bool close() = 0;
-        self._iterator_tuples = None
+        if self._iteration_start is not None:
+            layer = self._source.layer_key()
+            features = max(self._index, 0)
+            instrumentation.elapsed(layer, "iteration", self._iteration_start, features=features)
+            instrumentation.count(layer, "features_fetched", features)
+            self._iteration_start = None
+        self._stop_read_ahead()
+        self._batch = []
+        self._geometries = None
+        self._table = None
         self._index = -1
         return True
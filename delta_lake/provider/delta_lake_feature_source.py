@@ -1,42 +1,227 @@
+import threading
+import weakref
+from typing import Union
+
+import numpy as np
+
 from qgis.core import (
     QgsAbstractFeatureSource,
     QgsExpression,
     QgsExpressionContext,
     QgsExpressionContextUtils,
     QgsProject,
-    QgsFeatureIterator
+    QgsFeature,
+    QgsFeatureIterator,
+    QgsFields,
+    QgsGeometry,
+    QgsWkbTypes,
 )
 
 
-from .delta_lake_feature_iterator import DeltaLakeFeatureIterator
+from .delta_lake_feature_iterator import BATCH_SIZE, DeltaLakeFeatureIterator
+from .indexes import ExpressionPlanner
+from .kernels import python_values
+from .memory_governor import memory_governor
+from .toolbelt.instrumentation import instrumentation
+from .toolbelt.preferences import PluginOptionsManager
+from .toolbelt.tracing import tracer
 
 
 class DeltaLakeFeatureSource(QgsAbstractFeatureSource):
     def __init__(self, provider):
-        """Constructor"""
+        """Constructor
+
+        The source does not keep the provider: it captures what iterators need when
+        it is created, including a reference on the loaded table snapshot. Iterators
+        created from it can therefore run on parallel render threads.
+        """
         super().__init__()
-        self._provider = provider
+        self._is_valid = provider.isValid()
+        self._fields = QgsFields(provider.fields())
+        self._crs = provider.crs()
+        self._index_geometry_column = provider.get_index_geometry_column()
+        self._count_field = provider.thinned_count_field()
+        settings = PluginOptionsManager.get_plg_settings()
+        self._read_ahead = settings.read_ahead
+        instrumentation.refresh(settings.debug_mode)
+        tracer.refresh(settings.trace_enabled)
+        # only point layers are thinned: dropping lines or polygons would leave holes
+        self._thinned = provider.display_mode() == "thinned" \
+            and QgsWkbTypes.geometryType(provider.wkbType()) == QgsWkbTypes.PointGeometry
+        self._table_loader = provider.get_table_loader()
+        self._layer_key = self._table_loader.layer_key() \
+            if self._table_loader is not None else ""
+        self._lock = threading.Lock()
+        self._table = None
+        if self._table_loader is not None:
+            # each render creates a source: the table was just used
+            memory_governor().touch(self._table_loader)
+            self._capture_table(self._table_loader.loaded_table())
 
         self._expression_context = QgsExpressionContext()
         self._expression_context.appendScope(QgsExpressionContextUtils.globalScope())
         self._expression_context.appendScope(
             QgsExpressionContextUtils.projectScope(QgsProject.instance())
         )
-        self._expression_context.setFields(self._provider.fields())
-        if self._provider.subsetString():
-            self._subset_expression = QgsExpression(self._provider.subsetString())
+        self._expression_context.setFields(self._fields)
+        self._subset_string = provider.subsetString()
+        if self._subset_string:
+            self._subset_expression = QgsExpression(self._subset_string)
             self._subset_expression.prepare(self._expression_context)
         else:
             self._subset_expression = None
-        self._feature_cache = None
-        self._request_cache = None
+
+    def _capture_table(self, table) -> None:
+        """Keeps a reference on the table snapshot for the lifetime of the source"""
+        if table is None:
+            return
+        self._table = table.acquire()
+        weakref.finalize(self, table.release)
 
     def getFeatures(self, request):
-        if self._feature_cache is None or self._request_cache != request:
-            self._feature_cache = QgsFeatureIterator(
-                    DeltaLakeFeatureIterator(self, request)
-                )
-        return self._feature_cache
-
-    def get_provider(self):
-        return self._provider
+        return QgsFeatureIterator(DeltaLakeFeatureIterator(self, request))
+
+    def isValid(self) -> bool:
+        return self._is_valid
+
+    def fields(self) -> QgsFields:
+        return self._fields
+
+    def crs(self):
+        return self._crs
+
+    def index_geometry_column(self):
+        return self._index_geometry_column
+
+    def layer_key(self) -> str:
+        """Returns the key of the performance counters of the layer"""
+        return self._layer_key
+
+    def read_ahead(self) -> bool:
+        """Tells whether iterators prepare their next batch on a worker thread"""
+        return self._read_ahead
+
+    def thinned(self) -> bool:
+        """Tells whether map renderings get one feature per pixel-sized cell"""
+        return self._thinned
+
+    def thinned_count_field(self) -> int:
+        """Returns the index of the field counting the features of thinned renderings, -1 without"""
+        return self._count_field
+
+    def thinned_rows(self, table, cell_size: float):
+        """Returns one representative row per occupied cell among the rows of the subset
+
+        The result is kept as a level of detail of the table.
+
+        :param table: table snapshot
+        :type table: DeltaLakeTable
+        :param cell_size: size of the cells, in the units of the layer CRS
+        :type cell_size: float
+        :return: sorted representative rows, and the number of rows of their cell
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        return table.thinned_rows(cell_size, self.subset_rows(table), key=self._subset_string)
+
+    def table(self, limit: int = -1):
+        """Returns the table snapshot iterators read from.
+
+        If the table was not loaded when the source was created, it is loaded by the
+        first iterator needing it, then kept by the source. A caller needing only the
+        first ``limit`` rows gets a preview instead.
+
+        :param limit: number of rows needed, -1 for the whole table
+        :type limit: int
+        :return: table snapshot
+        :rtype: DeltaLakeTable
+        """
+        if self._table is None:
+            if limit >= 0:
+                return self._table_loader.preview(limit)
+            with self._lock:
+                if self._table is None:
+                    # time spent by the rendering waiting for the table to be loaded
+                    with instrumentation.timed(self._layer_key, "table_wait"):
+                        self._capture_table(self._table_loader.table())
+        return self._table
+
+    def subset_string(self) -> str:
+        return self._subset_string
+
+    def has_subset(self) -> bool:
+        return self._subset_expression is not None
+
+    def subset_rows(self, table) -> Union[np.ndarray, None]:
+        """Returns the rows of a table matching the subset string, None without subset.
+
+        The subset string is evaluated once per table snapshot.
+
+        :param table: table snapshot
+        :type table: DeltaLakeTable
+        :return: sorted row positions
+        :rtype: Union[np.ndarray, None]
+        """
+        if self._subset_expression is None:
+            return None
+        return self.expression_rows(table, self._subset_string)
+
+    def expression_rows(self, table, expression_string: str) -> np.ndarray:
+        """Returns the rows of a table matching an expression.
+
+        The expression is evaluated once per table snapshot.
+
+        :param table: table snapshot
+        :type table: DeltaLakeTable
+        :param expression_string: expression to evaluate
+        :type expression_string: str
+        :return: sorted row positions
+        :rtype: np.ndarray
+        """
+        return table.cached(
+            ("expression", expression_string),
+            lambda: self._evaluate_expression(table, expression_string),
+        )
+
+    def _evaluate_expression(self, table, expression_string: str) -> np.ndarray:
+        # expressions are not thread-safe, evaluate a copy
+        expression = QgsExpression(expression_string)
+        context = QgsExpressionContext(self._expression_context)
+        expression.prepare(context)
+        # indexes answer the parts of the expression they can, only the remaining
+        # candidates are evaluated feature by feature
+        planner = ExpressionPlanner(table, self._fields, context)
+        candidates, exact = planner.candidate_rows(expression)
+        if exact:
+            return candidates
+        if candidates is None:
+            candidates = np.arange(table.row_count())
+        attribute_indexes = [
+            field_index for field_index in expression.referencedAttributeIndexes(self._fields)
+            if field_index not in (self._index_geometry_column, self._count_field)
+        ]
+        geometries = None
+        if expression.needsGeometry() and self._index_geometry_column is not None:
+            geometries = table.geometries()
+
+        feature = QgsFeature(self._fields)
+        matches = np.zeros(table.row_count(), dtype=bool)
+        for start in range(0, len(candidates), BATCH_SIZE):
+            rows = candidates[start:start + BATCH_SIZE]
+            columns = {
+                field_index: python_values(table.column(field_index), rows)
+                for field_index in attribute_indexes
+            }
+            # $id is the feature id QGIS gets for the row
+            fids = table.feature_ids(rows).tolist()
+            for position, row in enumerate(rows.tolist()):
+                feature.setId(fids[position])
+                for field_index, values in columns.items():
+                    feature.setAttribute(field_index, values[position])
+                if geometries is not None:
+                    geometry = QgsGeometry()
+                    if geometries[row] is not None:
+                        geometry.fromWkb(bytes(geometries[row]))
+                    feature.setGeometry(geometry)
+                context.setFeature(feature)
+                matches[row] = bool(expression.evaluate(context))
+        return np.flatnonzero(matches)
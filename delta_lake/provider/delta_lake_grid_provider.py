@@ -0,0 +1,407 @@
+"""
+    Companion layer of a shared table: its features aggregated in the cells of a grid
+    pyramid, at a level matching the scale of the map.
+"""
+
+# standard
+from __future__ import annotations
+
+import urllib.parse
+from typing import Union
+
+# 3rd party
+import numpy as np
+
+# PyQGIS
+from qgis.core import (
+    QgsAbstractFeatureIterator,
+    QgsAbstractFeatureSource,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsDataProvider,
+    QgsFeature,
+    QgsFeatureIterator,
+    QgsFeatureRequest,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsRectangle,
+    QgsVectorDataProvider,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+# project
+from .aggregation_grid import (
+    GRID_LEVELS,
+    GRID_SHAPES,
+    aggregate_field_name,
+    format_grid_aggregates,
+    parse_grid_aggregates,
+)
+from .delta_lake_feature_iterator import units_per_pixel
+from .delta_lake_feature_source import DeltaLakeFeatureSource
+from .delta_lake_provider import DeltaLakeProvider, decode_uri, encode_uri
+from .toolbelt.log_handler import PluginLogger
+
+# uri parameters of the grid, on top of those of the table
+GRID_URI_OPTIONS = ("grid_shape", "grid_aggregates")
+# cells are about this many pixels wide on the map
+GRID_CELL_PIXELS = 64
+# level served to requests that do not come from a map rendering (attribute table, ...)
+DEFAULT_GRID_LEVEL = 6
+# feature ids hold the level of the pyramid above the cell id
+_LEVEL_FID_FACTOR = 2 ** 54
+
+
+def decode_grid_uri(uri: str) -> dict[str, Union[str, int]]:
+    """Breaks a grid data source URI into the parts of its table and of its grid"""
+    parts = decode_uri(uri)
+    for variable in uri.split(" "):
+        key, value = variable.split("=")
+        if key in GRID_URI_OPTIONS:
+            parts[key] = urllib.parse.unquote_plus(value)
+    return parts
+
+
+def encode_grid_uri(parts: dict[str, str]) -> str:
+    """Reassembles a grid data source URI from its parts, as returned by decode_grid_uri"""
+    uri = encode_uri(parts)
+    for key in GRID_URI_OPTIONS:
+        if parts.get(key) not in (None, ""):
+            uri += f" {key}={urllib.parse.quote_plus(str(parts[key]))}"
+    return uri
+
+
+def grid_uri_from_table_uri(table_uri: str, grid_shape: str = "square",
+                            grid_aggregates: tuple[tuple[str, str], ...] = ()) -> str:
+    """Returns the URI of the grid companion layer of a table layer"""
+    parts = decode_uri(table_uri)
+    parts["grid_shape"] = grid_shape
+    parts["grid_aggregates"] = format_grid_aggregates(grid_aggregates)
+    return encode_grid_uri(parts)
+
+
+class DeltaLakeGridProvider(QgsVectorDataProvider):
+    def __init__(
+        self,
+        provider_options=QgsDataProvider.ProviderOptions(),
+        flags=QgsDataProvider.ReadFlags(),
+        grid_shape: Union[str, None] = None,
+        grid_aggregates: Union[str, None] = None,
+        **table_parts,
+    ):
+        """Constructor
+
+        The table is opened by a provider of its own, whose options (time travel, key
+        columns, ...) are given by ``table_parts``.
+        """
+        self._is_valid = False
+        self._fields = None
+        self._feature_count = None
+        self._shape = grid_shape or "square"
+        self._aggregates = ()
+        self._uri = encode_grid_uri(
+            dict(table_parts, grid_shape=grid_shape, grid_aggregates=grid_aggregates)
+        )
+
+        super().__init__(self._uri)
+
+        self._table_provider = DeltaLakeProvider(provider_options, flags, **table_parts)
+        if not self._table_provider.isValid():
+            return
+        if self._shape not in GRID_SHAPES:
+            PluginLogger.log(f"Unknown grid shape: {self._shape}", log_level=2, push=True)
+            return
+        try:
+            self._aggregates = parse_grid_aggregates(grid_aggregates)
+        except ValueError as exc:
+            PluginLogger.log(str(exc), log_level=2, push=True)
+            return
+        table_fields = self._table_provider.fields()
+        for function, column in self._aggregates:
+            field_index = table_fields.lookupField(column)
+            if field_index < 0 or not table_fields.field(field_index).isNumeric():
+                PluginLogger.log(
+                    f"Grid aggregates need a numeric column: {column}", log_level=2, push=True
+                )
+                return
+        self._is_valid = True
+
+    @classmethod
+    def providerKey(cls) -> str:
+        """Returns the provider key"""
+        return "delta_lake_grid"
+
+    def name(self) -> str:
+        return self.providerKey()
+
+    @classmethod
+    def description(cls) -> str:
+        """Returns the provider description"""
+        return "Delta Share aggregation grid"
+
+    @classmethod
+    def create_provider(cls, uri, provider_options, flags=QgsDataProvider.ReadFlags()):
+        return DeltaLakeGridProvider(provider_options, flags, **decode_grid_uri(uri))
+
+    @classmethod
+    def layer_name(cls, share_name, schema_name, table_name) -> str:
+        return f"{DeltaLakeProvider.layer_name(share_name, schema_name, table_name)} (grid)"
+
+    def isValid(self) -> bool:
+        return self._is_valid
+
+    def disconnect_database(self):
+        self._table_provider.disconnect_database()
+
+    def get_table_provider(self) -> DeltaLakeProvider:
+        """Returns the provider of the aggregated table"""
+        return self._table_provider
+
+    def get_table_loader(self):
+        """Returns the loader of the aggregated table"""
+        return self._table_provider.get_table_loader()
+
+    def grid_shape(self) -> str:
+        return self._shape
+
+    def grid_aggregates(self) -> tuple[tuple[str, str], ...]:
+        return self._aggregates
+
+    def capabilities(self) -> QgsVectorDataProvider.Capabilities:
+        return QgsVectorDataProvider.Capabilities(QgsVectorDataProvider.SelectAtId)
+
+    def fields(self) -> QgsFields:
+        """Returns the cell id, the number of features of the cell and one field per aggregate"""
+        if self._fields is None:
+            self._fields = QgsFields()
+            self._fields.append(QgsField("cell_id", QVariant.LongLong, "int8"))
+            self._fields.append(QgsField("count", QVariant.LongLong, "int8"))
+            for function, column in self._aggregates:
+                self._fields.append(
+                    QgsField(aggregate_field_name(function, column), QVariant.Double, "double")
+                )
+        return self._fields
+
+    def wkbType(self) -> QgsWkbTypes:
+        return QgsWkbTypes.Polygon
+
+    def featureCount(self) -> int:
+        """Returns the number of cells of the level served outside map renderings"""
+        if not self._is_valid:
+            return 0
+        if self._feature_count is None:
+            self._feature_count = len(DeltaLakeGridFeatureSource(self).grid(DEFAULT_GRID_LEVEL))
+        return self._feature_count
+
+    def extent(self) -> QgsRectangle:
+        return self._table_provider.extent() if self._is_valid else QgsRectangle()
+
+    def updateExtents(self) -> None:
+        self._table_provider.updateExtents()
+
+    def dataSourceUri(self, expandAuthConfig=False):
+        return self._uri
+
+    def crs(self):
+        return self._table_provider.crs()
+
+    def storageType(self):
+        return self._table_provider.storageType()
+
+    def featureSource(self):
+        return DeltaLakeGridFeatureSource(self)
+
+    def getFeatures(self, request=QgsFeatureRequest()) -> QgsFeatureIterator:
+        return QgsFeatureIterator(
+            DeltaLakeGridFeatureIterator(DeltaLakeGridFeatureSource(self), request)
+        )
+
+    def reloadProviderData(self) -> None:
+        self._table_provider.reloadProviderData()
+        self._feature_count = None
+
+    def subsetString(self) -> str:
+        return self._table_provider.subsetString()
+
+    def setSubsetString(self, subsetString: str, updateFeatureCount: bool = True) -> bool:
+        """Sets the subset string of the aggregated table: only its matching features are counted"""
+        if not self._table_provider.setSubsetString(subsetString, updateFeatureCount):
+            return False
+        self._feature_count = None
+        self.dataChanged.emit()
+        return True
+
+    def supportsSubsetString(self) -> bool:
+        return True
+
+
+class DeltaLakeGridFeatureSource(QgsAbstractFeatureSource):
+    def __init__(self, provider: DeltaLakeGridProvider):
+        """Constructor
+
+        Like the source of the table, it does not keep the provider, so that iterators
+        can run on parallel render threads.
+        """
+        super().__init__()
+        self._is_valid = provider.isValid()
+        self._fields = QgsFields(provider.fields())
+        self._crs = provider.crs()
+        self._shape = provider.grid_shape()
+        self._aggregates = provider.grid_aggregates()
+        self._table_source = DeltaLakeFeatureSource(provider.get_table_provider())
+
+    def getFeatures(self, request):
+        return QgsFeatureIterator(DeltaLakeGridFeatureIterator(self, request))
+
+    def isValid(self) -> bool:
+        return self._is_valid
+
+    def fields(self) -> QgsFields:
+        return self._fields
+
+    def crs(self):
+        return self._crs
+
+    def table(self):
+        return self._table_source.table()
+
+    def grid(self, level: int):
+        """Returns a level of the grid pyramid of the features matching the subset string
+
+        :param level: level of the pyramid
+        :type level: int
+        :rtype: AggregationGrid
+        """
+        table = self.table()
+        return table.aggregation_grid(
+            self._shape, level, self._aggregates,
+            self._table_source.subset_rows(table), key=self._table_source.subset_string(),
+        )
+
+
+class DeltaLakeGridFeatureIterator(QgsAbstractFeatureIterator):
+    def __init__(self, source: DeltaLakeGridFeatureSource, request: QgsFeatureRequest):
+        """Constructor"""
+        super().__init__(request)
+        self._source = source
+        self._request = request if request is not None else QgsFeatureRequest()
+        self._grid = None
+        self._level = None
+        self._cells = np.empty(0, dtype=np.int64)
+        self._index = 0
+        self._transform = QgsCoordinateTransform()
+        if not self._source.isValid():
+            return
+        if (
+            self._request.destinationCrs().isValid()
+            and self._request.destinationCrs() != self._source.crs()
+        ):
+            self._transform = QgsCoordinateTransform(
+                self._source.crs(), self._request.destinationCrs(), self._request.transformContext()
+            )
+        self._select_cells()
+
+    def _request_level(self, table) -> int:
+        """Returns the level of the pyramid whose cells are about GRID_CELL_PIXELS wide
+        on the map
+        """
+        pixel_size = units_per_pixel(self._request, self._source.crs())
+        if pixel_size is None:
+            return DEFAULT_GRID_LEVEL
+        level = np.round(np.log2(table.grid_cell_size(0) / (pixel_size * GRID_CELL_PIXELS)))
+        return int(np.clip(level, 0, GRID_LEVELS - 1))
+
+    def _select_cells(self) -> None:
+        """Selects the level of the pyramid and the cells matching the request"""
+        filter_type = self._request.filterType()
+        if filter_type in (QgsFeatureRequest.FilterFid, QgsFeatureRequest.FilterFids):
+            fids = [self._request.filterFid()] if filter_type == QgsFeatureRequest.FilterFid \
+                else list(self._request.filterFids())
+            # feature ids tell the level of their cell: take the level of the first one
+            fids = [fid for fid in fids if fid >= 0]
+            if not fids:
+                return
+            self._level = fids[0] // _LEVEL_FID_FACTOR
+            if not 0 <= self._level < GRID_LEVELS:
+                return
+            self._grid = self._source.grid(self._level)
+            self._cells = self._grid.cells_for_ids(
+                [fid % _LEVEL_FID_FACTOR for fid in fids if fid // _LEVEL_FID_FACTOR == self._level]
+            )
+        else:
+            self._level = self._request_level(self._source.table())
+            self._grid = self._source.grid(self._level)
+            self._cells = np.arange(len(self._grid))
+        rect = self._filter_rect()
+        if rect is not None:
+            self._cells = np.intersect1d(
+                self._cells, self._grid.cells_in_rect(rect), assume_unique=True
+            )
+
+    def _filter_rect(self) -> Union[tuple[float, float, float, float], None]:
+        """Returns the filter rectangle of the request in the CRS of the table, None
+        without rectangle
+        """
+        rect = self._request.filterRect()
+        if rect.isNull():
+            return None
+        if self._transform.isValid():
+            try:
+                rect = self._transform.transformBoundingBox(
+                    rect, QgsCoordinateTransform.ReverseTransform
+                )
+            except QgsCsException:
+                return None
+        return rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()
+
+    def fetchFeature(self, f: QgsFeature) -> bool:
+        """fetch next feature, return true on success
+
+        :param f: Next feature
+        :type f: QgsFeature
+        :return: True if success
+        :rtype: bool
+        """
+        if self._index >= len(self._cells):
+            f.setValid(False)
+            return False
+        cell = int(self._cells[self._index])
+        self._index += 1
+        grid = self._grid
+        cell_id = int(grid.cell_ids[cell])
+        attributes = [cell_id, int(grid.counts[cell])]
+        for values in grid.values.values():
+            value = values[cell]
+            attributes.append(None if np.isnan(value) else float(value))
+        f.setFields(self._source.fields())
+        f.setAttributes(attributes)
+        f.setId(self._level * _LEVEL_FID_FACTOR + cell_id)
+        if self._request.flags() & QgsFeatureRequest.NoGeometry:
+            f.clearGeometry()
+        else:
+            geometry = QgsGeometry()
+            geometry.fromWkb(bytes(grid.polygons[cell]))
+            f.setGeometry(geometry)
+            self.geometryToDestinationCrs(f, self._transform)
+        f.setValid(True)
+        return True
+
+    def __iter__(self) -> DeltaLakeGridFeatureIterator:
+        return self
+
+    def __next__(self) -> QgsFeature:
+        f = QgsFeature()
+        if not self.nextFeature(f):
+            raise StopIteration
+        return f
+
+    def rewind(self) -> bool:
+        self._index = 0
+        return True
+
+    def close(self) -> bool:
+        self._grid = None
+        self._cells = np.empty(0, dtype=np.int64)
+        return True
@@ -1,5 +1,8 @@
-from qgis.core import QgsProviderMetadata, QgsReadWriteContext
+from qgis.core import QgsProviderMetadata, QgsReadWriteContext, QgsWkbTypes
 
+from .delta_lake_grid_provider import (
+    DeltaLakeGridProvider, decode_grid_uri, encode_grid_uri, grid_uri_from_table_uri,
+)
 from .delta_lake_provider import (
     DeltaLakeProvider, decode_uri, encode_uri, encode_uri_from_values,
     absolute_to_relative_uri, relative_to_absolute_uri
@@ -14,6 +17,9 @@ class DeltaLakeProviderMetadata(QgsProviderMetadata):
             DeltaLakeProvider.create_provider,
         )
 
+    def providerCapabilities(self):
+        return _parallel_create_capability()
+
     def decodeUri(self, uri: str) -> dict[str, str]:
         return decode_uri(uri)
 
@@ -22,12 +28,76 @@ class DeltaLakeProviderMetadata(QgsProviderMetadata):
 
     @staticmethod
     def encodeUriFromValues(connection_profile_path: str,
-                            share_name: str, schema_name: str, table_name: str, epsg_id: int) -> str:
+                            share_name: str, schema_name: str, table_name: str, epsg_id: int,
+                            **options) -> str:
         return encode_uri_from_values(connection_profile_path,
-                                      share_name, schema_name, table_name, epsg_id)
+                                      share_name, schema_name, table_name, epsg_id, **options)
 
     def absoluteToRelativeUri(self, uri: str, context: QgsReadWriteContext) -> str:
         return absolute_to_relative_uri(uri, context)
 
     def relativeToAbsoluteUri(self, uri: str, context: QgsReadWriteContext) -> str:
         return relative_to_absolute_uri(uri, context)
+
+    def querySublayers(self, uri: str, flags=None, feedback=None) -> list:
+        """Lists the layers of a table: the table itself and its aggregation grid
+
+        Only called by QGIS 3.22 and above.
+        """
+        from qgis.core import QgsMapLayerType, QgsProviderSublayerDetails
+
+        parts = decode_uri(uri)
+        names = (parts["share_name"], parts["schema_name"], parts["table_name"])
+        sublayers = []
+        for layer_number, (provider, layer_uri) in enumerate((
+            (DeltaLakeProvider, uri),
+            (DeltaLakeGridProvider, grid_uri_from_table_uri(uri)),
+        )):
+            details = QgsProviderSublayerDetails()
+            details.setProviderKey(provider.providerKey())
+            details.setType(QgsMapLayerType.VectorLayer)
+            details.setUri(layer_uri)
+            details.setName(provider.layer_name(*names))
+            details.setLayerNumber(layer_number)
+            if provider is DeltaLakeGridProvider:
+                details.setWkbType(QgsWkbTypes.Polygon)
+            sublayers.append(details)
+        return sublayers
+
+
+class DeltaLakeGridProviderMetadata(QgsProviderMetadata):
+    def __init__(self):
+        super().__init__(
+            DeltaLakeGridProvider.providerKey(),
+            DeltaLakeGridProvider.description(),
+            DeltaLakeGridProvider.create_provider,
+        )
+
+    def providerCapabilities(self):
+        return _parallel_create_capability()
+
+    def decodeUri(self, uri: str) -> dict[str, str]:
+        return decode_grid_uri(uri)
+
+    def encodeUri(self, parts: dict[str, str]) -> str:
+        return encode_grid_uri(parts)
+
+    def absoluteToRelativeUri(self, uri: str, context: QgsReadWriteContext) -> str:
+        return _with_grid_options(absolute_to_relative_uri(uri, context), uri)
+
+    def relativeToAbsoluteUri(self, uri: str, context: QgsReadWriteContext) -> str:
+        return _with_grid_options(relative_to_absolute_uri(uri, context), uri)
+
+
+def _with_grid_options(table_uri: str, grid_uri: str) -> str:
+    """Returns a grid uri made of the parts of a table uri and of the grid options of another one"""
+    parts = decode_grid_uri(grid_uri)
+    parts.update(decode_uri(table_uri))
+    return encode_grid_uri(parts)
+
+
+def _parallel_create_capability():
+    """Lets QGIS 3.32 and above create the layers of a project in parallel, in worker threads"""
+    return getattr(
+        QgsProviderMetadata, "ParallelCreateProvider", QgsProviderMetadata.ProviderCapabilities()
+    )
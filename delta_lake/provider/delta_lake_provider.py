@@ -1,43 +1,62 @@
 from __future__ import annotations
 
+import itertools
 import os
+import time
 import weakref
+from functools import partial
 from pathlib import Path
 from typing import Union
 import json
 import urllib.parse
 from requests.exceptions import HTTPError
 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from shapely import from_wkb, total_bounds
+from shapely import from_wkb
 import polars as pl
 
 from qgis.core import (
     Qgis,
+    QgsExpression,
     QgsProject,
     QgsCoordinateReferenceSystem,
     QgsDataProvider,
+    QgsDateTimeRange,
     QgsFeature,
     QgsFeatureIterator,
     QgsFeatureRequest,
     QgsField,
     QgsFields,
     QgsVectorDataProvider,
+    QgsVectorDataProviderTemporalCapabilities,
     QgsWkbTypes,
     QgsReadWriteContext,
     QgsMessageLog,
     QgsRectangle
 )
+from qgis.PyQt.QtCore import QDateTime, Qt
 
 from . import delta_lake_feature_iterator, delta_lake_feature_source
-from .delta_lake_feature_iterator import DeltaLakeFeatureIterator
+from .delta_lake_feature_iterator import THINNED_COUNT_FIELD, DeltaLakeFeatureIterator
 from .delta_lake_feature_source import DeltaLakeFeatureSource
+from .delta_lake_table import DeltaLakeTableLoader, FileStatistics
+from .geoparquet import write_geoparquet
+from .load_pool import submit_once
+from .metadata_cache import TableMetadataCache, metadata_cache
+from .offline_snapshot import OfflineSnapshot, OfflineTableLoader, write_snapshot
+from .kernels import aggregate_column, aggregate_groups, extreme_value, python_values, unique_values
 from .mappings import (
     mapping_delta_lake_qgis_geometry,
     mapping_delta_lake_qgis_type,
+    mapping_qgis_aggregate,
 )
+from .toolbelt.instrumentation import instrumentation, layer_key
 from .toolbelt.log_handler import PluginLogger
+from .toolbelt.preferences import PluginOptionsManager
+from .toolbelt.tracing import tracer
+from .vector_tiles import to_web_mercator, write_mbtiles
 
 from ..__about__ import (
     DIR_PLUGIN_ROOT,
@@ -48,7 +67,8 @@ from ..__about__ import (
 try:
     import delta_sharing
     from delta_sharing import SharingClient
-    from delta_sharing.protocol import Metadata
+    from delta_sharing.protocol import DeltaSharingProfile, Metadata, Table
+    from delta_sharing.rest_client import DataSharingRestClient
 
     PluginLogger.log(message="Dependencies loaded from Python installation.")
 except ImportError:
@@ -63,7 +83,8 @@ except ImportError:
     site.addsitedir(os.path.join(DIR_PLUGIN_ROOT, "embedded_external_libs"))
     import delta_sharing
     from delta_sharing import SharingClient
-    from delta_sharing.protocol import Metadata
+    from delta_sharing.protocol import DeltaSharingProfile, Metadata, Table
+    from delta_sharing.rest_client import DataSharingRestClient
 
     PluginLogger.log(
         message=f"Dependencies loaded from embedded external libs: {__version__=}"
@@ -80,6 +101,11 @@ class DeltaLakeProvider(QgsVectorDataProvider):
         schema_name: Union[str, None] = None,
         table_name: Union[str, None] = None,
         epsg_id: Union[int, None] = None,
+        fid_columns: Union[str, None] = None,
+        version: Union[int, str, None] = None,
+        timestamp: Union[str, None] = None,
+        display_mode: Union[str, None] = None,
+        offline_path: Union[str, None] = None,
     ):
         self._is_valid = False
 
@@ -88,12 +114,21 @@ class DeltaLakeProvider(QgsVectorDataProvider):
         self._fields = None
         self._feature_count = None
         self._primary_key = None
-        self._dataframe = None
+        self._table_loader = None
         self._schema_fields = None
         self._schema = None
         self._metadata = None
+        self._table_version = None
         self._table_uri = None
+        self._layer_key = None
         self._extent = None
+        self._subset_string = ""
+        self._file_statistics = None
+        self._offline_path = offline_path or None
+        self._offline_snapshot = None
+        # metadata of the table cached by a previous session, see _connect
+        self._metadata_key = None
+        self._cached_metadata = None
 
         self._provider_options = provider_options
         self._flags = flags
@@ -104,8 +139,20 @@ class DeltaLakeProvider(QgsVectorDataProvider):
         self._schema_name = schema_name
         self._table_name = table_name
         self._epsg_id = epsg_id
+        self._fid_columns = fid_columns
+        self._key_columns = ()
+        # version or timestamp of the snapshot to open, the latest one if both are None
+        self._requested_version = int(version) if version not in (None, "") else None
+        self._requested_timestamp = (timestamp or None) if self._requested_version is None else None
         self._uri = encode_uri_from_values(connection_profile_path,
-                                           share_name, schema_name, table_name, epsg_id)
+                                           share_name, schema_name, table_name, epsg_id,
+                                           fid_columns=fid_columns, version=version,
+                                           timestamp=timestamp, display_mode=display_mode,
+                                           offline_path=offline_path)
+        self._display_mode = None
+        # field bound to the temporal capabilities, and whether their available range is set
+        self._temporal_field = None
+        self._temporal_range_known = False
         self._index_geometry_column = None
 
         super().__init__(self._uri)
@@ -114,10 +161,28 @@ class DeltaLakeProvider(QgsVectorDataProvider):
             self._crs = QgsCoordinateReferenceSystem.fromEpsgId(epsg=epsg_id)
         else:
             self._crs = QgsCoordinateReferenceSystem()
-        self._table_uri, self._client = self.connect_database(connection_profile_path,
-                                                              share_name, schema_name, table_name)
+        settings = PluginOptionsManager.get_plg_settings()
+        instrumentation.refresh(settings.debug_mode)
+        tracer.refresh(settings.trace_enabled)
+        # key of the counters of the layer, see performance_counters
+        self._layer_key = layer_key(
+            _table_uri(connection_profile_path, share_name, schema_name, table_name),
+            next(_layer_numbers),
+        )
+        open_start = time.perf_counter()
+        self._table_uri, self._client = self._connect(connection_profile_path,
+                                                      share_name, schema_name, table_name)
+        if instrumentation.timing:
+            instrumentation.elapsed(self._layer_key, "layer_open", open_start)
+        self._key_columns = self._validate_key_columns(fid_columns)
+        self._display_mode = self._validate_display_mode(display_mode)
+        self._table_loader = self._create_table_loader()
+        self._configure_temporal_capabilities()
         weakref.finalize(self, self.disconnect_database)
         self._is_valid = True
+        if settings.prefetch_on_open:
+            # the layers of a project download their tables at the same time, in the background
+            submit_once(self._table_loader, self._table_loader.table)
 
     @classmethod
     def providerKey(cls) -> str:
@@ -142,7 +207,28 @@ class DeltaLakeProvider(QgsVectorDataProvider):
         return DeltaLakeProvider(provider_options, flags, **decode_uri(uri))
 
     def capabilities(self) -> QgsVectorDataProvider.Capabilities:
-        return QgsVectorDataProvider.Capabilities(QgsVectorDataProvider.NoCapabilities)
+        return QgsVectorDataProvider.Capabilities(
+            QgsVectorDataProvider.CreateAttributeIndex
+            | QgsVectorDataProvider.SimplifyGeometries
+            | QgsVectorDataProvider.SimplifyGeometriesWithTopologicalValidation
+        )
+
+    def createAttributeIndex(self, field: int) -> bool:
+        """Builds the index of a field on the loaded table.
+
+        Numeric and temporal fields get a sorted index, answering equality and range
+        filters, other fields a hash index answering equality and IN filters. Subset
+        strings and filter expressions use the indexes automatically, this only avoids
+        building them on first use.
+
+        :param field: Index of field
+        :type field: int
+        :return: True if the field could be indexed
+        :rtype: bool
+        """
+        if not self._is_table_field(field) or field == self._index_geometry_column:
+            return False
+        return self._table_loader.table().attribute_index(field) is not None
 
     @classmethod
     def layer_name(cls, share_name, schema_name, table_name) -> str:
@@ -152,47 +238,437 @@ class DeltaLakeProvider(QgsVectorDataProvider):
         """returns the number of entities in the table"""
         if not self._is_valid:
             self._feature_count = 0
-        else:
-            self._feature_count = len(self._dataframe)
+        elif self._feature_count is None and self._offline_snapshot is not None \
+                and not self._subset_string:
+            # known without reading the snapshot
+            self._feature_count = self._offline_snapshot.description["row_count"]
+        elif self._feature_count is None:
+            cached_count = self._cached_value("row_count")
+            if cached_count is not None:
+                # count of the previous session, until the table is loaded
+                return cached_count
+            table = self._table_loader.table()
+            subset_rows = self._subset_rows(table)
+            self._feature_count = table.row_count() if subset_rows is None else len(subset_rows)
+            if subset_rows is None:
+                self._update_cached_metadata(row_count=self._feature_count)
         return self._feature_count
 
     def isValid(self) -> bool:
         return self._is_valid
 
+    def _connect(self, connection_profile_path, share_name, schema_name, table_name,
+                 use_cache: bool = True) -> tuple[str, Union[SharingClient, None]]:
+        """Opens the offline snapshot of the layer if it has one, the shared table otherwise.
+
+        The metadata of a shared table cached by a previous session is used as is, so
+        that opening a project does not wait for the server: it is refreshed in the
+        background for the next session. Until then, the rows of the table are read at
+        the cached version, so that they match the cached schema.
+
+        :param use_cache: False to always ask the server for the metadata
+        :type use_cache: bool
+        """
+        if self._offline_path is not None:
+            if OfflineSnapshot.exists(self._offline_path):
+                return self.open_offline_snapshot(self._offline_path), None
+            PluginLogger.log(
+                self.tr(
+                    "No offline snapshot in {}, opening version {} of the shared table".format(
+                        self._offline_path, self._requested_version
+                    )
+                ),
+                log_level=1,
+                push=True,
+            )
+        table_uri = _table_uri(connection_profile_path, share_name, schema_name, table_name)
+        self._metadata_key = TableMetadataCache.key(
+            table_uri, self._requested_version, self._requested_timestamp
+        )
+        self._cached_metadata = metadata_cache().get(self._metadata_key) if use_cache else None
+        if use_cache:
+            instrumentation.count(
+                self._layer_key,
+                "metadata_cache_misses" if self._cached_metadata is None else "metadata_cache_hits",
+            )
+        if self._cached_metadata is None:
+            return self.connect_database(
+                connection_profile_path, share_name, schema_name, table_name
+            )
+        self._apply_table_metadata(self._cached_metadata)
+        if not self.is_time_travel():
+            # past versions never change, the latest one may have
+            submit_once(("metadata", self._metadata_key), partial(
+                _refresh_cached_metadata, self._metadata_key, self._cached_metadata,
+                connection_profile_path, share_name, schema_name, table_name,
+            ))
+        return table_uri, client_connect(connection_profile_path)
+
+    def _apply_table_metadata(self, table_metadata: dict) -> None:
+        """Sets the version and schema of the table, see fetch_table_metadata"""
+        self._table_version = table_metadata["version"]
+        self._schema = json.loads(table_metadata["schema_string"])
+        self._schema_fields = self._schema['fields']
+        self._index_geometry_column = table_metadata["index_geometry_column"]
+        self._geometry_column = None if self._index_geometry_column is None \
+            else self._schema_fields[self._index_geometry_column]['name']
+        self._file_statistics = None
+        if table_metadata.get("file_statistics") is not None:
+            statistics = table_metadata["file_statistics"]
+            self._file_statistics = FileStatistics(
+                statistics.get("row_count"),
+                {
+                    name: tuple(value_range)
+                    for name, value_range in statistics.get("column_ranges", {}).items()
+                },
+            )
+
+    def _cached_value(self, name: str):
+        """Returns a value of the metadata cached by a previous session, as long as the
+        table is not loaded and the layer has no subset string, None otherwise
+        """
+        if self._cached_metadata is None or self._subset_string \
+                or self._table_loader.loaded_table() is not None:
+            return None
+        return self._cached_metadata.get(name)
+
+    def _update_cached_metadata(self, **values) -> None:
+        """Saves values computed on the whole table for the next sessions"""
+        if self._metadata_key is None:
+            return
+        cached_metadata = metadata_cache().get(self._metadata_key)
+        if cached_metadata is not None and cached_metadata.get("version") != self._table_version:
+            # the cache was refreshed in the background with a newer version
+            return
+        metadata_cache().update(self._metadata_key, **values)
+
+    def _table_file_statistics(self) -> FileStatistics:
+        """Returns the statistics of the files of the table, listed on first use.
+
+        Statistics of the version of the layer are saved with its cached metadata, so
+        that the next sessions know them without listing the files.
+        """
+        listed = self._table_loader.known_file_statistics() is None
+        statistics = self._table_loader.file_statistics()
+        if listed and statistics.row_count is not None \
+                and self._table_loader.file_statistics_version() == self._table_version:
+            self._update_cached_metadata(file_statistics={
+                "row_count": statistics.row_count, "column_ranges": statistics.column_ranges,
+            })
+        return statistics
+
+    def open_offline_snapshot(self, offline_path: str) -> str:
+        """Reads the description of an offline snapshot, without any network access
+
+        :param offline_path: directory of the snapshot
+        :type offline_path: str
+        :return: table url, as understood by delta_sharing
+        :rtype: str
+        """
+        self._offline_snapshot = OfflineSnapshot(offline_path)
+        self._apply_table_metadata(self._offline_snapshot.description)
+        return self._offline_snapshot.description["table_uri"]
+
+    def is_offline(self) -> bool:
+        """Tells whether the layer reads an offline snapshot instead of the shared table"""
+        return self._offline_snapshot is not None
+
+    def save_offline_snapshot(self, offline_path: str) -> str:
+        """Pins the loaded version of the table into an offline snapshot
+
+        The snapshot holds the rows, the bounds of the geometries, the attribute indexes
+        built so far (see createAttributeIndex) and the statistics of the table. Layers
+        whose uri has its ``offline_path`` open it without any network access.
+
+        :param offline_path: directory of the snapshot, created if needed
+        :type offline_path: str
+        :return: uri of the layer reading the snapshot
+        :rtype: str
+        """
+        table = self._table_loader.table()
+        statistics = self._table_file_statistics()
+        write_snapshot(offline_path, table, {
+            "table_uri": self._table_uri,
+            "version": self._table_version,
+            "schema_string": json.dumps(self._schema),
+            "index_geometry_column": self._index_geometry_column,
+            "file_statistics": {
+                "row_count": statistics.row_count, "column_ranges": statistics.column_ranges,
+            },
+        })
+        parts = decode_uri(self._uri)
+        parts.pop("timestamp", None)
+        parts["version"] = self._table_version
+        parts["offline_path"] = offline_path
+        return encode_uri(parts)
+
     def connect_database(self, connection_profile_path,
                          share_name, schema_name, table_name) -> tuple[str, SharingClient]:
         client = client_connect(connection_profile_path)
         table_uri = _table_uri(connection_profile_path, share_name, schema_name, table_name)
-        print('--> Connecting to database')
         try:
-            self._metadata: Metadata = delta_sharing.get_table_metadata(table_uri)
-            self._schema = json.loads(self._metadata.schema_string)
-            self._schema_fields = self._schema['fields']
-            geometry_column_list = [(i, f['name']) for i, f in enumerate(self._schema_fields)
-                                    if "<geometry>" in f['metadata'].get('comment', '--')]
-            self._geometry_column = geometry_column_list[0][1] if len(geometry_column_list) > 0 else None
-            self._index_geometry_column = geometry_column_list[0][0] if len(geometry_column_list) > 0 else None
-            self._dataframe: pd.DataFrame = delta_sharing.load_as_pandas(table_uri)
-
+            with instrumentation.timed(self._layer_key, "metadata_fetch"):
+                table_metadata = fetch_table_metadata(
+                    connection_profile_path, share_name, schema_name, table_name,
+                    self._requested_version, self._requested_timestamp,
+                )
         except FileNotFoundError as e:
             PluginLogger.log(
                 self.tr(
-                    "File not found when loading data {}, are you on an allowed network?".format(table_uri)
+                    "File not found when loading data {}, are you on an allowed network?".format(
+                        table_uri
+                    )
                 ),
                 log_level=2,
                 push=True,
             )
             raise e
+        self._apply_table_metadata(table_metadata)
+        if self._metadata_key is not None:
+            # extent, count, ... of a previous version no longer hold
+            metadata_cache().update(
+                self._metadata_key, extent=None, row_count=None, geometry_type=None,
+                **table_metadata,
+            )
         return table_uri, client
 
+    def _validate_display_mode(self, display_mode: Union[str, None]) -> Union[str, None]:
+        """Returns the display mode given in the uri, None for unknown modes
+
+        :param display_mode: display mode, as given in the uri
+        :type display_mode: str
+        """
+        if not display_mode:
+            return None
+        if display_mode not in DISPLAY_MODES:
+            PluginLogger.log(
+                self.tr("Unknown display mode {}, all features are displayed".format(display_mode)),
+                log_level=1,
+                push=True,
+            )
+            return None
+        return display_mode
+
+    def display_mode(self) -> Union[str, None]:
+        """Returns how map renderings reduce the features, None to render all of them"""
+        return self._display_mode
+
+    def _validate_key_columns(self, fid_columns: Union[str, None]) -> tuple[str, ...]:
+        """Returns the key columns feature ids are derived from, among the requested ones
+
+        :param fid_columns: comma separated column names, as given in the uri
+        :type fid_columns: str
+        """
+        if not fid_columns:
+            return ()
+        schema_names = [field['name'] for field in self._schema_fields]
+        key_columns = tuple(name for name in fid_columns.split(",") if name)
+        unknown_columns = [name for name in key_columns if name not in schema_names]
+        if unknown_columns:
+            PluginLogger.log(
+                self.tr(
+                    "Unknown key columns {}, feature ids are row positions".format(
+                        ", ".join(unknown_columns)
+                    )
+                ),
+                log_level=1,
+                push=True,
+            )
+            return ()
+        return key_columns
+
+    def _create_table_loader(self) -> DeltaLakeTableLoader:
+        if self._offline_snapshot is not None:
+            return OfflineTableLoader(
+                self._offline_snapshot, self._index_geometry_column, self._key_columns,
+                layer=self._layer_key,
+            )
+        # rows of the latest version are read at the version of the cached schema
+        cached_columns = None if self._cached_metadata is None or self.is_time_travel() \
+            else tuple(field['name'] for field in self._schema_fields)
+        return DeltaLakeTableLoader(self._table_uri, self._table_version,
+                                    self._index_geometry_column, self._key_columns,
+                                    time_travel=self.is_time_travel(),
+                                    file_statistics=self._file_statistics,
+                                    cached_columns=cached_columns, layer=self._layer_key)
+
+    def _configure_temporal_capabilities(self) -> None:
+        """Binds the temporal capabilities to the first timestamp or date column.
+
+        Temporal filters on the column are then resolved with its sorted index by the
+        feature iterators, instead of evaluating the filter on every feature. The
+        available range comes from the statistics of the files when they are known
+        without listing the files, otherwise from the extremes of the column once QGIS
+        asks for them (see _extreme_value).
+        """
+        temporal_columns = [
+            field['name'] for field in self._schema_fields
+            if field['type'] in ("timestamp", "timestamp_ntz", "date")
+        ]
+        if not temporal_columns:
+            return
+        capabilities = self.temporalCapabilities()
+        capabilities.setHasTemporalCapabilities(True)
+        capabilities.setMode(
+            QgsVectorDataProviderTemporalCapabilities.ProviderStoresFeatureDateTimeInstantInField
+        )
+        capabilities.setStartField(temporal_columns[0])
+        self._temporal_field = temporal_columns[0]
+        statistics = self._table_loader.known_file_statistics()
+        column_range = None if statistics is None \
+            else statistics.column_ranges.get(self._temporal_field)
+        if column_range is not None:
+            self._set_available_temporal_range(*column_range)
+
+    def _set_available_temporal_range(self, begin, end) -> None:
+        """Sets the range of the temporal field, from dates, datetimes or ISO strings"""
+        begin, end = (
+            QDateTime.fromString(
+                value.isoformat() if hasattr(value, "isoformat") else str(value), Qt.ISODateWithMs
+            )
+            for value in (begin, end)
+        )
+        if begin.isValid() and end.isValid():
+            self.temporalCapabilities().setAvailableTemporalRange(QgsDateTimeRange(begin, end))
+            self._temporal_range_known = True
+
+    def is_time_travel(self) -> bool:
+        """Tells whether the layer shows a past version of the table instead of the latest one"""
+        return self._requested_version is not None or self._requested_timestamp is not None
+
+    def reloadProviderData(self) -> None:
+        """Drops the loaded data, the next request loads the table again.
+
+        With key columns, feature ids do not depend on row positions and survive the
+        reload, so selections and caches of QGIS remain valid.
+        """
+        self.disconnect_database()
+        self._table_uri, self._client = self._connect(self._connection_profile_path,
+                                                      self._share_name, self._schema_name,
+                                                      self._table_name, use_cache=False)
+        self._table_loader = self._create_table_loader()
+        self._feature_count = None
+        self._extent = None
+
     def disconnect_database(self):
-        self._dataframe = self._dataframe[0:0]
-        self._dataframe = None
+        if self._table_loader is not None:
+            self._table_loader.unload()
         self._metadata = None
         self._client = None
 
-    def get_dataframe(self):
-        return self._dataframe
+    def get_table_loader(self) -> Union[DeltaLakeTableLoader, None]:
+        """Returns the loader of the table data, shared with the feature sources"""
+        return self._table_loader
+
+    def performance_counters(self) -> dict:
+        """Returns the counters and timings recorded for the layer in debug mode, see
+        :class:`~delta_lake.provider.toolbelt.instrumentation.Instrumentation`
+        """
+        if self._layer_key is None:
+            return {"counters": {}, "timings": {}, "rates": {}}
+        return instrumentation.layer_counters(self._layer_key)
+
+    def get_dataframe(self, limit: int = -1) -> pd.DataFrame:
+        """Returns the table as a dataframe, downloading it when needed.
+
+        As long as the whole table has not been loaded, a caller needing only
+        ``limit`` rows gets a preview holding (at least) the first ``limit`` rows.
+
+        :param limit: number of rows needed, -1 for the whole table
+        :type limit: int
+        :return: the loaded table or a preview of it
+        :rtype: pd.DataFrame
+        """
+        if limit >= 0:
+            return self._table_loader.preview(limit).dataframe()
+        return self._table_loader.table().dataframe()
+
+    def export_vector_tiles(self, path: str, min_zoom: int = 0, max_zoom: int = 14,
+                            field_names: Union[list[str], None] = None,
+                            field_min_zooms: Union[dict[str, int], None] = None,
+                            processes: Union[int, None] = None, feedback=None) -> int:
+        """Writes the features matching the subset string as Mapbox Vector Tiles to an
+        MBTiles file, see vector_tiles.write_mbtiles.
+
+        :param path: path of the MBTiles file, replaced if it exists
+        :type path: str
+        :param min_zoom: first zoom level
+        :type min_zoom: int
+        :param max_zoom: last zoom level
+        :type max_zoom: int
+        :param field_names: attributes of the tiles, None for all fields
+        :type field_names: list[str]
+        :param field_min_zooms: first zoom level of some attributes
+        :type field_min_zooms: dict[str, int]
+        :param processes: number of worker processes, 0 to encode in the calling thread
+        :type processes: int
+        :param feedback: progress and cancellation
+        :type feedback: QgsFeedback
+        :return: number of written tiles, 0 when cancelled
+        :rtype: int
+        """
+        if not self._is_valid or self._index_geometry_column is None:
+            raise ValueError("Vector tiles need a valid layer with geometries")
+        fields = self.fields()
+        if field_names is None:
+            field_names = [
+                field.name() for index, field in enumerate(fields)
+                if self._is_table_field(index) and index != self._index_geometry_column
+            ]
+        table = self._table_loader.table()
+        rows = self._subset_rows(table)
+        if rows is None:
+            rows = np.arange(table.row_count())
+        geometries = from_wkb(table.geometries().take(rows), on_invalid="ignore")
+        attributes = {}
+        for name in field_names:
+            field_index = fields.lookupField(name)
+            if not self._is_table_field(field_index) or field_index == self._index_geometry_column:
+                raise ValueError(f"Unknown field: {name}")
+            attributes[name] = python_values(table.column(field_index), rows)
+        return write_mbtiles(
+            path, self.layer_name(self._share_name, self._schema_name, self._table_name),
+            to_web_mercator(geometries, self._crs.authid()), attributes, min_zoom, max_zoom,
+            field_min_zooms, processes, feedback,
+        )
+
+    def export_geoparquet(self, path: str, use_subset: bool = True, feedback=None) -> int:
+        """Writes the loaded table to a GeoParquet file, see geoparquet.write_geoparquet.
+
+        Rows are sorted along a Hilbert curve and written one row group at a time, with
+        a bbox covering column, so that spatial readers only read the row groups they
+        need.
+
+        :param path: path of the file, replaced if it exists
+        :type path: str
+        :param use_subset: True to only write the rows matching the subset string
+        :type use_subset: bool
+        :param feedback: progress and cancellation
+        :type feedback: QgsFeedback
+        :return: number of written rows, 0 when cancelled
+        :rtype: int
+        """
+        if not self._is_valid or self._index_geometry_column is None:
+            raise ValueError("GeoParquet export needs a valid layer with geometries")
+        crs_projjson = ""
+        if self._crs.isValid():
+            # QGIS writes PROJJSON from 3.28, the CRS is left unknown before
+            to_json_string = getattr(self._crs, "toJsonString", None)
+            crs_projjson = to_json_string() if to_json_string is not None else ""
+        table = self._table_loader.table()
+        dataframe = table.dataframe()
+        return write_geoparquet(
+            path, dataframe, dataframe.columns[self._index_geometry_column],
+            table.geometry_bounds(), self._subset_rows(table) if use_subset else None,
+            crs_projjson, feedback,
+        )
+
+    def get_table_version(self) -> Union[int, None]:
+        """Returns the version of the shared table, as reported by the server.
+
+        When the layer is opened at a timestamp, this is the version at that time.
+        """
+        return self._table_version
 
     def get_index_geometry_column(self):
         return self._index_geometry_column
@@ -206,12 +682,18 @@ class DeltaLakeProvider(QgsVectorDataProvider):
             if self._is_valid and self._geometry_column is not None:
                 # get the first occurring value in the geometry column
                 try:
-                    geometry_delta_lake = from_wkb(self._dataframe[self._geometry_column][0], on_invalid="warn").geom_type
-                    self._wkb_type = mapping_delta_lake_qgis_geometry.get(geometry_delta_lake, QgsWkbTypes.Unknown)
+                    geometry_delta_lake = self._cached_value("geometry_type")
+                    if geometry_delta_lake is None:
+                        first_rows = self.get_dataframe(limit=1)
+                        geometry_delta_lake = from_wkb(first_rows[self._geometry_column][0],
+                                                       on_invalid="warn").geom_type
+                        self._update_cached_metadata(geometry_type=geometry_delta_lake)
+                    self._wkb_type = mapping_delta_lake_qgis_geometry.get(
+                        geometry_delta_lake, QgsWkbTypes.Unknown
+                    )
                 except:
                     self._wkb_type = QgsWkbTypes.Unknown
                     self._is_valid = False
-                print(geometry_delta_lake)
                 if self._wkb_type == QgsWkbTypes.Unknown:
                     PluginLogger.log(
                         self.tr(
@@ -221,7 +703,6 @@ class DeltaLakeProvider(QgsVectorDataProvider):
                         duration=15,
                         push=True,
                     )
-        print('--> Returning wkb type')
         return self._wkb_type
 
     def get_geometry_column(self) -> str:
@@ -229,10 +710,16 @@ class DeltaLakeProvider(QgsVectorDataProvider):
         return self._geometry_column
 
     def primary_key(self) -> int:
-        # delta shares do not have primary keys
+        # delta shares do not have primary keys, a single key column given in the uri stands for it
         self._primary_key = -1
+        if len(self._key_columns) == 1:
+            self._primary_key = self.fields().lookupField(self._key_columns[0])
         return self._primary_key
 
+    def pkAttributeIndexes(self) -> list[int]:
+        """Returns the indexes of the key columns feature ids are derived from"""
+        return [self.fields().lookupField(name) for name in self._key_columns]
+
     def fields(self) -> QgsFields:
         """Detects field name and type. Converts the type into a QVariant, and returns a
         QgsFields containing QgsFields.
@@ -242,18 +729,40 @@ class DeltaLakeProvider(QgsVectorDataProvider):
             self._fields = QgsFields()
             if self._is_valid:
                 for field in self._schema_fields:
-                    # print (f"name: {field['name']} type: {field['type']}")
-                    
                     if type(field['type']) is dict:
-                        qgs_field = QgsField(field['name'], type=mapping_delta_lake_qgis_type[field['type']['type']]['type'],
-                                             typeName=mapping_delta_lake_qgis_type[field['type']['type']]['type_name'])
+                        field_type = mapping_delta_lake_qgis_type[field['type']['type']]
+                        qgs_field = QgsField(field['name'], type=field_type['type'],
+                                             typeName=field_type['type_name'])
                     else:                        
-                        qgs_field = QgsField(field['name'], type=mapping_delta_lake_qgis_type[field['type']]['type'],
-                                             typeName=mapping_delta_lake_qgis_type[field['type']]['type_name'])
+                        field_type = mapping_delta_lake_qgis_type[field['type']]
+                        qgs_field = QgsField(field['name'], type=field_type['type'],
+                                             typeName=field_type['type_name'])
                         
                     self._fields.append(qgs_field)
+                if self._display_mode == "thinned" \
+                        and self._fields.lookupField(THINNED_COUNT_FIELD) < 0:
+                    # filled by the iterators, see thinned_count_field
+                    count_type = mapping_delta_lake_qgis_type["integer"]
+                    self._fields.append(
+                        QgsField(THINNED_COUNT_FIELD, type=count_type['type'],
+                                 typeName=count_type['type_name'])
+                    )
         return self._fields
 
+    def thinned_count_field(self) -> int:
+        """Returns the index of the field holding, in map renderings of a thinned layer,
+        the number of features each rendered feature stands for (1 when features are not
+        thinned), -1 for other layers. Styles can size or color the points with it.
+        """
+        if self._display_mode != "thinned":
+            return -1
+        index = self.fields().lookupField(THINNED_COUNT_FIELD)
+        return index if index >= len(self._schema_fields) else -1
+
+    def _is_table_field(self, index: int) -> bool:
+        """Tells whether a field index is a column of the table, not a computed field"""
+        return self._is_valid and 0 <= index < len(self._schema_fields)
+
     def extent(self) -> QgsRectangle:
         """Calculates the extent and returns a QgsRectangle"""
         if not self._extent:
@@ -263,9 +772,19 @@ class DeltaLakeProvider(QgsVectorDataProvider):
                     message="Using empty extent because geometry is not valid",
                     log_level=4,
                 )
+            elif self._offline_snapshot is not None and not self._subset_string:
+                extent_bounds = self._offline_snapshot.extent()
+                self._extent = QgsRectangle(*extent_bounds)
+            elif self._cached_value("extent") is not None:
+                # extent of the previous session, until the table is loaded
+                return QgsRectangle(*self._cached_value("extent"))
             else:
-                extent_bounds = total_bounds(from_wkb(self._dataframe[self._geometry_column]))
+                table = self._table_loader.table()
+                subset_rows = self._subset_rows(table)
+                extent_bounds = table.extent(subset_rows)
                 self._extent = QgsRectangle(*extent_bounds)
+                if subset_rows is None and not np.isnan(extent_bounds).any():
+                    self._update_cached_metadata(extent=list(extent_bounds))
 
                 PluginLogger.log(
                     message="Extent calculated for {}: "
@@ -305,14 +824,179 @@ class DeltaLakeProvider(QgsVectorDataProvider):
         """
         return self._table_name
 
-    def uniqueValues(self, fieldIndex) -> set:
+    def _subset_rows(self, table):
+        """Returns the rows of a table snapshot matching the subset string, None without subset"""
+        return DeltaLakeFeatureSource(self).subset_rows(table) if self._subset_string else None
+
+    def _subset_column(self, table, fieldIndex: int) -> pd.Series:
+        """Returns the values of a column, restricted to the rows matching the subset string"""
+        column = table.column(fieldIndex)
+        subset_rows = self._subset_rows(table)
+        return column if subset_rows is None else column.take(subset_rows)
+
+    def _extreme_value(self, fieldIndex: int, maximum: bool):
+        """Returns the minimum or maximum value of a field.
+
+        Without subset, the statistics of the files are used when they cover the column,
+        which does not need to load the table. Otherwise the value is computed on the
+        loaded column, and cached per column, table version and subset string.
+        """
+        if not self._is_table_field(fieldIndex):
+            return None
+        column_name = self.fields().field(fieldIndex).name()
+        if not self._subset_string and self._is_numeric_column(fieldIndex):
+            column_range = self._table_file_statistics().column_ranges.get(column_name)
+            if column_range is not None:
+                return column_range[1 if maximum else 0]
+        table = self._table_loader.table()
+        value = table.cached(
+            ("maximum" if maximum else "minimum", column_name, self._subset_string),
+            lambda: extreme_value(self._subset_column(table, fieldIndex), maximum),
+        )
+        if column_name == self._temporal_field and not self._subset_string \
+                and not self._temporal_range_known:
+            # first temporal query: the range of the loaded column is at hand
+            self._temporal_range_known = True
+            self._set_available_temporal_range(
+                self.minimumValue(fieldIndex), self.maximumValue(fieldIndex)
+            )
+        return value
+
+    def _is_numeric_column(self, fieldIndex: int) -> bool:
+        """Tells whether file statistics of a column can be trusted, strings may be truncated"""
+        field_type = self._schema_fields[fieldIndex]['type']
+        return field_type in ("byte", "short", "integer", "long", "bigint", "float", "double")
+
+    def minimumValue(self, fieldIndex: int):
+        """Returns the minimum value of a field
+
+        :param fieldIndex: Index of field
+        :type fieldIndex: int
+        """
+        return self._extreme_value(fieldIndex, maximum=False)
+
+    def maximumValue(self, fieldIndex: int):
+        """Returns the maximum value of a field
+
+        :param fieldIndex: Index of field
+        :type fieldIndex: int
+        """
+        return self._extreme_value(fieldIndex, maximum=True)
+
+    def uniqueValues(self, fieldIndex: int, limit: int = -1) -> set:
         """Returns the unique values of a field
 
+        The values are cached per column, table version, subset string and limit.
+
         :param fieldIndex: Index of field
         :type fieldIndex: int
+        :param limit: maximum number of values, -1 for all of them
+        :type limit: int
         """
+        if not self._is_table_field(fieldIndex):
+            return set()
         column_name = self.fields().field(fieldIndex).name()
-        return self._dataframe[column_name].unique()
+        table = self._table_loader.table()
+        try:
+            return set(table.cached(
+                ("unique", column_name, self._subset_string, limit),
+                lambda: unique_values(self._subset_column(table, fieldIndex), limit),
+            ))
+        except TypeError:
+            # values such as structs cannot be compared
+            return set()
+
+    def aggregate(self, aggregate, index: int, parameters, context, fids=None):
+        """Computes an aggregate of a field on the loaded columns, instead of letting
+        QGIS iterate over every feature.
+
+        Filters referencing variables (such as ``@parent``) depend on the calling
+        context: they are left to QGIS, as are the aggregates not computed here.
+
+        :param aggregate: aggregate to compute
+        :type aggregate: QgsAggregateCalculator.Aggregate
+        :param index: Index of field
+        :type index: int
+        :param parameters: aggregate parameters, only the filter is used
+        :type parameters: QgsAggregateCalculator.AggregateParameters
+        :param context: expression context
+        :type context: QgsExpressionContext
+        :param fids: feature ids to aggregate, all features if None
+        :type fids: set
+        :return: the value, and whether it was computed
+        :rtype: tuple
+        """
+        function = mapping_qgis_aggregate.get(aggregate)
+        if function is None or not self._is_table_field(index) \
+                or index == self._index_geometry_column:
+            return None, False
+        filter_string = parameters.filter or None
+        if filter_string is not None:
+            filter_expression = QgsExpression(filter_string)
+            if filter_expression.hasParserError() or filter_expression.referencedVariables():
+                return None, False
+        try:
+            value = self.aggregate_values(
+                function, self.fields().field(index).name(), filter_string=filter_string, fids=fids
+            )
+        except (TypeError, ValueError):
+            return None, False
+        return value, True
+
+    def aggregate_values(self, function: str, column_name: str, filter_string: str = None,
+                         group_by: str = None, fids=None, quantile: float = 0.5):
+        """Aggregates the values of a column, optionally by group.
+
+        Results without feature ids are cached per table version, subset string,
+        filter and group column.
+
+        :param function: one of kernels.AGGREGATE_FUNCTIONS
+        :type function: str
+        :param column_name: column to aggregate
+        :type column_name: str
+        :param filter_string: expression selecting the rows to aggregate
+        :type filter_string: str
+        :param group_by: column grouping the rows
+        :type group_by: str
+        :param fids: feature ids to aggregate, all features if None
+        :type fids: Iterable[int]
+        :param quantile: quantile computed by the "quantile" function
+        :type quantile: float
+        :raises ValueError: if the function is unknown
+        :raises TypeError: if the function needs numbers and the column does not hold numbers
+        :return: the aggregate, or a dictionary of aggregates by group value
+        """
+        table = self._table_loader.table()
+
+        def compute():
+            source = DeltaLakeFeatureSource(self)
+            rows = source.subset_rows(table)
+            if filter_string:
+                filter_rows = source.expression_rows(table, filter_string)
+                rows = filter_rows if rows is None \
+                    else np.intersect1d(rows, filter_rows, assume_unique=True)
+            if fids is not None:
+                fid_rows = table.rows_for_feature_ids(fids)
+                rows = fid_rows if rows is None \
+                    else np.intersect1d(rows, fid_rows, assume_unique=True)
+            dataframe = table.dataframe()
+            column = dataframe[column_name]
+            if rows is not None:
+                column = column.take(rows)
+            if group_by is None:
+                return aggregate_column(column, function, quantile)
+            keys = dataframe[group_by] if rows is None else dataframe[group_by].take(rows)
+            return aggregate_groups(column, keys, function, quantile)
+
+        if fids is not None:
+            return compute()
+        return table.cached(
+            (
+                "aggregate", function, column_name, self._subset_string, filter_string, group_by,
+                quantile,
+            ),
+            compute,
+        )
 
     def getFeatures(self, request=QgsFeatureRequest()) -> QgsFeature:
         """Return feature iterator"""
@@ -323,14 +1007,38 @@ class DeltaLakeProvider(QgsVectorDataProvider):
         )
 
     def subsetString(self) -> str:
-        return ""
+        return self._subset_string
 
-    def setSubsetString(self, subsetString: str) -> bool:
-        return False
+    def setSubsetString(self, subsetString: str, updateFeatureCount: bool = True) -> bool:
+        """Sets the subset string, a QGIS expression filtering the features of the layer
+
+        :param subsetString: expression, empty for no filter
+        :type subsetString: str
+        :return: False if the expression is not valid
+        :rtype: bool
+        """
+        subsetString = subsetString or ""
+        if subsetString == self._subset_string:
+            return True
+        if subsetString:
+            expression = QgsExpression(subsetString)
+            if expression.hasParserError():
+                PluginLogger.log(
+                    self.tr("Invalid subset string {}: {}".format(
+                        subsetString, expression.parserErrorString()
+                    )),
+                    log_level=2,
+                    push=True,
+                )
+                return False
+        self._subset_string = subsetString
+        self._feature_count = None
+        self._extent = None
+        self.dataChanged.emit()
+        return True
 
     def supportsSubsetString(self) -> bool:
-        # the provider does not handle subsets at the moment
-        return False
+        return True
 
 
 def _table_uri(connection_profile_path,
@@ -338,6 +1046,62 @@ def _table_uri(connection_profile_path,
     return f"{connection_profile_path}#{share_name}.{schema_name}.{table_name}"
 
 
+def fetch_table_metadata(connection_profile_path, share_name, schema_name, table_name,
+                         version: Union[int, None] = None,
+                         timestamp: Union[str, None] = None) -> dict:
+    """Asks the sharing server for the metadata of a table
+
+    :param version: version of the table, None for the latest one
+    :type version: int
+    :param timestamp: time of the version of the table, used if version is None
+    :type timestamp: str
+    :return: ``version``, ``schema_string`` and ``index_geometry_column`` (None without
+        geometry column) of the table, and the ``file_statistics`` of past versions
+    :rtype: dict
+    """
+    rest_client = DataSharingRestClient(DeltaSharingProfile.read_from_file(connection_profile_path))
+    table = Table(name=table_name, share=share_name, schema=schema_name)
+    file_statistics = None
+    if version is not None or timestamp is not None:
+        # listing the files of a past version returns its metadata, its version
+        # number (when opened by timestamp) and the statistics of its files
+        response = rest_client.list_files_in_table(table, version=version, timestamp=timestamp)
+        statistics = FileStatistics.from_files(response.add_files)
+        file_statistics = {
+            "row_count": statistics.row_count, "column_ranges": statistics.column_ranges,
+        }
+    else:
+        # one round trip returns both the metadata and the version of the table
+        response = rest_client.query_table_metadata(table)
+    schema_fields = json.loads(response.metadata.schema_string)['fields']
+    geometry_columns = [i for i, f in enumerate(schema_fields)
+                        if "<geometry>" in f['metadata'].get('comment', '--')]
+    return {
+        "version": response.delta_table_version,
+        "schema_string": response.metadata.schema_string,
+        "index_geometry_column": geometry_columns[0] if geometry_columns else None,
+        "file_statistics": file_statistics,
+    }
+
+
+def _refresh_cached_metadata(key: str, cached_metadata: dict, connection_profile_path,
+                             share_name, schema_name, table_name) -> None:
+    """Updates the cached metadata of the latest version of a table, in the background"""
+    table_metadata = fetch_table_metadata(
+        connection_profile_path, share_name, schema_name, table_name
+    )
+    if table_metadata["version"] == cached_metadata.get("version"):
+        return
+    if table_metadata["schema_string"] != cached_metadata.get("schema_string"):
+        PluginLogger.log(
+            "The schema of {}.{}.{} changed since the project was saved, reload the layer to "
+            "get its new fields".format(share_name, schema_name, table_name),
+            log_level=1,
+            push=False,
+        )
+    metadata_cache().update(key, extent=None, row_count=None, geometry_type=None, **table_metadata)
+
+
 def client_connect(connection_profile_path) -> SharingClient:
     """Open a connection to the DeltaLake table
 
@@ -359,7 +1123,9 @@ def client_connect(connection_profile_path) -> SharingClient:
         return client
     except FileNotFoundError as exc:
         PluginLogger.log(
-            "Connection profile path does not exist: {}. Trace: {}".format(connection_profile_path, exc),
+            "Connection profile path does not exist: {}. Trace: {}".format(
+                connection_profile_path, exc
+            ),
             log_level=2,
             push=True,
         )
@@ -373,13 +1139,24 @@ def client_connect(connection_profile_path) -> SharingClient:
         raise exc
 
 
+# optional uri parameters, only present in the uri when they are set
+URI_OPTIONS = ("fid_columns", "version", "timestamp", "display_mode", "offline_path")
+# display modes of the display_mode uri parameter
+DISPLAY_MODES = ("thinned",)
+# numbers of the layers opened in the session, see layer_key
+_layer_numbers = itertools.count(1)
+
+
 def _uri_intermediate_structure(connection_profile_path: str,
-                                share_name: str, schema_name: str, table_name: str, epsg_id: int):
-    return {"connection_profile_path": connection_profile_path,
-            "share_name": share_name,
-            "schema_name": schema_name,
-            "table_name": table_name,
-            "epsg_id": epsg_id}
+                                share_name: str, schema_name: str, table_name: str, epsg_id: int,
+                                **options):
+    structure = {"connection_profile_path": connection_profile_path,
+                 "share_name": share_name,
+                 "schema_name": schema_name,
+                 "table_name": table_name,
+                 "epsg_id": epsg_id}
+    structure.update({key: value for key, value in options.items() if value not in (None, "")})
+    return structure
 
 
 def decode_uri(uri: str) -> dict[str, Union[str, int]]:
@@ -394,6 +1171,7 @@ def decode_uri(uri: str) -> dict[str, Union[str, int]]:
     schema_name = ""
     table_name = ""
     epsg_id = ""
+    options = {}
 
     for variable in uri.split(" "):
         key, value = variable.split("=")
@@ -407,6 +1185,8 @@ def decode_uri(uri: str) -> dict[str, Union[str, int]]:
             table_name = value
         elif key == "epsg_id":
             epsg_id = int(value)
+        elif key in URI_OPTIONS:
+            options[key] = urllib.parse.unquote_plus(value)
 
     if Qgis.QGIS_VERSION_INT < 33000:
         # The logic to parse an uri and convert the path from
@@ -433,7 +1213,7 @@ def decode_uri(uri: str) -> dict[str, Union[str, int]]:
         connection_profile_path = QgsProject.instance() \
             .pathResolver().readPath(connection_profile_path)
     return _uri_intermediate_structure(connection_profile_path,
-                                       share_name, schema_name, table_name, epsg_id)
+                                       share_name, schema_name, table_name, epsg_id, **options)
 
 
 def encode_uri(parts: dict[str, str]) -> str:
@@ -443,16 +1223,22 @@ def encode_uri(parts: dict[str, str]) -> str:
     :param Dict[str, str] parts: parts as returned by decodeUri
     :returns: uri as string
     """
-    uri = f"connection_profile_path={urllib.parse.quote_plus(parts['connection_profile_path'], safe='/')} " \
+    profile_path = urllib.parse.quote_plus(parts['connection_profile_path'], safe='/')
+    uri = f"connection_profile_path={profile_path} " \
         f"share_name={parts['share_name']} schema_name={parts['schema_name']} " \
         f"table_name={parts['table_name']} epsg_id={parts['epsg_id']}"
+    for key in URI_OPTIONS:
+        if parts.get(key) not in (None, ""):
+            uri += f" {key}={urllib.parse.quote_plus(str(parts[key]))}"
     return uri
 
 
 def encode_uri_from_values(connection_profile_path: str,
-                           share_name: str, schema_name: str, table_name: str, epsg_id: int) -> str:
+                           share_name: str, schema_name: str, table_name: str, epsg_id: int,
+                           **options) -> str:
     return encode_uri(_uri_intermediate_structure(connection_profile_path,
-                                                  share_name, schema_name, table_name, epsg_id))
+                                                  share_name, schema_name, table_name, epsg_id,
+                                                  **options))
 
 
 def absolute_to_relative_uri(uri: str, context: QgsReadWriteContext) -> str:
@@ -478,6 +1264,8 @@ def absolute_to_relative_uri(uri: str, context: QgsReadWriteContext) -> str:
     decoded_uri = decode_uri(uri)
     decoded_uri["connection_profile_path"] = context.pathResolver() \
         .writePath(decoded_uri["connection_profile_path"])
+    if decoded_uri.get("offline_path"):
+        decoded_uri["offline_path"] = context.pathResolver().writePath(decoded_uri["offline_path"])
     return encode_uri(decoded_uri)
 
 
@@ -503,6 +1291,8 @@ def relative_to_absolute_uri(uri: str, context: QgsReadWriteContext) -> str:
     decoded_uri = decode_uri(uri)
     decoded_uri["connection_profile_path"] = context.pathResolver() \
         .readPath(decoded_uri["connection_profile_path"])
+    if decoded_uri.get("offline_path"):
+        decoded_uri["offline_path"] = context.pathResolver().readPath(decoded_uri["offline_path"])
     return encode_uri(decoded_uri)
 
 
@@ -0,0 +1,1021 @@
+"""
+    Loaded versions of a shared table, shared between the provider and its feature sources.
+"""
+
+# standard
+from __future__ import annotations
+
+import json
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Union
+
+# 3rd party
+import numpy as np
+import pandas as pd
+import shapely
+
+# project
+from .aggregation_grid import AggregationGrid
+from .geometry_store import wkb_bounds
+from .indexes import HashIndex, SortedIndex, build_index
+from .kernels import (
+    compact_dataframe,
+    grid_representatives,
+    key_feature_ids,
+    simplify_wkb,
+    sort_permutation,
+)
+from .load_pool import run_once
+from .memory_governor import memory_governor
+from .toolbelt.instrumentation import instrumentation, layer_key
+from .toolbelt.log_handler import PluginLogger
+from .toolbelt.preferences import PluginOptionsManager
+
+_MISSING = object()
+
+# memory the row selections of past requests may use, per table snapshot
+REQUEST_CACHE_BYTES = 64 * 1024 * 1024
+# number of levels of detail (simplified geometries, thinned points, ...) kept per table snapshot
+LEVELS_OF_DETAIL = 8
+
+
+def _structure_nbytes(value) -> int:
+    """Returns the memory of a structure derived from a table, with the objects held by
+    arrays of Python objects (e.g. WKB geometries); memory-mapped arrays are on disk
+    """
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        if value.dtype == object and value.ndim == 1:
+            return int(pd.Series(value, copy=False).memory_usage(index=False, deep=True))
+        return value.nbytes
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (tuple, list)):
+        return sum(_structure_nbytes(item) for item in value)
+    nbytes = getattr(value, "nbytes", None)
+    return nbytes if isinstance(nbytes, int) else 0
+
+
+@dataclass
+class FileStatistics:
+    """Statistics of a table version, gathered from the statistics of its files"""
+
+    # number of rows, None if a file does not report it
+    row_count: Union[int, None] = None
+    # (minimum, maximum) by column name, for columns all files report
+    column_ranges: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_files(cls, add_files) -> FileStatistics:
+        """Merges the statistics of the files of a table
+
+        :param add_files: files listed by the sharing server
+        :type add_files: Sequence[delta_sharing.protocol.AddFile]
+        """
+        files_stats = [
+            json.loads(add_file.stats) if add_file.stats else {} for add_file in add_files
+        ]
+        if any(stats.get("numRecords") is None for stats in files_stats):
+            return cls()
+        column_names = set()
+        for stats in files_stats:
+            column_names |= set(stats.get("minValues", {})) | set(stats.get("maxValues", {}))
+        row_count = 0
+        column_ranges = {}
+        invalid_columns = set()
+        for stats in files_stats:
+            num_records = stats["numRecords"]
+            row_count += num_records
+            minimums = stats.get("minValues", {})
+            maximums = stats.get("maxValues", {})
+            null_counts = stats.get("nullCount", {})
+            for column_name in column_names:
+                minimum, maximum = minimums.get(column_name), maximums.get(column_name)
+                if minimum is None or maximum is None \
+                        or isinstance(minimum, dict) or isinstance(maximum, dict):
+                    # a file where the column is entirely null does not constrain its range
+                    if null_counts.get(column_name) != num_records:
+                        invalid_columns.add(column_name)
+                    continue
+                if column_name in column_ranges:
+                    known_minimum, known_maximum = column_ranges[column_name]
+                    minimum, maximum = min(minimum, known_minimum), max(maximum, known_maximum)
+                column_ranges[column_name] = (minimum, maximum)
+        for column_name in invalid_columns:
+            column_ranges.pop(column_name, None)
+        return cls(row_count, column_ranges)
+
+
+class RowSelectionCache:
+    """Least recently used row selections of feature requests.
+
+    Maps the normalised signature of a request to the rows it selected, so that
+    identical requests (panning back, redrawing after a style change, ...) skip
+    filtering. Entries are bounded by the memory of their row arrays.
+
+    :param max_bytes: memory the cached selections may use
+    :type max_bytes: int
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._selections = OrderedDict()
+
+    @staticmethod
+    def _size(selection) -> int:
+        return 64 + sum(item.nbytes for item in selection if isinstance(item, np.ndarray))
+
+    def get(self, signature):
+        """Returns the selection cached for a request signature, None if there is none"""
+        with self._lock:
+            selection = self._selections.get(signature)
+            if selection is not None:
+                self._selections.move_to_end(signature)
+            return selection
+
+    def put(self, signature, selection) -> None:
+        """Caches the selection of a request, dropping the least recently used ones
+        beyond the budget
+
+        :param signature: hashable signature of the request
+        :param selection: rows selected (None for all rows), then any other data
+        :type selection: tuple
+        """
+        size = self._size(selection)
+        if size > self._max_bytes:
+            return
+        if selection[0] is not None:
+            # shared between iterators, never modified
+            selection[0].setflags(write=False)
+        with self._lock:
+            previous = self._selections.pop(signature, None)
+            if previous is not None:
+                self._bytes -= self._size(previous)
+            self._selections[signature] = selection
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                _, evicted = self._selections.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+class DeltaLakeTable:
+    """Immutable snapshot of a loaded version of a shared table.
+
+    The dataframe is never modified once loaded. Structures derived from it (sort
+    permutations, ...) are computed lazily and cached on the snapshot, so iterators
+    running on parallel render threads share them.
+
+    Holders of the snapshot call :meth:`acquire` and :meth:`release`; the data is
+    freed when the last reference is released.
+    """
+
+    def __init__(self, dataframe: pd.DataFrame, version: Union[int, None],
+                 index_geometry_column: int, key_columns: tuple[str, ...] = ()):
+        self._dataframe = dataframe
+        self._version = version
+        self._index_geometry_column = index_geometry_column
+        self._key_columns = key_columns
+        self._lock = threading.Lock()
+        self._references = 0
+        self._cache = {}
+        self._fid_map = None
+        self._request_cache = RowSelectionCache(REQUEST_CACHE_BYTES)
+        # (value, memory) of each level
+        self._levels_of_detail = OrderedDict()
+        self._dataframe_bytes = None
+        # memory of the structures of _cache and _fid_map
+        self._cache_bytes = 0
+
+    def acquire(self) -> DeltaLakeTable:
+        """Takes a reference on the snapshot
+
+        :return: the snapshot itself
+        :rtype: DeltaLakeTable
+        """
+        with self._lock:
+            self._references += 1
+        return self
+
+    def try_acquire(self) -> Union[DeltaLakeTable, None]:
+        """Takes a reference on the snapshot, unless its data was freed already
+
+        :return: the snapshot itself, None if it was freed
+        """
+        with self._lock:
+            if self._dataframe is None:
+                return None
+            self._references += 1
+        return self
+
+    def release(self) -> None:
+        """Drops a reference on the snapshot, freeing the data with the last one"""
+        with self._lock:
+            self._references -= 1
+            if self._references > 0:
+                return
+            self._dataframe = None
+            self._cache = {}
+            self._fid_map = None
+            self._request_cache = RowSelectionCache(REQUEST_CACHE_BYTES)
+            self._levels_of_detail = OrderedDict()
+            self._cache_bytes = 0
+
+    def reference_count(self) -> int:
+        return self._references
+
+    def dataframe(self) -> pd.DataFrame:
+        return self._dataframe
+
+    def version(self) -> Union[int, None]:
+        return self._version
+
+    def row_count(self) -> int:
+        return len(self._dataframe.index)
+
+    def nbytes(self) -> int:
+        """Returns the memory used by the rows and the structures cached on the snapshot
+        (geometry bounds, indexes, permutations, levels of detail, row
+        selections, ...), 0 once freed. The rows, strings included, are measured once,
+        the structures when they are cached.
+        """
+        dataframe = self._dataframe
+        if dataframe is None:
+            return 0
+        if self._dataframe_bytes is None:
+            self._dataframe_bytes = int(dataframe.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            levels_bytes = sum(size for _, size in self._levels_of_detail.values())
+            cache_bytes = self._cache_bytes
+        return self._dataframe_bytes + cache_bytes + levels_bytes + self._request_cache.nbytes()
+
+    def index_geometry_column(self) -> int:
+        return self._index_geometry_column
+
+    def column_count(self) -> int:
+        return len(self._dataframe.columns)
+
+    def column(self, index: int) -> pd.Series:
+        """Returns a column of the table by position, without copy"""
+        return self._dataframe.iloc[:, index]
+
+    def geometries(self) -> np.ndarray:
+        """Returns the WKB geometries of the table, without copy"""
+        return self._dataframe.iloc[:, self._index_geometry_column].to_numpy()
+
+    def level_of_detail(self, key, compute: Callable[[], object]):
+        """Returns a level of detail of the table, computed on first use.
+
+        Unlike :meth:`cached`, only the last ``LEVELS_OF_DETAIL`` levels used are kept:
+        zooming around uses a few of them, but could otherwise accumulate many.
+
+        :param key: hashable key of the level
+        :param compute: function computing the level
+        :type compute: Callable
+        """
+        with self._lock:
+            level = self._levels_of_detail.get(key)
+            if level is not None:
+                self._levels_of_detail.move_to_end(key)
+                return level[0]
+        value = compute()
+        size = _structure_nbytes(value)
+        with self._lock:
+            value, _ = self._levels_of_detail.setdefault(key, (value, size))
+            while len(self._levels_of_detail) > LEVELS_OF_DETAIL:
+                self._levels_of_detail.popitem(last=False)
+        return value
+
+    def simplified_geometries(self, tolerance: float,
+                              preserve_topology: bool = False) -> np.ndarray:
+        """Returns the WKB geometries of the table, simplified for a tolerance.
+
+        Tolerances are rounded down to a power of two, so that the few levels of detail
+        used while zooming are built once and shared by all requests.
+
+        :param tolerance: distance tolerance, in the units of the table CRS
+        :type tolerance: float
+        :param preserve_topology: True to keep simplified geometries valid
+        :type preserve_topology: bool
+        """
+        level = int(np.floor(np.log2(tolerance)))
+        return self.level_of_detail(
+            ("simplified", level, preserve_topology),
+            lambda: simplify_wkb(self.geometries(), 2.0 ** level, preserve_topology),
+        )
+
+    def thinned_rows(self, cell_size: float, rows: Union[np.ndarray, None] = None,
+                     key=None) -> tuple[np.ndarray, np.ndarray]:
+        """Returns one representative row per occupied cell of a grid, and the number
+        of rows in each cell.
+
+        Points are located by the center of their bounding box.
+
+        :param cell_size: size of the cells, in the units of the table CRS
+        :type cell_size: float
+        :param rows: rows to thin, None for all rows
+        :type rows: np.ndarray
+        :param key: hashable key caching the result as a level of detail, for rows
+            that do not change between requests (e.g. those of a subset string)
+        :return: sorted representative rows, and the number of rows of their cell
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        def compute():
+            bounds = self.geometry_bounds() if rows is None else self.geometry_bounds()[rows]
+            positions, counts = grid_representatives(
+                (bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2, cell_size
+            )
+            return (positions if rows is None else rows[positions]), counts
+
+        if key is None:
+            return compute()
+        return self.level_of_detail(("thinned", cell_size, key), compute)
+
+    def grid_cell_size(self, level: int) -> float:
+        """Returns the width of the cells of a level of the aggregation grid pyramid.
+
+        Cells of the first level are wider than the table and its distance to the
+        origin, each level halves the width of the cells of the previous one. Widths
+        are powers of two, so that the pyramid does not depend on the subset string of
+        the layer.
+        """
+        def compute():
+            xmin, ymin, xmax, ymax = self.extent()
+            span = max(abs(xmin), abs(ymin), abs(xmax), abs(ymax), xmax - xmin, ymax - ymin)
+            return 2.0 ** np.ceil(np.log2(span)) if span > 0 else 1.0
+
+        return self.cached("grid_top_cell_size", compute) / 2 ** level
+
+    def aggregation_grid(self, shape: str, level: int, aggregates: tuple[tuple[str, str], ...],
+                         rows: Union[np.ndarray, None] = None, key=None) -> AggregationGrid:
+        """Returns a level of the aggregation grid pyramid, computed on first use.
+
+        :param shape: shape of the cells, one of GRID_SHAPES
+        :type shape: str
+        :param level: level of the pyramid, see :meth:`grid_cell_size`
+        :type level: int
+        :param aggregates: (function, column name) pairs to aggregate by cell
+        :type aggregates: tuple
+        :param rows: rows to aggregate, None for all rows
+        :type rows: np.ndarray
+        :param key: hashable key of the rows (e.g. their subset string), the level is
+            kept as a level of detail of the table under it
+        """
+        def compute():
+            bounds = self.geometry_bounds() if rows is None else self.geometry_bounds()[rows]
+            columns = {}
+            for function, column_name in aggregates:
+                column = self._dataframe[column_name]
+                columns[(function, column_name)] = column if rows is None else column.iloc[rows]
+            return AggregationGrid.from_points(
+                (bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2,
+                shape, self.grid_cell_size(level), columns,
+            )
+
+        return self.level_of_detail(("grid", shape, level, aggregates, key), compute)
+
+    def geometry_bounds(self) -> np.ndarray:
+        """Returns the bounding box of each geometry, built on first use
+
+        :return: (xmin, ymin, xmax, ymax) per row, NaN for missing geometries
+        :rtype: np.ndarray
+        """
+        return self.cached("geometry_bounds", lambda: wkb_bounds(self.geometries()))
+
+    def extent(self, rows: Union[np.ndarray, None] = None) -> tuple[float, float, float, float]:
+        """Returns the bounding box of the geometries of some rows
+
+        :param rows: row positions, None for all rows
+        :type rows: np.ndarray
+        :return: (xmin, ymin, xmax, ymax), NaN without geometry
+        :rtype: tuple
+        """
+        bounds = self.geometry_bounds() if rows is None else self.geometry_bounds()[rows]
+        if not len(bounds) or np.isnan(bounds[:, 0]).all():
+            return (np.nan,) * 4
+        return (
+            float(np.nanmin(bounds[:, 0])), float(np.nanmin(bounds[:, 1])),
+            float(np.nanmax(bounds[:, 2])), float(np.nanmax(bounds[:, 3])),
+        )
+
+    def rows_in_rect(self, rect: tuple[float, float, float, float],
+                     exact: bool = False) -> np.ndarray:
+        """Returns the sorted rows whose geometry intersects a rectangle
+
+        :param rect: (xmin, ymin, xmax, ymax) in the CRS of the table
+        :type rect: tuple
+        :param exact: True to test the geometries themselves, not only their bounding box
+        :type exact: bool
+        """
+        xmin, ymin, xmax, ymax = rect
+        bounds = self.geometry_bounds()
+        # comparisons with NaN are False: missing geometries never intersect
+        rows = np.flatnonzero(
+            (bounds[:, 0] <= xmax) & (bounds[:, 2] >= xmin)
+            & (bounds[:, 1] <= ymax) & (bounds[:, 3] >= ymin)
+        )
+        if exact and len(rows):
+            geometries = shapely.from_wkb(self.geometries().take(rows), on_invalid="ignore")
+            rows = rows[shapely.intersects(geometries, shapely.box(xmin, ymin, xmax, ymax))]
+        return rows
+
+    def request_cache(self) -> RowSelectionCache:
+        """Returns the row selections of past requests on this snapshot"""
+        return self._request_cache
+
+    def cached(self, key, compute: Callable[[], object]):
+        """Returns a structure derived from the table, computed on first use.
+
+        The cache lives as long as the snapshot, so its entries are implicitly tied to
+        this version of the table.
+
+        :param key: hashable key of the structure
+        :param compute: function computing the structure
+        :type compute: Callable
+        """
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            size = _structure_nbytes(value)
+            with self._lock:
+                if key not in self._cache:
+                    self._cache[key] = value
+                    self._cache_bytes += size
+                value = self._cache[key]
+        return value
+
+    def restore_cached(self, key, value) -> None:
+        """Stores a structure computed earlier for this version of the table, e.g. by
+        an offline snapshot, as if it had been computed by :meth:`cached`
+        """
+        size = _structure_nbytes(value)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = value
+                self._cache_bytes += size
+
+    def _feature_id_map(self) -> Union[tuple[np.ndarray, np.ndarray, np.ndarray], None]:
+        """Returns the feature ids of the rows, sorted, and the row of each sorted id.
+
+        Built on first use when the table has key columns; None when feature ids are row
+        positions, which is also the fallback when keys are not unique.
+        """
+        if not self._key_columns:
+            return None
+        if self._fid_map is None:
+            fids = key_feature_ids(self._dataframe, self._key_columns)
+            rows_by_fid = np.argsort(fids, kind="stable")
+            sorted_fids = fids[rows_by_fid]
+            if len(sorted_fids) > 1 and (sorted_fids[1:] == sorted_fids[:-1]).any():
+                PluginLogger.log(
+                    "Key columns {} are not unique, feature ids are row positions".format(
+                        ", ".join(self._key_columns)
+                    ),
+                    log_level=1,
+                    push=False,
+                )
+                self._key_columns = ()
+                return None
+            fid_map = (fids, sorted_fids, rows_by_fid)
+            with self._lock:
+                if self._fid_map is None:
+                    self._fid_map = fid_map
+                    self._cache_bytes += _structure_nbytes(fid_map)
+        return self._fid_map
+
+    def feature_ids(self, rows: np.ndarray) -> np.ndarray:
+        """Returns the feature ids of rows
+
+        :param rows: row positions
+        :type rows: np.ndarray
+        """
+        fid_map = self._feature_id_map()
+        return rows if fid_map is None else fid_map[0].take(rows)
+
+    def rows_for_feature_ids(self, fids) -> np.ndarray:
+        """Returns the sorted row positions of the rows having the given feature ids
+
+        Ids not in the table are ignored.
+
+        :param fids: feature ids
+        :type fids: Iterable[int]
+        """
+        fids = np.fromiter(fids, dtype=np.int64)
+        fid_map = self._feature_id_map()
+        if fid_map is None:
+            rows = fids[(fids >= 0) & (fids < self.row_count())]
+        elif self.row_count() == 0:
+            rows = fids[:0]
+        else:
+            _, sorted_fids, rows_by_fid = fid_map
+            positions = np.searchsorted(sorted_fids, fids).clip(max=len(sorted_fids) - 1)
+            rows = rows_by_fid[positions[sorted_fids[positions] == fids]]
+        return np.unique(rows)
+
+    def order_permutation(self, order_keys: tuple[tuple[str, bool, bool], ...]) -> np.ndarray:
+        """Returns the row positions of the table sorted by the given keys.
+
+        The stable multi-key sort runs once per order-by clause for this version of
+        the table, later requests walk the cached permutation.
+
+        :param order_keys: (column name, ascending, nulls first) for each sort key
+        :type order_keys: tuple
+        :return: row positions in sorted order
+        :rtype: np.ndarray
+        """
+        return self.cached(
+            ("order", order_keys), lambda: sort_permutation(self._dataframe, order_keys)
+        )
+
+    def attribute_index(self, index: int) -> Union[SortedIndex, HashIndex, None]:
+        """Returns the index of a column, built on first use.
+
+        Numeric and temporal columns get a sorted index, answering range conditions,
+        other columns a hash index answering equality conditions.
+
+        :param index: position of the column
+        :type index: int
+        :return: the index, None if the column cannot be indexed
+        :rtype: Union[SortedIndex, HashIndex, None]
+        """
+        return self.cached(("attribute_index", index), lambda: build_index(self.column(index)))
+
+    def attribute_indexes(self) -> dict[int, Union[SortedIndex, HashIndex]]:
+        """Returns the indexes built so far, by position of their column"""
+        with self._lock:
+            return {
+                key[1]: value for key, value in self._cache.items()
+                if isinstance(key, tuple) and key[0] == "attribute_index" and value is not None
+            }
+
+
+class TableVersionCache:
+    """Keeps the last loaded historical versions of tables.
+
+    Historical versions never change, so a layer switching back to a version loaded
+    before gets the snapshot, and the structures cached on it, without downloading
+    anything. The cache holds a reference on each snapshot it keeps.
+
+    :param capacity: number of snapshots kept
+    :type capacity: int
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._tables = OrderedDict()
+
+    def get(self, key) -> Union[DeltaLakeTable, None]:
+        """Returns an acquired snapshot, None if the version is not cached"""
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                return None
+            self._tables.move_to_end(key)
+            return table.acquire()
+
+    def put(self, key, table: DeltaLakeTable) -> None:
+        """Keeps a snapshot, dropping the least recently used ones beyond capacity"""
+        with self._lock:
+            if key in self._tables:
+                return
+            self._tables[key] = table.acquire()
+            while len(self._tables) > self._capacity:
+                _, evicted = self._tables.popitem(last=False)
+                evicted.release()
+
+    def holds(self, table: DeltaLakeTable) -> bool:
+        """Tells whether the cache holds a reference on a snapshot"""
+        with self._lock:
+            return any(kept is table for kept in self._tables.values())
+
+    def discard(self, key) -> None:
+        """Drops the snapshot of a version, if it is kept"""
+        with self._lock:
+            table = self._tables.pop(key, None)
+        if table is not None:
+            table.release()
+
+    def clear(self) -> None:
+        with self._lock:
+            for table in self._tables.values():
+                table.release()
+            self._tables.clear()
+
+
+# historical versions opened with the version or timestamp uri options
+version_cache = TableVersionCache(capacity=4)
+
+
+class TableRegistry:
+    """Snapshots in use by any layer, by table url, version and key columns.
+
+    Layers of the same table (styled twice, duplicated, ...) share one snapshot, and
+    with it the structures cached on it: geometry bounds, attribute indexes,
+    statistics, ... Each layer keeps its own subset string and iterators. The
+    registry holds no reference: a snapshot leaves it once its last holder released it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = weakref.WeakValueDictionary()
+
+    def get(self, key) -> Union[DeltaLakeTable, None]:
+        """Returns an acquired snapshot, None if no layer holds one"""
+        with self._lock:
+            table = self._tables.get(key)
+        return None if table is None else table.try_acquire()
+
+    def register(self, key, table: DeltaLakeTable) -> DeltaLakeTable:
+        """Shares an acquired snapshot with the other layers.
+
+        If another layer registered a snapshot of the same table meanwhile, the given
+        one is released and the registered one is returned instead, acquired.
+        """
+        with self._lock:
+            registered = self._tables.get(key)
+            registered = None if registered is None else registered.try_acquire()
+            if registered is None:
+                self._tables[key] = table
+                return table
+        table.release()
+        return registered
+
+
+# snapshots shared by the layers of the same table
+table_registry = TableRegistry()
+
+
+class DeltaLakeTableLoader:
+    """Loads a shared table on first use, from any thread.
+
+    :param table_uri: table url, as understood by delta_sharing
+    :type table_uri: str
+    :param version: version of the table reported by the server
+    :type version: int
+    :param index_geometry_column: position of the geometry column
+    :type index_geometry_column: int
+    :param key_columns: columns feature ids are derived from, row positions if empty
+    :type key_columns: tuple[str, ...]
+    :param time_travel: True to read this version of the table, False to read the latest one
+    :type time_travel: bool
+    :param file_statistics: statistics of the files, when already known
+    :type file_statistics: FileStatistics
+    :param cached_columns: columns of the schema cached by a previous session, None if
+        the schema comes from the server: ``version`` is then read instead of the latest
+        one, so that the rows match the cached schema
+    :type cached_columns: tuple[str, ...]
+    :param layer: key of the counters of the layer, see
+        :func:`~delta_lake.provider.toolbelt.instrumentation.layer_key`
+    :type layer: str
+    """
+
+    def __init__(self, table_uri: str, version: Union[int, None], index_geometry_column: int,
+                 key_columns: tuple[str, ...] = (), time_travel: bool = False,
+                 file_statistics: Union[FileStatistics, None] = None,
+                 cached_columns: Union[tuple[str, ...], None] = None,
+                 layer: Union[str, None] = None):
+        self._table_uri = table_uri
+        self._layer = layer or layer_key(table_uri)
+        self._version = version
+        self._index_geometry_column = index_geometry_column
+        self._key_columns = key_columns
+        self._time_travel = time_travel
+        self._cached_columns = cached_columns
+        # whether the version of the cached schema is read, see _read_cached_version
+        self._pinned = cached_columns is not None
+        self._file_statistics_version = version if file_statistics is not None else None
+        # guards the state below; downloads happen outside of it, each under its own lock,
+        # so that a preview or the statistics do not wait for the whole table
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._preview_lock = threading.Lock()
+        self._statistics_lock = threading.Lock()
+        self._table = None
+        self._preview = None
+        self._preview_limit = -1
+        self._file_statistics = file_statistics
+        # local copy of the table written when it was evicted, see evict
+        self._spilled = None
+        self._compaction_report = {}
+
+    def table_uri(self) -> str:
+        return self._table_uri
+
+    def layer_key(self) -> str:
+        """Returns the key of the counters of the layer"""
+        return self._layer
+
+    def _read_version(self) -> Union[int, None]:
+        """Returns the version sent to the server, None for the latest one"""
+        return self._version if self._time_travel or self._pinned else None
+
+    def _cache_key(self) -> tuple:
+        return self._table_uri, self._version, self._key_columns
+
+    def _read_key(self) -> tuple:
+        """Returns the key of a whole read: loaders of the same table share their downloads"""
+        if self._cached_columns is not None:
+            # the cached version, or the latest one if it cannot be read
+            return "read", self._table_uri, "cached", self._version
+        return "read", self._table_uri, self._read_version()
+
+    def _read(self, limit: Union[int, None] = None) -> pd.DataFrame:
+        # imported on use: the provider module makes the embedded libs importable first
+        import delta_sharing
+
+        try:
+            if self._cached_columns is not None:
+                return self._read_cached_version(limit)
+            return delta_sharing.load_as_pandas(
+                self._table_uri, limit=limit, version=self._read_version()
+            )
+        except FileNotFoundError as e:
+            PluginLogger.log(
+                "File not found when loading data {}, are you on an allowed network?".format(
+                    self._table_uri
+                ),
+                log_level=2,
+                push=False,
+            )
+            raise e
+
+    def _read_cached_version(self, limit: Union[int, None] = None) -> pd.DataFrame:
+        """Reads the version of the schema cached by a previous session.
+
+        Servers only read past versions of the tables shared with their history: the
+        latest version is read otherwise, as long as its columns are the cached ones.
+
+        :raises ValueError: if the columns of the table changed since the schema was cached
+        """
+        import delta_sharing
+
+        if self._pinned:
+            try:
+                return delta_sharing.load_as_pandas(
+                    self._table_uri, limit=limit, version=self._version
+                )
+            except FileNotFoundError:
+                raise
+            except Exception as exc:
+                PluginLogger.log(
+                    "Version {} of {} cannot be read, reading the latest one. Trace: {}".format(
+                        self._version, self._table_uri, exc
+                    ),
+                    log_level=4,
+                )
+                self._pinned = False
+        dataframe = delta_sharing.load_as_pandas(self._table_uri, limit=limit)
+        if tuple(dataframe.columns) != self._cached_columns:
+            PluginLogger.log(
+                "The schema of {} changed since the project was saved, reload the layer".format(
+                    self._table_uri
+                ),
+                log_level=2,
+                push=True,
+            )
+            raise ValueError("The columns of {} changed".format(self._table_uri))
+        return dataframe
+
+    def _read_table(self) -> tuple[pd.DataFrame, dict[str, tuple[int, int]]]:
+        """Reads the whole table, compacted with the compact_dtypes setting
+
+        :return: the table and the memory (before, after) of each compacted column
+        :rtype: tuple
+        """
+        layer = self._layer
+        with instrumentation.timed(layer, "table_download"):
+            dataframe = self._read()
+        instrumentation.count(layer, "rows_loaded", len(dataframe))
+        if not PluginOptionsManager.get_plg_settings().compact_dtypes:
+            return dataframe, {}
+        with instrumentation.timed(layer, "compaction"):
+            dataframe, report = compact_dataframe(
+                dataframe, skip_columns=(self._index_geometry_column,)
+            )
+        for name, (before, after) in report.items():
+            PluginLogger.log(
+                "Column {} of {} compacted from {} to {} bytes".format(
+                    name, self._table_uri, before, after
+                ),
+                log_level=4,
+            )
+        if report:
+            PluginLogger.log(
+                "{} compacted, {} MB saved".format(
+                    self._table_uri,
+                    sum(before - after for before, after in report.values()) // (1024 * 1024),
+                ),
+                log_level=0,
+            )
+        return dataframe, report
+
+    def compaction_report(self) -> dict[str, tuple[int, int]]:
+        """Returns the memory (before, after) of each column compacted when the whole
+        table was loaded, see kernels.compact_dataframe
+        """
+        return self._compaction_report
+
+    def _build_table(self, dataframe: pd.DataFrame) -> DeltaLakeTable:
+        return DeltaLakeTable(
+            dataframe, self._version, self._index_geometry_column, self._key_columns
+        )
+
+    def known_file_statistics(self) -> Union[FileStatistics, None]:
+        """Returns the statistics of the files if they are known, None otherwise, without
+        listing the files
+        """
+        with self._lock:
+            return self._file_statistics
+
+    def file_statistics_version(self) -> Union[int, None]:
+        """Returns the version of the table the statistics of the files describe, None
+        if it is not known
+        """
+        with self._lock:
+            return self._file_statistics_version
+
+    def file_statistics(self) -> FileStatistics:
+        """Returns the statistics the server reports for the files of the table.
+
+        They only need the list of files, not their content, and are fetched once.
+        """
+        with self._statistics_lock:
+            with self._lock:
+                if self._file_statistics is not None:
+                    return self._file_statistics
+            file_statistics, version = self._list_files()
+            with self._lock:
+                self._file_statistics = file_statistics
+                self._file_statistics_version = version
+            return file_statistics
+
+    def _list_files(self) -> tuple[FileStatistics, Union[int, None]]:
+        """Lists the files of the table
+
+        :return: their statistics, empty if the server cannot list them, and the version
+            of the table they describe
+        :rtype: tuple
+        """
+        # imported on use: the provider module makes the embedded libs importable first
+        from delta_sharing.protocol import DeltaSharingProfile, Table
+        from delta_sharing.rest_client import DataSharingRestClient
+
+        profile_path, table_name = self._table_uri.rsplit("#", 1)
+        share, schema, name = table_name.split(".")
+        try:
+            rest_client = DataSharingRestClient(DeltaSharingProfile.read_from_file(profile_path))
+            with instrumentation.timed(self._layer, "file_listing"):
+                response = rest_client.list_files_in_table(
+                    Table(name=name, share=share, schema=schema),
+                    version=self._read_version(),
+                )
+        except Exception as exc:
+            PluginLogger.log(
+                "File statistics of {} are not available. Trace: {}".format(
+                    self._table_uri, exc
+                ),
+                log_level=1,
+                push=False,
+            )
+            return FileStatistics(), None
+        instrumentation.count(self._layer, "files_listed", len(response.add_files))
+        instrumentation.count(
+            self._layer, "bytes_listed", sum(add_file.size for add_file in response.add_files)
+        )
+        return FileStatistics.from_files(response.add_files), response.delta_table_version
+
+    def loaded_table(self) -> Union[DeltaLakeTable, None]:
+        """Returns the whole table if it is loaded already, without loading it"""
+        return self._table
+
+    def table(self) -> DeltaLakeTable:
+        """Returns the whole table, downloading it the first time.
+
+        A snapshot held by another layer of the same table, or kept by the version
+        cache, is shared. Loaders reading the same table at the same time, e.g. when a
+        project is opened, share one download. A table evicted to disk by the memory
+        governor is read back from it. Previews and statistics do not wait for the
+        download.
+        """
+        memory_governor().touch(self)
+        with self._load_lock:
+            with self._lock:
+                loaded = self._table is None
+                if self._table is None:
+                    self._table = table_registry.get(self._cache_key())
+                    instrumentation.count(
+                        self._layer,
+                        "shared_table_misses" if self._table is None else "shared_table_hits",
+                    )
+                table = self._table
+                spilled = self._spilled
+            if table is None:
+                compaction_report = self._compaction_report
+                if spilled is not None:
+                    instrumentation.count(self._layer, "spilled_table_reads")
+                    table = self._build_table(spilled.read_dataframe()).acquire()
+                    spilled.restore(table)
+                else:
+                    dataframe, compaction_report = run_once(self._read_key(), self._read_table)
+                    table = self._build_table(dataframe).acquire()
+                table = table_registry.register(self._cache_key(), table)
+                if instrumentation.enabled:
+                    # in memory: the sharing client does not report the bytes it transfers
+                    instrumentation.count(self._layer, "bytes_loaded", table.nbytes())
+                if self._time_travel:
+                    version_cache.put(self._cache_key(), table)
+                with self._lock:
+                    if self._table is None:
+                        self._table = table
+                        self._compaction_report = compaction_report
+                    else:
+                        # a preview took the snapshot of another layer meanwhile
+                        table.release()
+                    # the complete table supersedes any preview
+                    self._preview = None
+                    self._preview_limit = -1
+                    table = self._table
+        if loaded:
+            # outside of the lock: the governor may evict the tables of other loaders
+            memory_governor().enforce_budget(keep=self)
+        return table
+
+    def preview(self, limit: int) -> DeltaLakeTable:
+        """Returns a table holding at least the first ``limit`` rows.
+
+        As long as the whole table is not loaded, only the first rows are downloaded:
+        the limit is sent to the server as the protocol's ``limitHint``, so that only
+        the first files (and row groups) of the table are read.
+
+        :param limit: number of rows needed
+        :type limit: int
+        """
+        with self._preview_lock:
+            with self._lock:
+                if self._table is None:
+                    self._table = table_registry.get(self._cache_key())
+                if self._table is not None:
+                    return self._table
+                preview = self._preview
+                preview_limit = self._preview_limit
+            preview_exhausted = preview is not None and preview.row_count() < preview_limit
+            if preview_limit < limit and not preview_exhausted:
+                with instrumentation.timed(self._layer, "preview_download"):
+                    preview = self._build_table(self._read(limit))
+                with self._lock:
+                    if self._table is not None:
+                        return self._table
+                    self._preview = preview
+                    self._preview_limit = limit
+            return preview
+
+    def evict(self, spill_directory: Union[str, None] = None) -> None:
+        """Drops the loaded table to free memory, the next request loads it again.
+
+        Snapshots still in use keep their data until released.
+
+        :param spill_directory: directory where the table is written first, so that it
+            is read back from the disk instead of the sharing server; None to only drop
+            it. Loaders sharing the table share the directory, it is written once.
+        :type spill_directory: str
+        """
+        # imported on use: offline snapshots are built on this module
+        from .offline_snapshot import OfflineSnapshot, write_snapshot
+
+        with self._load_lock:
+            with self._lock:
+                table = self._table
+                spilled = self._spilled
+            if table is None:
+                return
+            if spill_directory is not None and spilled is None:
+                if not OfflineSnapshot.exists(spill_directory):
+                    write_snapshot(spill_directory, table,
+                                   {"table_uri": self._table_uri, "version": self._version})
+                spilled = OfflineSnapshot(spill_directory)
+            with self._lock:
+                self._spilled = spilled
+                if self._time_travel:
+                    version_cache.discard(self._cache_key())
+                self._table.release()
+                self._table = None
+
+    def unload(self) -> None:
+        """Drops the loaded data; snapshots still in use keep theirs until released"""
+        with self._load_lock, self._lock:
+            if self._table is not None:
+                self._table.release()
+            self._table = None
+            self._preview = None
+            self._preview_limit = -1
+            # the governor deletes the directory, other loaders of the table may read it
+            self._spilled = None
@@ -0,0 +1,193 @@
+"""
+    Geometries of a loaded table as contiguous coordinate arrays.
+"""
+
+# standard
+from __future__ import annotations
+
+from typing import Union
+
+# 3rd party
+import numpy as np
+import shapely
+
+# geometries decoded at once when computing bounds, see wkb_bounds
+BOUNDS_CHUNK_SIZE = 65536
+# empty geometry of each family the layout can hold
+_EMPTY_GEOMETRIES = {
+    shapely.GeometryType.POINT: "POINT EMPTY",
+    shapely.GeometryType.LINESTRING: "LINESTRING EMPTY",
+    shapely.GeometryType.POLYGON: "POLYGON EMPTY",
+}
+# single part type of each multi part type
+_SINGLE_TYPES = {
+    shapely.GeometryType.MULTIPOINT: shapely.GeometryType.POINT,
+    shapely.GeometryType.MULTILINESTRING: shapely.GeometryType.LINESTRING,
+    shapely.GeometryType.MULTIPOLYGON: shapely.GeometryType.POLYGON,
+}
+
+
+def _ragged_take(offsets: tuple[np.ndarray, ...],
+                 items: np.ndarray) -> tuple[tuple[np.ndarray, ...], np.ndarray]:
+    """Selects items of nested ragged arrays.
+
+    :param offsets: offsets of each level, innermost (coordinates) first
+    :param items: items of the outermost level to select
+    :return: offsets of the selection, and the coordinates to gather
+    """
+    if not offsets:
+        return (), items
+    level_offsets = offsets[-1]
+    starts = level_offsets[items]
+    lengths = level_offsets[items + 1] - starts
+    selected_offsets = np.zeros(len(items) + 1, dtype=level_offsets.dtype)
+    np.cumsum(lengths, out=selected_offsets[1:])
+    # positions of the children of the selected items, as one array
+    children = np.repeat(starts - selected_offsets[:-1], lengths) + np.arange(selected_offsets[-1])
+    inner_offsets, coordinates = _ragged_take(offsets[:-1], children)
+    return inner_offsets + (selected_offsets,), coordinates
+
+
+class GeometryStore:
+    """Geometries of a table in the ragged array layout of shapely.
+
+    Coordinates of all geometries are held in one contiguous buffer, with offset
+    arrays for parts, rings and geometries, and the bounding box of each geometry is
+    computed once from them with NumPy. Geometries of a few rows, e.g. the
+    candidates of an exact intersection test, are rebuilt from the coordinates
+    without decoding WKB.
+
+    Tables keep their WKB column only, which iterators hand out to QGIS as is: stores
+    are built chunk by chunk to compute bounds, see :func:`wkb_bounds`, and dropped.
+
+    Use :meth:`from_wkb` to build a store.
+    """
+
+    def __init__(self, geometry_type, coordinates: np.ndarray, offsets: tuple[np.ndarray, ...],
+                 missing: np.ndarray, empty: np.ndarray, single: np.ndarray, family):
+        self.geometry_type = geometry_type
+        self._coordinates = coordinates
+        self._offsets = offsets
+        self._missing = missing
+        self._empty = empty
+        self._family = family
+        # geometries stored as multi part ones by the layout, returned as single part
+        self._single = single
+        self._bounds = self._compute_bounds()
+
+    @classmethod
+    def from_wkb(cls, geometries_wkb: np.ndarray) -> Union[GeometryStore, None]:
+        """Builds the store of WKB geometries
+
+        :param geometries_wkb: WKB geometries, None for missing ones
+        :type geometries_wkb: np.ndarray
+        :return: the store, None if there is no geometry or if geometries mix several
+            families (points, lines, polygons), which the layout cannot hold
+        :rtype: Union[GeometryStore, None]
+        """
+        geometries = shapely.from_wkb(geometries_wkb, on_invalid="ignore")
+        type_ids = shapely.get_type_id(geometries)
+        missing = type_ids < 0
+        # empty geometries are left out of the layout, which does not hold them well,
+        # and added back as geometries without coordinates
+        empty = ~missing & shapely.is_empty(geometries)
+        present = ~(missing | empty)
+        present_types = {shapely.GeometryType(type_id) for type_id in np.unique(type_ids[present])}
+        families = {
+            _SINGLE_TYPES.get(geometry_type, geometry_type) for geometry_type in present_types
+        }
+        if len(families) != 1 or next(iter(families)) not in _EMPTY_GEOMETRIES:
+            return None
+        family = next(iter(families))
+        geometry_type, present_coordinates, present_offsets = shapely.to_ragged_array(
+            geometries[present]
+        )
+        if present_offsets:
+            lengths = np.zeros(len(geometries), dtype=present_offsets[-1].dtype)
+            lengths[present] = np.diff(present_offsets[-1])
+            geometry_offsets = np.zeros(len(geometries) + 1, dtype=lengths.dtype)
+            np.cumsum(lengths, out=geometry_offsets[1:])
+            coordinates, offsets = present_coordinates, present_offsets[:-1] + (geometry_offsets,)
+        else:
+            # points have one coordinate each, NaN for empty ones
+            coordinates = np.full((len(geometries), present_coordinates.shape[1]), np.nan)
+            coordinates[present] = present_coordinates
+            offsets = ()
+        single = np.zeros(len(geometries), dtype=bool)
+        if geometry_type in _SINGLE_TYPES:
+            single = present & (type_ids == _SINGLE_TYPES[geometry_type])
+        return cls(geometry_type, coordinates, offsets, missing, empty, single, family)
+
+    def __len__(self) -> int:
+        return len(self._missing)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self._coordinates.nbytes + sum(offsets.nbytes for offsets in self._offsets)
+            + self._missing.nbytes + self._empty.nbytes + self._single.nbytes + self._bounds.nbytes
+        )
+
+    def _coordinate_offsets(self) -> np.ndarray:
+        """Returns the range of coordinates of each geometry"""
+        if not self._offsets:
+            return np.arange(len(self._coordinates) + 1)
+        coordinate_offsets = self._offsets[-1]
+        for level_offsets in self._offsets[-2::-1]:
+            coordinate_offsets = level_offsets[coordinate_offsets]
+        return coordinate_offsets
+
+    def _compute_bounds(self) -> np.ndarray:
+        coordinate_offsets = self._coordinate_offsets()
+        bounds = np.full((len(self), 4), np.nan)
+        starts = coordinate_offsets[:-1]
+        non_empty = coordinate_offsets[1:] > starts
+        if len(self._coordinates) and non_empty.any():
+            xy = self._coordinates[:, :2]
+            # reduceat spans from each start to the next one, empty geometries are masked out
+            bounds[non_empty, :2] = np.fmin.reduceat(xy, starts[non_empty], axis=0)
+            bounds[non_empty, 2:] = np.fmax.reduceat(xy, starts[non_empty], axis=0)
+        return bounds
+
+    def bounds(self) -> np.ndarray:
+        """Returns the bounding box of each geometry
+
+        :return: (xmin, ymin, xmax, ymax) per row, NaN for missing or empty geometries
+        :rtype: np.ndarray
+        """
+        return self._bounds
+
+    def geometries(self, rows: np.ndarray) -> np.ndarray:
+        """Returns shapely geometries of some rows, None for missing ones"""
+        offsets, coordinates = _ragged_take(self._offsets, np.asarray(rows, dtype=np.int64))
+        geometries = shapely.from_ragged_array(
+            self.geometry_type, self._coordinates[coordinates], offsets or None
+        )
+        single = self._single[rows]
+        if single.any():
+            geometries[single] = shapely.get_geometry(geometries[single], 0)
+        empty = self._empty[rows]
+        if empty.any():
+            geometries[empty] = shapely.from_wkt(_EMPTY_GEOMETRIES[self._family])
+        geometries[self._missing[rows]] = None
+        return geometries
+
+
+def wkb_bounds(geometries_wkb: np.ndarray, chunk_size: int = BOUNDS_CHUNK_SIZE) -> np.ndarray:
+    """Computes the bounding box of WKB geometries, one chunk at a time, so that the
+    coordinates of a single chunk are decoded at once
+
+    :param geometries_wkb: WKB geometries, None for missing ones
+    :type geometries_wkb: np.ndarray
+    :param chunk_size: number of geometries decoded at once
+    :type chunk_size: int
+    :return: (xmin, ymin, xmax, ymax) per geometry, NaN for missing or empty ones
+    :rtype: np.ndarray
+    """
+    bounds = np.full((len(geometries_wkb), 4), np.nan)
+    for start in range(0, len(geometries_wkb), chunk_size):
+        chunk = geometries_wkb[start:start + chunk_size]
+        store = GeometryStore.from_wkb(chunk)
+        bounds[start:start + len(chunk)] = store.bounds() if store is not None \
+            else shapely.bounds(shapely.from_wkb(chunk, on_invalid="ignore"))
+    return bounds
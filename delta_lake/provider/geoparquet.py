@@ -0,0 +1,164 @@
+"""
+    Export of a loaded table to GeoParquet.
+"""
+
+# standard
+from __future__ import annotations
+
+import json
+import os
+from typing import Union
+
+# 3rd party
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# project
+from .kernels import hilbert_distances
+
+# rows of a row group: each group covers a compact part of the Hilbert curve, so that
+# readers filtering on the bbox column skip most of them
+ROW_GROUP_SIZE = 65536
+GEOPARQUET_VERSION = "1.1.0"
+_GEOMETRY_TYPE_NAMES = {
+    1: "Point", 2: "LineString", 3: "Polygon", 4: "MultiPoint",
+    5: "MultiLineString", 6: "MultiPolygon", 7: "GeometryCollection",
+}
+
+
+def _geometry_types(geometries_wkb: np.ndarray) -> list[str]:
+    """Lists the geometry types of WKB geometries, read from their header"""
+    codes = {
+        int.from_bytes(bytes(geometry_wkb[1:5]), "little" if geometry_wkb[0] else "big")
+        for geometry_wkb in geometries_wkb if geometry_wkb is not None and len(geometry_wkb) >= 5
+    }
+    types = set()
+    for code in codes:
+        # ISO WKB adds 1000 for Z, 2000 for M and 3000 for ZM, EWKB sets flags in the high bits
+        base = code & 0xFFFF
+        has_z = bool(code & 0x80000000) or base // 1000 in (1, 3)
+        name = _GEOMETRY_TYPE_NAMES.get(base % 1000)
+        if name is None:
+            return []
+        types.add(f"{name} Z" if has_z else name)
+    return sorted(types)
+
+
+def arrow_schema(dataframe: pd.DataFrame, geometry_column: str) -> pa.Schema:
+    """Returns the Arrow schema of a table with WKB geometries.
+
+    Columns of Python objects are typed by their first value, so that a table written
+    batch by batch gets the same schema for every batch.
+    """
+    fields = []
+    for name, column in dataframe.items():
+        if name == geometry_column:
+            fields.append(pa.field(name, pa.binary()))
+        elif column.dtype == object:
+            valid = column.notna().to_numpy()
+            if valid.any():
+                position = int(valid.argmax())
+                arrow_type = pa.array(column.iloc[position:position + 1], from_pandas=True).type
+            else:
+                arrow_type = pa.null()
+            fields.append(pa.field(name, arrow_type))
+        else:
+            fields.append(
+                pa.Schema.from_pandas(dataframe[[name]].iloc[:0], preserve_index=False).field(name)
+            )
+    return pa.schema(fields)
+
+
+def write_geoparquet(path: str, dataframe: pd.DataFrame, geometry_column: str, bounds: np.ndarray,
+                     rows: Union[np.ndarray, None] = None, crs_projjson: str = "",
+                     feedback=None) -> int:
+    """Writes rows of a table to a GeoParquet file, sorted along a Hilbert curve.
+
+    The rows are written one row group at a time, only the rows of the group being
+    copied. Each row gets the bounding box of its geometry in a ``bbox`` covering
+    column, declared in the GeoParquet metadata.
+
+    :param path: path of the file, replaced if it exists
+    :type path: str
+    :param dataframe: table, with WKB geometries
+    :type dataframe: pd.DataFrame
+    :param geometry_column: name of the geometry column
+    :type geometry_column: str
+    :param bounds: (xmin, ymin, xmax, ymax) of each row of the table, NaN for missing geometries
+    :type bounds: np.ndarray
+    :param rows: rows to write, None for all rows
+    :type rows: np.ndarray
+    :param crs_projjson: CRS of the geometries as PROJJSON, e.g. from
+        ``QgsCoordinateReferenceSystem.toJsonString``, empty if it is unknown
+    :type crs_projjson: str
+    :param feedback: progress and cancellation (setProgress, isCanceled), optional
+    :type feedback: QgsFeedback
+    :return: number of written rows, 0 when cancelled: the file is then removed
+    :rtype: int
+    """
+    if rows is None:
+        rows = np.arange(len(dataframe))
+    row_bounds = bounds[rows]
+    located = ~np.isnan(row_bounds).any(axis=1)
+    if located.any():
+        extent = [
+            float(row_bounds[located, 0].min()), float(row_bounds[located, 1].min()),
+            float(row_bounds[located, 2].max()), float(row_bounds[located, 3].max()),
+        ]
+    else:
+        extent = []
+    distances = hilbert_distances(
+        (row_bounds[:, 0] + row_bounds[:, 2]) / 2, (row_bounds[:, 1] + row_bounds[:, 3]) / 2,
+        extent or (0.0, 0.0, 1.0, 1.0),
+    )
+    rows = rows[np.argsort(distances, kind="stable")]
+
+    geometry_metadata = {
+        "encoding": "WKB",
+        "geometry_types": _geometry_types(dataframe[geometry_column].to_numpy()[rows]),
+        "crs": json.loads(crs_projjson) if crs_projjson else None,
+        "covering": {"bbox": {key: ["bbox", key] for key in ("xmin", "ymin", "xmax", "ymax")}},
+    }
+    if extent:
+        geometry_metadata["bbox"] = extent
+    # the bbox covering column follows the columns of the table
+    schema = arrow_schema(dataframe, geometry_column).append(
+        pa.field("bbox", pa.struct([
+            (key, pa.float64()) for key in ("xmin", "ymin", "xmax", "ymax")
+        ]))
+    ).with_metadata({"geo": json.dumps({
+        "version": GEOPARQUET_VERSION,
+        "primary_column": geometry_column,
+        "columns": {geometry_column: geometry_metadata},
+    })})
+    cancelled = False
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, len(rows), ROW_GROUP_SIZE):
+            if feedback is not None and feedback.isCanceled():
+                cancelled = True
+                break
+            group_rows = rows[start:start + ROW_GROUP_SIZE]
+            group = dataframe.take(group_rows)
+            group_bounds = bounds[group_rows]
+            missing = np.isnan(group_bounds[:, 0])
+            bbox = pa.StructArray.from_arrays(
+                [pa.array(group_bounds[:, i], mask=missing) for i in range(4)],
+                fields=list(schema.field("bbox").type),
+                mask=pa.array(missing),
+            )
+            columns = [
+                pa.array(group[name], type=schema.field(name).type, from_pandas=True)
+                for name in dataframe.columns
+            ]
+            writer.write_table(
+                pa.Table.from_arrays(columns + [bbox], schema=schema), row_group_size=ROW_GROUP_SIZE
+            )
+            if feedback is not None:
+                feedback.setProgress(100 * min(start + ROW_GROUP_SIZE, len(rows)) / len(rows))
+    if cancelled:
+        # the metadata bbox covers rows which were not written
+        os.remove(path)
+        return 0
+    return len(rows)
@@ -0,0 +1,431 @@
+"""
+    Column indexes of a loaded table, and the planner resolving filter expressions with them.
+"""
+
+# standard
+from __future__ import annotations
+
+import datetime
+from typing import Union
+
+# 3rd party
+import numpy as np
+import pandas as pd
+
+# PyQGIS
+from qgis.core import (
+    QgsExpression,
+    QgsExpressionContext,
+    QgsExpressionNode,
+    QgsExpressionNodeBinaryOperator,
+    QgsFields,
+)
+from qgis.PyQt.QtCore import QDate, QDateTime, QTime
+
+# variables describing the feature being evaluated, a node using them is not constant
+_FEATURE_VARIABLES = {"feature", "id", "geometry"}
+_NOT_CONSTANT = object()
+
+
+def _datetime_keys(column: pd.Series) -> Union[pd.Series, None]:
+    """Returns a date or time column as naive datetimes, in UTC for columns with a time
+    zone, None for other columns
+    """
+    if pd.api.types.is_datetime64_any_dtype(column.dtype):
+        if getattr(column.dtype, "tz", None) is not None:
+            column = column.dt.tz_convert(None)
+        return column
+    if column.dtype == object:
+        # dates are loaded as Python objects
+        first_valid = column.first_valid_index()
+        if first_valid is not None and isinstance(column[first_valid], datetime.date):
+            return pd.to_datetime(column, errors="coerce")
+    return None
+
+
+def _instant_key(value) -> Union[int, None]:
+    """Returns the nanoseconds since the epoch of a date or time, None for other values.
+
+    Like QGIS, values without a time zone are read as local times.
+    """
+    if isinstance(value, QDate):
+        value = QDateTime(value, QTime(0, 0))
+    if isinstance(value, QDateTime):
+        return value.toMSecsSinceEpoch() * 1000000 if value.isValid() else None
+    if isinstance(value, datetime.date):
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime.combine(value, datetime.time())
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return np.datetime64(value, "ns").astype(np.int64)
+    return None
+
+
+class SortedIndex:
+    """Sorted keys of a numeric or temporal column.
+
+    Range conditions on the column resolve to a contiguous slice of the sorted
+    rows with two binary searches.
+
+    :param column: column to index
+    :type column: pd.Series
+    :raises TypeError: if the column is neither numeric nor temporal
+    """
+
+    def __init__(self, column: pd.Series):
+        datetimes = _datetime_keys(column)
+        if pd.api.types.is_bool_dtype(column.dtype):
+            raise TypeError("Column {} holds booleans".format(column.name))
+        # keys of columns with a time zone are instants, see key
+        self.utc = getattr(column.dtype, "tz", None) is not None
+        if datetimes is not None:
+            self.kind = "datetime"
+            valid = datetimes.notna().to_numpy()
+            keys = datetimes.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        elif pd.api.types.is_numeric_dtype(column.dtype) \
+                and not isinstance(column.dtype, pd.CategoricalDtype):
+            self.kind = "number"
+            valid = column.notna().to_numpy()
+            dtype = np.int64 if pd.api.types.is_integer_dtype(column.dtype) else np.float64
+            keys = column.to_numpy(dtype=dtype, na_value=0)
+        else:
+            raise TypeError("Column {} cannot be sorted".format(column.name))
+        valid_rows = np.flatnonzero(valid)
+        order = np.argsort(keys[valid_rows], kind="stable")
+        self._rows = valid_rows[order]
+        self._keys = keys[valid_rows][order]
+        self._null_rows = np.flatnonzero(~valid)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> SortedIndex:
+        """Restores an index from the arrays returned by :meth:`arrays`, without copy"""
+        index = cls.__new__(cls)
+        index.kind = str(arrays["kind"])
+        index.utc = bool(arrays["utc"]) if "utc" in arrays else False
+        index._rows, index._keys = arrays["rows"], arrays["keys"]
+        index._null_rows = arrays["null_rows"]
+        return index
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """Returns the arrays of the index, to store it"""
+        return {
+            "kind": np.array(self.kind), "utc": np.array(self.utc),
+            "rows": self._rows, "keys": self._keys, "null_rows": self._null_rows,
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return self._rows.nbytes + self._keys.nbytes + self._null_rows.nbytes
+
+    def key(self, value):
+        """Converts a value of an expression to a key of the index, None if not comparable"""
+        if self.kind == "datetime" and self.utc:
+            return _instant_key(value)
+        if self.kind == "datetime":
+            if isinstance(value, QDateTime):
+                value = value.toPyDateTime()
+            elif isinstance(value, QDate):
+                value = value.toPyDate()
+            if isinstance(value, datetime.date):
+                if not isinstance(value, datetime.datetime):
+                    value = datetime.datetime.combine(value, datetime.time())
+                return np.datetime64(value.replace(tzinfo=None), "ns").astype(np.int64)
+            return None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        return None
+
+    def null_rows(self) -> np.ndarray:
+        return self._null_rows
+
+    def valid_rows(self) -> np.ndarray:
+        return np.sort(self._rows)
+
+    def rows_equal(self, keys: list) -> np.ndarray:
+        """Returns the sorted rows whose key is one of the given keys"""
+        chunks = [self.rows_between(key, True, key, True) for key in keys]
+        return np.unique(np.concatenate(chunks)) if chunks else self._rows[:0]
+
+    def rows_between(self, lower=None, lower_inclusive: bool = True,
+                     upper=None, upper_inclusive: bool = True) -> np.ndarray:
+        """Returns the sorted rows whose key lies in a range
+
+        :param lower: lower bound, None for no bound
+        :param lower_inclusive: True if the lower bound is part of the range
+        :type lower_inclusive: bool
+        :param upper: upper bound, None for no bound
+        :param upper_inclusive: True if the upper bound is part of the range
+        :type upper_inclusive: bool
+        """
+        start = 0 if lower is None else np.searchsorted(
+            self._keys, lower, side="left" if lower_inclusive else "right"
+        )
+        stop = len(self._keys) if upper is None else np.searchsorted(
+            self._keys, upper, side="right" if upper_inclusive else "left"
+        )
+        return np.sort(self._rows[start:max(start, stop)])
+
+
+class HashIndex:
+    """Rows of each distinct value of a column.
+
+    Equality and IN conditions resolve to the rows of the requested values with one
+    hash lookup per value. Suited to strings, booleans and categorical columns.
+
+    :param column: column to index
+    :type column: pd.Series
+    :raises TypeError: if the values of the column cannot be hashed
+    """
+
+    def __init__(self, column: pd.Series):
+        codes, uniques = pd.factorize(column)
+        self._uniques = pd.Index(uniques)
+        self.kind = pd.api.types.infer_dtype(np.asarray(uniques), skipna=True)
+        # rows grouped by value, each group in table order
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        null_count = np.searchsorted(sorted_codes, 0)
+        self._null_rows = np.sort(order[:null_count])
+        self._rows = order[null_count:]
+        self._offsets = np.searchsorted(sorted_codes[null_count:], np.arange(len(uniques) + 1))
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> HashIndex:
+        """Restores an index from the arrays returned by :meth:`arrays`"""
+        index = cls.__new__(cls)
+        index.kind = str(arrays["kind"])
+        index._uniques = pd.Index(arrays["uniques"].tolist(), dtype=object)
+        index._rows, index._offsets = arrays["rows"], arrays["offsets"]
+        index._null_rows = arrays["null_rows"]
+        return index
+
+    def arrays(self) -> Union[dict[str, np.ndarray], None]:
+        """Returns the arrays of the index, to store it, None for values other than
+        strings and booleans, which cannot be stored as plain arrays
+        """
+        if self.kind not in ("string", "boolean"):
+            return None
+        return {
+            "kind": np.array(self.kind),
+            "uniques": np.array(
+                self._uniques.tolist(), dtype=str if self.kind == "string" else bool
+            ),
+            "rows": self._rows, "offsets": self._offsets, "null_rows": self._null_rows,
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self._rows.nbytes + self._offsets.nbytes + self._null_rows.nbytes
+            + self._uniques.nbytes
+        )
+
+    def key(self, value):
+        """Converts a value of an expression to a key of the index, None if not comparable"""
+        if self.kind == "string" and isinstance(value, str):
+            return value
+        if self.kind == "boolean" and isinstance(value, bool):
+            return value
+        return None
+
+    def null_rows(self) -> np.ndarray:
+        return self._null_rows
+
+    def valid_rows(self) -> np.ndarray:
+        return np.sort(self._rows)
+
+    def rows_equal(self, keys: list) -> np.ndarray:
+        """Returns the sorted rows whose value is one of the given keys"""
+        positions = np.unique(self._uniques.get_indexer(pd.Index(keys, dtype=object)))
+        chunks = [self._rows[self._offsets[position]:self._offsets[position + 1]]
+                  for position in positions if position >= 0]
+        return np.sort(np.concatenate(chunks)) if chunks else self._rows[:0]
+
+
+def build_index(column: pd.Series) -> Union[SortedIndex, HashIndex, None]:
+    """Builds the index suited to a column: sorted for numbers and times, hashed otherwise
+
+    :param column: column to index
+    :type column: pd.Series
+    :return: the index, None if the column cannot be indexed
+    """
+    try:
+        return SortedIndex(column)
+    except TypeError:
+        pass
+    try:
+        return HashIndex(column)
+    except (TypeError, ValueError):
+        return None
+
+
+_RANGE_OPERATORS = {
+    QgsExpressionNodeBinaryOperator.boGE,
+    QgsExpressionNodeBinaryOperator.boGT,
+    QgsExpressionNodeBinaryOperator.boLE,
+    QgsExpressionNodeBinaryOperator.boLT,
+}
+# operator seen from the other side: 3 < "x" is "x" > 3
+_MIRRORED_OPERATORS = {
+    QgsExpressionNodeBinaryOperator.boGE: QgsExpressionNodeBinaryOperator.boLE,
+    QgsExpressionNodeBinaryOperator.boGT: QgsExpressionNodeBinaryOperator.boLT,
+    QgsExpressionNodeBinaryOperator.boLE: QgsExpressionNodeBinaryOperator.boGE,
+    QgsExpressionNodeBinaryOperator.boLT: QgsExpressionNodeBinaryOperator.boGT,
+}
+
+
+class ExpressionPlanner:
+    """Resolves the parts of a filter expression that indexes can answer.
+
+    Comparisons of a column with a constant, ``[NOT] IN`` lists of constants,
+    ``IS [NOT] NULL`` tests and their combinations with AND and OR are answered by
+    the indexes of the table, built on first use. Other parts of the expression make
+    the result a superset of the matching rows, which QGIS then filters feature by
+    feature.
+
+    :param table: table snapshot
+    :type table: DeltaLakeTable
+    :param fields: fields of the layer
+    :type fields: QgsFields
+    :param context: context constant parts of the expression are evaluated in
+    :type context: QgsExpressionContext
+    """
+
+    def __init__(self, table, fields: QgsFields, context: QgsExpressionContext):
+        self._table = table
+        self._fields = fields
+        self._context = context
+
+    def candidate_rows(self, expression: QgsExpression) -> tuple[Union[np.ndarray, None], bool]:
+        """Returns the rows that may match an expression
+
+        :param expression: filter expression
+        :type expression: QgsExpression
+        :return: sorted rows, None for all rows, and whether exactly these rows match
+        :rtype: tuple
+        """
+        if expression.hasParserError() or expression.rootNode() is None:
+            return None, False
+        return self._plan(expression.rootNode())
+
+    def _index(self, node: QgsExpressionNode) -> Union[SortedIndex, HashIndex, None]:
+        if node.nodeType() != QgsExpressionNode.ntColumnRef:
+            return None
+        field_index = self._fields.lookupField(node.name())
+        # fields beyond the columns of the table are computed by the iterators
+        if field_index < 0 or field_index >= self._table.column_count() \
+                or field_index == self._table.index_geometry_column():
+            return None
+        return self._table.attribute_index(field_index)
+
+    def _keys(self, index: Union[SortedIndex, HashIndex], nodes: list) -> Union[list, None]:
+        """Returns the index keys of constant nodes, None if one of them is not a
+        comparable constant
+        """
+        keys = []
+        for node in nodes:
+            value = self._constant(node)
+            key = None if value is _NOT_CONSTANT else index.key(value)
+            if key is None:
+                return None
+            keys.append(key)
+        return keys
+
+    def _constant(self, node: QgsExpressionNode):
+        """Evaluates a node not depending on the feature, _NOT_CONSTANT otherwise"""
+        if node.referencedColumns() or node.needsGeometry() \
+                or node.referencedVariables() & _FEATURE_VARIABLES:
+            return _NOT_CONSTANT
+        expression = QgsExpression(node.dump())
+        value = expression.evaluate(QgsExpressionContext(self._context))
+        return _NOT_CONSTANT if expression.hasEvalError() else value
+
+    def _plan(self, node: QgsExpressionNode) -> tuple[Union[np.ndarray, None], bool]:
+        """Returns the rows that may match a node, None for all rows, and whether exactly
+        these rows match
+        """
+        if node.nodeType() == QgsExpressionNode.ntInOperator:
+            return self._plan_in(node)
+        if node.nodeType() != QgsExpressionNode.ntBinaryOperator:
+            return None, False
+        operator = node.op()
+        if operator in (
+            QgsExpressionNodeBinaryOperator.boAnd, QgsExpressionNodeBinaryOperator.boOr
+        ):
+            return self._plan_logical(node)
+        if operator in (
+            QgsExpressionNodeBinaryOperator.boIs, QgsExpressionNodeBinaryOperator.boIsNot
+        ):
+            return self._plan_null(node)
+        if operator in (QgsExpressionNodeBinaryOperator.boEQ, QgsExpressionNodeBinaryOperator.boNE):
+            return self._plan_equal(node)
+        if operator in _RANGE_OPERATORS:
+            return self._plan_compare(node)
+        return None, False
+
+    def _plan_in(self, node: QgsExpressionNode) -> tuple[Union[np.ndarray, None], bool]:
+        """Plans ``column [NOT] IN (constants)``"""
+        index = self._index(node.node())
+        keys = None if index is None else self._keys(index, node.list().list())
+        if keys is None:
+            return None, False
+        rows = index.rows_equal(keys)
+        if node.isNotIn():
+            # null values are neither in nor out of the list
+            rows = np.setdiff1d(index.valid_rows(), rows, assume_unique=True)
+        return rows, True
+
+    def _plan_logical(self, node: QgsExpressionNode) -> tuple[Union[np.ndarray, None], bool]:
+        """Plans AND and OR: an AND narrows to either side, an OR needs both sides"""
+        left_rows, left_exact = self._plan(node.opLeft())
+        right_rows, right_exact = self._plan(node.opRight())
+        if node.op() == QgsExpressionNodeBinaryOperator.boOr:
+            if left_rows is None or right_rows is None:
+                return None, False
+            return np.union1d(left_rows, right_rows), left_exact and right_exact
+        if left_rows is None or right_rows is None:
+            return (right_rows if left_rows is None else left_rows), False
+        rows = np.intersect1d(left_rows, right_rows, assume_unique=True)
+        return rows, left_exact and right_exact
+
+    def _plan_null(self, node: QgsExpressionNode) -> tuple[Union[np.ndarray, None], bool]:
+        """Plans ``column IS [NOT] NULL``"""
+        index = self._index(node.opLeft())
+        right = node.opRight()
+        if index is None or right.nodeType() != QgsExpressionNode.ntLiteral \
+                or right.dump().upper() != "NULL":
+            return None, False
+        if node.op() == QgsExpressionNodeBinaryOperator.boIs:
+            return index.null_rows(), True
+        return index.valid_rows(), True
+
+    def _plan_equal(self, node: QgsExpressionNode) -> tuple[Union[np.ndarray, None], bool]:
+        """Plans ``column = constant`` and ``column <> constant``, on either side"""
+        index, other = self._index(node.opLeft()), node.opRight()
+        if index is None:
+            index, other = self._index(node.opRight()), node.opLeft()
+        keys = None if index is None else self._keys(index, [other])
+        if keys is None:
+            return None, False
+        rows = index.rows_equal(keys)
+        if node.op() == QgsExpressionNodeBinaryOperator.boNE:
+            rows = np.setdiff1d(index.valid_rows(), rows, assume_unique=True)
+        return rows, True
+
+    def _plan_compare(self, node: QgsExpressionNode) -> tuple[Union[np.ndarray, None], bool]:
+        """Plans ``column < constant`` and the other ranges, on either side"""
+        operator = node.op()
+        index, other = self._index(node.opLeft()), node.opRight()
+        if not isinstance(index, SortedIndex):
+            index, other = self._index(node.opRight()), node.opLeft()
+            operator = _MIRRORED_OPERATORS[operator]
+        keys = self._keys(index, [other]) if isinstance(index, SortedIndex) else None
+        if keys is None:
+            return None, False
+        inclusive = operator in (
+            QgsExpressionNodeBinaryOperator.boGE, QgsExpressionNodeBinaryOperator.boLE
+        )
+        if operator in (
+            QgsExpressionNodeBinaryOperator.boGE, QgsExpressionNodeBinaryOperator.boGT
+        ):
+            return index.rows_between(lower=keys[0], lower_inclusive=inclusive), True
+        return index.rows_between(upper=keys[0], upper_inclusive=inclusive), True
@@ -0,0 +1,511 @@
+"""
+    Vectorised kernels working on the columns of a loaded table.
+"""
+
+# standard
+from __future__ import annotations
+
+from typing import Union
+
+# 3rd party
+import numpy as np
+import pandas as pd
+import shapely
+
+
+def sortable(column: pd.Series) -> bool:
+    """Tells whether :func:`sort_permutation` can sort a column: struct and array
+    columns, loaded as dicts, lists or arrays, cannot be sorted
+
+    :param column: column to sort
+    :type column: pd.Series
+    :rtype: bool
+    """
+    if column.dtype != object:
+        return True
+    first_valid = column.first_valid_index()
+    return first_valid is None \
+        or not isinstance(column.loc[first_valid], (dict, list, np.ndarray))
+
+
+def sort_permutation(dataframe: pd.DataFrame,
+                     order_keys: tuple[tuple[str, bool, bool], ...]) -> np.ndarray:
+    """Computes the row positions of a table sorted by several keys.
+
+    Each key column is reduced to sorted integer codes, so that descending order and
+    the position of nulls are plain integer arithmetic, and a single stable
+    ``np.lexsort`` orders all keys at once.
+
+    :param dataframe: table to sort
+    :type dataframe: pd.DataFrame
+    :param order_keys: (column name, ascending, nulls first) for each key, primary key first
+    :type order_keys: tuple
+    :return: row positions in sorted order
+    :rtype: np.ndarray
+    :raises TypeError: if a key column cannot be sorted, see :func:`sortable`
+    """
+    sort_keys = []
+    for column_name, ascending, nulls_first in order_keys:
+        codes, uniques = pd.factorize(dataframe[column_name], sort=True)
+        codes = codes.astype(np.int64)
+        nulls = codes < 0
+        if not ascending:
+            codes = len(uniques) - 1 - codes
+        codes[nulls] = -1 if nulls_first else len(uniques)
+        sort_keys.append(codes)
+    # np.lexsort sorts on the last key first
+    return np.lexsort(sort_keys[::-1]) if sort_keys else np.arange(len(dataframe))
+
+
+def python_values(column: pd.Series, rows: np.ndarray) -> list:
+    """Gathers values of a column as Python objects QGIS can store in attributes.
+
+    Missing values (NaN, NaT, NA) become None.
+
+    :param column: column to read
+    :type column: pd.Series
+    :param rows: row positions to gather
+    :type rows: np.ndarray
+    :return: one value per row
+    :rtype: list
+    """
+    values = column.take(rows)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        objects = pd.DatetimeIndex(values).to_pydatetime()
+    else:
+        objects = values.to_numpy(dtype=object)
+    objects[values.isna().to_numpy()] = None
+    return objects.tolist()
+
+
+# string columns are dictionary encoded when they hold at most this many distinct values per row
+COMPACT_CATEGORY_RATIO = 0.5
+# integer types columns are downcast to, smallest first
+_COMPACT_INTEGER_TYPES = (np.int8, np.int16, np.int32)
+
+
+def compact_dataframe(
+    dataframe: pd.DataFrame, skip_columns: tuple[int, ...] = ()
+) -> tuple[pd.DataFrame, dict[str, tuple[int, int]]]:
+    """Stores the columns of a table in smaller types, without changing their values.
+
+    Strings with few distinct values become categoricals whose categories are sorted,
+    so that ordering by the column is unchanged. Integers are downcast to the
+    smallest type holding their range; nullable integers stay nullable. Other columns
+    are left as they are.
+
+    :param dataframe: table, not modified
+    :type dataframe: pd.DataFrame
+    :param skip_columns: positions of columns left as they are, e.g. the geometry column
+    :type skip_columns: tuple[int, ...]
+    :return: the compacted table, and the memory (before, after) of each compacted column
+    :rtype: tuple
+    """
+    columns = {}
+    report = {}
+    for index, (name, column) in enumerate(dataframe.items()):
+        compacted = None if index in skip_columns else _compact_column(column)
+        if compacted is None:
+            columns[name] = column
+            continue
+        before = column.memory_usage(index=False, deep=True)
+        after = compacted.memory_usage(index=False, deep=True)
+        if after < before:
+            columns[name] = compacted
+            report[name] = (int(before), int(after))
+        else:
+            columns[name] = column
+    if not report:
+        return dataframe, report
+    return pd.DataFrame(columns, index=dataframe.index), report
+
+
+def _compact_column(column: pd.Series) -> Union[pd.Series, None]:
+    """Returns a column in a smaller type, None if there is none"""
+    dtype = column.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+        return None
+    if pd.api.types.is_integer_dtype(dtype):
+        values = column.dropna()
+        if values.empty:
+            return None
+        minimum, maximum = int(values.min()), int(values.max())
+        for integer_type in _COMPACT_INTEGER_TYPES:
+            limits = np.iinfo(integer_type)
+            if limits.min <= minimum and maximum <= limits.max:
+                if isinstance(dtype, np.dtype):
+                    return column.astype(integer_type)
+                # nullable integers keep their mask
+                return column.astype(f"Int{limits.bits}")
+        return None
+    if (dtype == object or pd.api.types.is_string_dtype(dtype)) \
+            and pd.api.types.infer_dtype(column, skipna=True) == "string":
+        codes, uniques = pd.factorize(column, sort=True)
+        if len(uniques) > COMPACT_CATEGORY_RATIO * max(1, len(column)):
+            return None
+        return pd.Series(
+            pd.Categorical.from_codes(codes, categories=pd.Index(uniques, dtype=object)),
+            index=column.index, name=column.name,
+        )
+    return None
+
+
+def key_feature_ids(dataframe: pd.DataFrame, key_columns: tuple[str, ...]) -> np.ndarray:
+    """Derives stable 64-bit feature ids from key columns.
+
+    A single integer key (such as row-tracking ids) is used as is, other keys are
+    hashed. Unlike row positions, the ids do not change when the table is reloaded
+    or its files come back in another order.
+
+    :param dataframe: table
+    :type dataframe: pd.DataFrame
+    :param key_columns: names of the key columns
+    :type key_columns: tuple[str, ...]
+    :return: one non-negative id per row
+    :rtype: np.ndarray
+    """
+    keys = dataframe[list(key_columns)]
+    # integers hash by their width: columns downcast by compact_dataframe are widened
+    # back, so that ids do not depend on the compaction
+    narrow_integers = {
+        name: "Int64" if isinstance(dtype, pd.api.extensions.ExtensionDtype) else np.int64
+        for name, dtype in keys.dtypes.items()
+        if pd.api.types.is_integer_dtype(dtype) and dtype.itemsize < 8
+    }
+    if narrow_integers:
+        keys = keys.astype(narrow_integers)
+    if len(key_columns) == 1 and pd.api.types.is_integer_dtype(keys.dtypes.iloc[0]) \
+            and not keys.iloc[:, 0].isna().any() and (keys.iloc[:, 0] >= 0).all():
+        return keys.iloc[:, 0].to_numpy(dtype=np.int64)
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    # QGIS feature ids are signed, keep them non-negative
+    return (hashes & np.uint64(0x7FFF_FFFF_FFFF_FFFF)).astype(np.int64)
+
+
+def extreme_value(column: pd.Series, maximum: bool):
+    """Returns the smallest or largest value of a column, ignoring missing values.
+
+    :param column: column to read
+    :type column: pd.Series
+    :param maximum: True for the largest value, False for the smallest one
+    :type maximum: bool
+    :return: the value as a Python object, None for an empty column
+    """
+    values = column.dropna()
+    if values.empty:
+        return None
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # compare the distinct values only, whatever the order of the categories
+        values = pd.Series(values.cat.remove_unused_categories().cat.categories)
+    value = values.max() if maximum else values.min()
+    return python_values(pd.Series([value], dtype=values.dtype), np.zeros(1, dtype=np.int64))[0]
+
+
+def unique_values(column: pd.Series, limit: int = -1, chunk_size: int = 65536) -> list:
+    """Returns the distinct values of a column, ignoring missing values.
+
+    With a limit, the column is scanned chunk by chunk and the scan stops as soon as
+    enough distinct values are found.
+
+    :param column: column to read
+    :type column: pd.Series
+    :param limit: maximum number of values to return, -1 for all of them
+    :type limit: int
+    :param chunk_size: number of rows scanned at once when a limit is given
+    :type chunk_size: int
+    :return: distinct values as Python objects
+    :rtype: list
+    """
+    if limit < 0:
+        uniques = pd.Series(column.dropna().unique(), dtype=column.dtype)
+    else:
+        uniques = column.iloc[:0]
+        for start in range(0, len(column), chunk_size):
+            # values of a chunk may already have been found in previous ones
+            if len(uniques) >= limit:
+                break
+            chunk = column.iloc[start:start + chunk_size].dropna().unique()
+            uniques = pd.Series(pd.concat([uniques, pd.Series(chunk, dtype=column.dtype)]).unique(),
+                                dtype=column.dtype)
+        uniques = uniques.iloc[:limit]
+    return python_values(uniques, np.arange(len(uniques)))
+
+
+def _hinge_quartiles(sorted_values: np.ndarray) -> tuple[float, float]:
+    """Computes the first and third quartiles of sorted values with the method of
+    QgsStatisticalSummary, so that results do not depend on who computes them.
+    """
+    count = len(sorted_values)
+    half_count = count // 2 if count % 2 == 0 else count // 2 + 1
+    # odd counts include the median in both halves
+    offset = 0 if count % 2 == 0 else 1
+    if half_count % 2 == 0:
+        first = (sorted_values[half_count // 2 - 1] + sorted_values[half_count // 2]) / 2.0
+        third = (sorted_values[half_count + half_count // 2 - 1 - offset]
+                 + sorted_values[half_count + half_count // 2 - offset]) / 2.0
+    else:
+        first = sorted_values[(half_count + 1) // 2 - 1]
+        third = sorted_values[(half_count + 1) // 2 - 1 - offset + half_count]
+    return float(first), float(third)
+
+
+def _interquartile_range(numbers: np.ndarray) -> float:
+    first, third = _hinge_quartiles(np.sort(numbers))
+    return third - first
+
+
+def _mode(values: pd.Series, majority: bool):
+    """Returns the most (or least) frequent of values without missing ones, None if empty"""
+    counts = values.value_counts(sort=True)
+    if counts.empty:
+        return None
+    value = counts.index[0] if majority else counts.index[-1]
+    return python_values(pd.Series([value], dtype=values.dtype), np.zeros(1, dtype=np.int64))[0]
+
+
+# functions computed by aggregate_column
+AGGREGATE_FUNCTIONS = (
+    "count", "count_distinct", "count_missing", "min", "max", "minority", "majority",
+    "sum", "mean", "range", "stdev", "stdev_sample", "median",
+    "first_quartile", "third_quartile", "iqr", "quantile",
+)
+# aggregates of any column, missing values included
+_COLUMN_AGGREGATES = {
+    "count": lambda column: int(column.count()),
+    "count_missing": lambda column: int(column.isna().sum()),
+    "count_distinct": lambda column: int(column.nunique(dropna=True)),
+    "min": lambda column: extreme_value(column, False),
+    "max": lambda column: extreme_value(column, True),
+}
+# aggregates of the numbers of a column, at least one, with the quantile to compute
+_NUMBER_AGGREGATES = {
+    "mean": lambda numbers, quantile: float(numbers.mean()),
+    "range": lambda numbers, quantile: float(numbers.max() - numbers.min()),
+    "stdev": lambda numbers, quantile: float(numbers.std(ddof=0)),
+    "stdev_sample": lambda numbers, quantile:
+        float(numbers.std(ddof=1)) if len(numbers) > 1 else None,
+    "median": lambda numbers, quantile: float(np.median(numbers)),
+    "quantile": lambda numbers, quantile: float(np.quantile(numbers, quantile)),
+    "first_quartile": lambda numbers, quantile: _hinge_quartiles(np.sort(numbers))[0],
+    "third_quartile": lambda numbers, quantile: _hinge_quartiles(np.sort(numbers))[1],
+    "iqr": lambda numbers, quantile: _interquartile_range(numbers),
+}
+
+
+def aggregate_column(column: pd.Series, function: str, quantile: float = 0.5):
+    """Aggregates the values of a column, ignoring missing values.
+
+    :param column: values to aggregate
+    :type column: pd.Series
+    :param function: one of AGGREGATE_FUNCTIONS
+    :type function: str
+    :param quantile: quantile computed by the "quantile" function, between 0 and 1
+    :type quantile: float
+    :raises ValueError: if the function is unknown
+    :raises TypeError: if the function needs numbers and the column does not hold numbers
+    :return: the aggregate as a Python object, None when there is no value to aggregate
+    """
+    if function not in AGGREGATE_FUNCTIONS:
+        raise ValueError("Unknown aggregate function {}".format(function))
+    if function in _COLUMN_AGGREGATES:
+        return _COLUMN_AGGREGATES[function](column)
+
+    values = column.dropna()
+    if function in ("minority", "majority"):
+        return _mode(values, function == "majority")
+
+    if not pd.api.types.is_numeric_dtype(values.dtype) \
+            or isinstance(values.dtype, pd.CategoricalDtype):
+        raise TypeError("Aggregate function {} needs a numeric column".format(function))
+    if function == "sum":
+        return values.sum().item() if not values.empty else 0
+    if values.empty:
+        return None
+    return _NUMBER_AGGREGATES[function](values.to_numpy(dtype=np.float64), quantile)
+
+
+def aggregate_groups(column: pd.Series, keys: pd.Series, function: str,
+                     quantile: float = 0.5) -> dict:
+    """Aggregates the values of a column by group.
+
+    :param column: values to aggregate
+    :type column: pd.Series
+    :param keys: group of each value, aligned position by position
+    :type keys: pd.Series
+    :param function: one of AGGREGATE_FUNCTIONS
+    :type function: str
+    :param quantile: quantile computed by the "quantile" function
+    :type quantile: float
+    :return: aggregate by group value, missing keys are grouped under None
+    :rtype: dict
+    """
+    codes, uniques = pd.factorize(keys, sort=True)
+    group_keys = python_values(pd.Series(uniques, dtype=keys.dtype), np.arange(len(uniques)))
+    # rows of each group are contiguous once sorted by code, missing keys (-1) first
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+    aggregates = {}
+    for group_rows in np.split(order, boundaries):
+        if len(group_rows) == 0:
+            continue
+        code = codes[group_rows[0]]
+        key = None if code < 0 else group_keys[code]
+        aggregates[key] = aggregate_column(column.take(group_rows), function, quantile)
+    return aggregates
+
+
+def simplify_wkb(geometries: np.ndarray, tolerance: float, preserve_topology: bool = False,
+                 batch_size: int = 65536) -> np.ndarray:
+    """Simplifies WKB geometries, batch by batch to bound temporary memory.
+
+    Points are kept as they are, as are geometries the simplification would make
+    empty (features smaller than the tolerance stay visible).
+
+    :param geometries: WKB geometries, None for missing ones
+    :type geometries: np.ndarray
+    :param tolerance: distance tolerance, in the units of the geometries
+    :type tolerance: float
+    :param preserve_topology: True to keep simplified geometries valid, which is slower
+    :type preserve_topology: bool
+    :param batch_size: number of geometries simplified at once
+    :type batch_size: int
+    :return: simplified WKB geometries
+    :rtype: np.ndarray
+    """
+    simplified_wkb = np.empty(len(geometries), dtype=object)
+    for start in range(0, len(geometries), batch_size):
+        batch = geometries[start:start + batch_size]
+        originals = shapely.from_wkb(batch, on_invalid="ignore")
+        to_simplify = ~np.isin(shapely.get_type_id(originals), (-1, 0, 4))
+        if not to_simplify.any():
+            simplified_wkb[start:start + len(batch)] = batch
+            continue
+        simplified = shapely.simplify(
+            originals[to_simplify], tolerance, preserve_topology=preserve_topology
+        )
+        collapsed = shapely.is_empty(simplified) & ~shapely.is_empty(originals[to_simplify])
+        simplified[collapsed] = originals[to_simplify][collapsed]
+        batch_wkb = batch.copy()
+        batch_wkb[to_simplify] = shapely.to_wkb(simplified)
+        simplified_wkb[start:start + len(batch)] = batch_wkb
+    return simplified_wkb
+
+
+def grid_representatives(x: np.ndarray, y: np.ndarray,
+                         cell_size: float) -> tuple[np.ndarray, np.ndarray]:
+    """Picks one representative point per occupied cell of a square grid.
+
+    The grid is anchored at the origin, so that grids whose cell sizes are powers of
+    two nest like the levels of a quadtree.
+
+    :param x: x coordinates, NaN for missing points
+    :type x: np.ndarray
+    :param y: y coordinates, NaN for missing points
+    :type y: np.ndarray
+    :param cell_size: width and height of the cells
+    :type cell_size: float
+    :return: the sorted positions of the first point of each cell, and the number of
+        points in each of these cells
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    valid = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+    if not len(valid):
+        return valid, valid.copy()
+    columns = np.floor(x[valid] / cell_size).astype(np.int64)
+    rows = np.floor(y[valid] / cell_size).astype(np.int64)
+    columns -= columns.min()
+    rows -= rows.min()
+    row_count = int(rows.max()) + 1
+    if int(columns.max()) + 1 <= np.iinfo(np.int64).max // row_count:
+        cells = columns * row_count + rows
+        _, first, counts = np.unique(cells, return_index=True, return_counts=True)
+    else:
+        _, first, counts = np.unique(
+            np.stack([columns, rows], axis=1), axis=0, return_index=True, return_counts=True
+        )
+    order = np.argsort(first)
+    return valid[first[order]], counts[order]
+
+
+def square_bins(x: np.ndarray, y: np.ndarray, cell_size: float) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the column and row of the square cell holding each point
+
+    :param x: x coordinates
+    :type x: np.ndarray
+    :param y: y coordinates
+    :type y: np.ndarray
+    :param cell_size: width and height of the cells, the grid is anchored at the origin
+    :type cell_size: float
+    """
+    return np.floor(x / cell_size).astype(np.int64), np.floor(y / cell_size).astype(np.int64)
+
+
+def hex_bins(x: np.ndarray, y: np.ndarray, cell_size: float) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the axial coordinates (q, r) of the pointy-top hexagon holding each point
+
+    :param x: x coordinates
+    :type x: np.ndarray
+    :param y: y coordinates
+    :type y: np.ndarray
+    :param cell_size: width of the hexagons (distance between opposite sides), the
+        grid is anchored at the origin
+    :type cell_size: float
+    """
+    radius = cell_size / np.sqrt(3)
+    q = (np.sqrt(3) / 3 * x - y / 3) / radius
+    r = (2 / 3 * y) / radius
+    # round the cube coordinates (q, -q-r, r), then fix the component rounded the most
+    s = -q - r
+    rounded_q, rounded_r, rounded_s = np.round(q), np.round(r), np.round(s)
+    q_error, r_error, s_error = np.abs(rounded_q - q), np.abs(rounded_r - r), np.abs(rounded_s - s)
+    fix_q = (q_error > r_error) & (q_error > s_error)
+    fix_r = ~fix_q & (r_error > s_error)
+    rounded_q[fix_q] = -rounded_r[fix_q] - rounded_s[fix_q]
+    rounded_r[fix_r] = -rounded_q[fix_r] - rounded_s[fix_r]
+    return rounded_q.astype(np.int64), rounded_r.astype(np.int64)
+
+
+def hex_centers(q: np.ndarray, r: np.ndarray, cell_size: float) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the centers of pointy-top hexagons from their axial coordinates, see hex_bins"""
+    radius = cell_size / np.sqrt(3)
+    return radius * np.sqrt(3) * (q + r / 2), radius * 1.5 * r
+
+
+def hilbert_distances(x: np.ndarray, y: np.ndarray, bounds: tuple[float, float, float, float],
+                      order: int = 16) -> np.ndarray:
+    """Returns the position of points along a Hilbert curve covering a bounding box
+
+    Sorting by this position keeps points that are close in space close in the order.
+
+    :param x: x coordinates, NaN for missing points, which are placed after all others
+    :type x: np.ndarray
+    :param y: y coordinates
+    :type y: np.ndarray
+    :param bounds: (xmin, ymin, xmax, ymax) covered by the curve
+    :type bounds: tuple
+    :param order: the curve goes through a grid of 2 ** order cells per side
+    :type order: int
+    """
+    xmin, ymin, xmax, ymax = bounds
+    side = 2 ** order
+    located = np.isfinite(x) & np.isfinite(y)
+    cells_x = np.zeros(len(x), dtype=np.int64)
+    cells_y = np.zeros(len(y), dtype=np.int64)
+    cells_x[located] = np.clip((x[located] - xmin) / ((xmax - xmin) or 1) * (side - 1), 0, side - 1)
+    cells_y[located] = np.clip((y[located] - ymin) / ((ymax - ymin) or 1) * (side - 1), 0, side - 1)
+    distances = np.zeros(len(x), dtype=np.int64)
+    step = side // 2
+    while step > 0:
+        in_right = (cells_x & step) > 0
+        in_top = (cells_y & step) > 0
+        distances += step * step * ((3 * in_right) ^ in_top)
+        # rotate the quadrant so that the curve is continuous
+        flipped = ~in_top & in_right
+        cells_x[flipped] = side - 1 - cells_x[flipped]
+        cells_y[flipped] = side - 1 - cells_y[flipped]
+        swapped = ~in_top
+        cells_x[swapped], cells_y[swapped] = cells_y[swapped], cells_x[swapped]
+        step //= 2
+    distances[~located] = side * side
+    return distances
@@ -0,0 +1,106 @@
+"""
+    Background loading of shared tables: a worker pool shared by all the layers, and
+    deduplication of identical reads.
+"""
+
+# standard
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable
+
+# project
+from .toolbelt.log_handler import PluginLogger
+from .toolbelt.preferences import PluginOptionsManager
+
+_lock = threading.Lock()
+_pool = None
+# reads in progress, by key
+_running = {}
+# background tasks submitted and not finished, by key
+_pending = {}
+
+
+def shared_pool() -> ThreadPoolExecutor:
+    """Returns the worker pool shared by all the layers, created on first use.
+
+    Its size is the ``load_workers`` setting, read when the pool is created.
+    """
+    with _lock:
+        return _get_pool()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    """Returns the pool, the lock being held"""
+    global _pool
+    if _pool is None:
+        workers = max(1, PluginOptionsManager.get_plg_settings().load_workers)
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="delta_lake_load")
+    return _pool
+
+
+def run_once(key: Hashable, function: Callable[[], object]):
+    """Runs a function, unless a call with the same key is already running: the caller
+    then waits for that call and gets its result.
+
+    :param key: key of the call, e.g. the url and version of the table being read
+    :param function: function to run
+    :type function: Callable
+    """
+    with _lock:
+        future = _running.get(key)
+        owner = future is None
+        if owner:
+            future = _running[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        result = function()
+        future.set_result(result)
+        return result
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _lock:
+            _running.pop(key, None)
+
+
+def submit_once(key: Hashable, function: Callable[[], object]) -> Future:
+    """Runs a function in the background on the shared pool, unless a task with the
+    same key is pending already. Errors are logged.
+
+    :param key: key of the task, e.g. the loader of a table
+    :param function: function to run, typically loading a table
+    :type function: Callable
+    :return: the future of the task
+    :rtype: Future
+    """
+    with _lock:
+        future = _pending.get(key)
+        if future is None:
+            future = _pending[key] = _get_pool().submit(_run_task, key, function)
+        return future
+
+
+def _run_task(key: Hashable, function: Callable[[], object]):
+    try:
+        return function()
+    except Exception as exc:
+        # the layer reports the error when it needs the data
+        PluginLogger.log(
+            "Background loading of {} failed. Trace: {}".format(key, exc),
+            log_level=1,
+            push=False,
+        )
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+
+
+def shutdown() -> None:
+    """Stops the pool, without waiting for the running loads"""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,4 @@
-from qgis.core import QgsWkbTypes
+from qgis.core import QgsAggregateCalculator, QgsWkbTypes
 from qgis.PyQt.Qt import QVariant
 
 mapping_delta_lake_qgis_geometry = {
@@ -25,3 +25,22 @@ mapping_delta_lake_qgis_type = {
     "binary": { "type": QVariant.ByteArray, "type_name": "binary" },
     "struct": { "type": QVariant.Map, "type_name": "map" },
 }
+
+mapping_qgis_aggregate = {
+    QgsAggregateCalculator.Count: "count",
+    QgsAggregateCalculator.CountDistinct: "count_distinct",
+    QgsAggregateCalculator.CountMissing: "count_missing",
+    QgsAggregateCalculator.Min: "min",
+    QgsAggregateCalculator.Max: "max",
+    QgsAggregateCalculator.Sum: "sum",
+    QgsAggregateCalculator.Mean: "mean",
+    QgsAggregateCalculator.Median: "median",
+    QgsAggregateCalculator.StDev: "stdev",
+    QgsAggregateCalculator.StDevSample: "stdev_sample",
+    QgsAggregateCalculator.Range: "range",
+    QgsAggregateCalculator.Minority: "minority",
+    QgsAggregateCalculator.Majority: "majority",
+    QgsAggregateCalculator.FirstQuartile: "first_quartile",
+    QgsAggregateCalculator.ThirdQuartile: "third_quartile",
+    QgsAggregateCalculator.InterQuartileRange: "iqr",
+}
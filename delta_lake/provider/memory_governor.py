@@ -0,0 +1,177 @@
+"""
+    Memory budget of the tables loaded by all the layers.
+"""
+
+# standard
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+
+# project
+from .toolbelt.instrumentation import instrumentation
+from .toolbelt.log_handler import PluginLogger
+from .toolbelt.preferences import PluginOptionsManager
+
+
+@dataclass
+class _LoaderState:
+    """What the governor knows of a table loader"""
+
+    # time of the last request to the table, from time.monotonic
+    last_used: float = field(default_factory=time.monotonic)
+    # False when no layer of the loader is displayed
+    visible: bool = True
+
+
+class MemoryGovernor:
+    """Keeps the tables loaded by the layers within the ``memory_budget_mb`` setting.
+
+    Loaders report the requests to their table (:meth:`touch`) and the plugin
+    reports which layers are displayed (:meth:`set_visible`). Once a table is loaded
+    beyond the budget, the tables of hidden layers then of the layers unused for the
+    longest time are evicted, until the loaded tables fit again. Tables in use by
+    feature iterators are left alone, since evicting them would free nothing.
+
+    With the ``memory_spill`` setting, evicted tables are written to a temporary
+    directory first: they are read back from the disk on the next request instead of
+    being downloaded again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = weakref.WeakKeyDictionary()
+        self._spill_root = None
+        self._spill_count = 0
+
+    def _state(self, loader) -> _LoaderState:
+        state = self._states.get(loader)
+        if state is None:
+            with self._lock:
+                state = self._states.setdefault(loader, _LoaderState())
+        return state
+
+    def touch(self, loader) -> None:
+        """Records a request to the table of a loader"""
+        self._state(loader).last_used = time.monotonic()
+
+    def set_visible(self, loader, visible: bool) -> None:
+        """Records whether a layer of the loader is displayed"""
+        self._state(loader).visible = visible
+
+    def _loaded_tables(self) -> list[tuple[object, list, _LoaderState]]:
+        """Groups the loaders by loaded table: layers of the same table share it.
+
+        :return: (table, its loaders, merged state) for each table, the next one to
+            evict first: hidden tables, then the least recently used ones
+        """
+        with self._lock:
+            states = list(self._states.items())
+        groups = {}
+        for loader, state in states:
+            table = loader.loaded_table()
+            if table is None:
+                continue
+            _, loaders, merged = groups.setdefault(id(table), (table, [], _LoaderState(0.0, False)))
+            loaders.append(loader)
+            merged.last_used = max(merged.last_used, state.last_used)
+            merged.visible = merged.visible or state.visible
+        return sorted(groups.values(), key=lambda group: (group[2].visible, group[2].last_used))
+
+    def resident_bytes(self) -> int:
+        """Returns the memory used by the loaded tables"""
+        return sum(table.nbytes() for table, _, _ in self._loaded_tables())
+
+    def report(self) -> list[dict]:
+        """Describes the loaded tables, the next one to evict first"""
+        now = time.monotonic()
+        return [
+            {
+                "table_uri": loaders[0].table_uri(),
+                "layers": len(loaders),
+                "bytes": table.nbytes(),
+                "visible": state.visible,
+                "idle_seconds": round(now - state.last_used, 1),
+            }
+            for table, loaders, state in self._loaded_tables()
+        ]
+
+    def enforce_budget(self, keep=None) -> int:
+        """Evicts tables until the loaded ones fit in the budget
+
+        :param keep: loader whose table is never evicted, e.g. the one just loaded
+        :type keep: DeltaLakeTableLoader
+        :return: number of evicted tables
+        :rtype: int
+        """
+        settings = PluginOptionsManager.get_plg_settings()
+        budget = settings.memory_budget_mb * 1024 * 1024
+        if budget <= 0:
+            return 0
+        # imported on use: the loaders report to the governor
+        from .delta_lake_table import version_cache
+
+        tables = self._loaded_tables()
+        resident = sum(table.nbytes() for table, _, _ in tables)
+        evicted = 0
+        for table, loaders, _ in tables:
+            if resident <= budget:
+                break
+            # references other than the loaders and the version cache: iterators
+            holders = len(loaders) + (1 if version_cache.holds(table) else 0)
+            if keep in loaders or table.reference_count() > holders:
+                continue
+            size = table.nbytes()
+            spill_directory = self._spill_directory() if settings.memory_spill else None
+            for loader in loaders:
+                try:
+                    loader.evict(spill_directory)
+                except Exception as exc:
+                    # a table which cannot be spilled is still dropped, the others evicted
+                    PluginLogger.log(
+                        "Table {} could not be written to disk, it is dropped. Trace: {}".format(
+                            loader.table_uri(), exc
+                        ),
+                        log_level=1,
+                        push=False,
+                    )
+                    loader.evict()
+            resident -= size
+            evicted += 1
+            for loader in loaders:
+                instrumentation.count(loader.layer_key(), "evictions")
+            PluginLogger.log(
+                "Memory budget of {} MB exceeded, table {} evicted ({} MB)".format(
+                    settings.memory_budget_mb, loaders[0].table_uri(), size // (1024 * 1024)
+                ),
+                log_level=4,
+            )
+        return evicted
+
+    def _spill_directory(self) -> str:
+        """Returns a new directory to write an evicted table to"""
+        with self._lock:
+            if self._spill_root is None:
+                self._spill_root = tempfile.mkdtemp(prefix="delta_lake_spill_")
+            self._spill_count += 1
+            return os.path.join(self._spill_root, str(self._spill_count))
+
+    def clear_spilled(self) -> None:
+        """Deletes the tables written to disk, e.g. when the plugin is unloaded"""
+        with self._lock:
+            spill_root, self._spill_root = self._spill_root, None
+        if spill_root is not None:
+            shutil.rmtree(spill_root, ignore_errors=True)
+
+
+_governor = MemoryGovernor()
+
+
+def memory_governor() -> MemoryGovernor:
+    """Returns the governor shared by all the layers"""
+    return _governor
@@ -0,0 +1,102 @@
+"""
+    Persistent cache of the metadata of the shared tables (schema, version, extent,
+    ...), so that the layers of a project are restored without waiting for the server.
+"""
+
+# standard
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Union
+
+# project
+from .toolbelt.log_handler import PluginLogger
+
+# number of tables kept, the least recently opened ones are dropped beyond
+METADATA_CACHE_ENTRIES = 256
+
+
+class TableMetadataCache:
+    """Metadata of tables, by table url and requested version, saved in a JSON file.
+
+    An entry holds the ``version`` and ``schema_string`` of the table, the
+    ``index_geometry_column``, and, once they are known, the ``geometry_type``, the
+    ``extent`` and the ``row_count`` of the whole table.
+
+    :param path: path of the JSON file, created on first update
+    :type path: str
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def key(table_uri: str, version: Union[int, None], timestamp: Union[str, None]) -> str:
+        """Returns the key of a table opened at a version or timestamp, both None for the
+        latest one
+        """
+        return json.dumps([table_uri, version, timestamp])
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self._path, encoding="utf-8") as cache_file:
+                    self._entries = json.load(cache_file)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, key: str) -> Union[dict, None]:
+        with self._lock:
+            entry = self._load().get(key)
+            return None if entry is None else dict(entry)
+
+    def update(self, key: str, **values) -> None:
+        """Sets values of an entry, creating it if needed, and saves the cache"""
+        with self._lock:
+            entries = self._load()
+            # entries are kept in the order of their last update
+            entry = entries.pop(key, {})
+            entry.update(values)
+            entries[key] = entry
+            while len(entries) > METADATA_CACHE_ENTRIES:
+                entries.pop(next(iter(entries)))
+            self._save(entries)
+
+    def _save(self, entries: dict) -> None:
+        # written to a temporary file first, so that a crash never leaves a truncated cache
+        temporary_path = f"{self._path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(temporary_path, "w", encoding="utf-8") as cache_file:
+                json.dump(entries, cache_file)
+            os.replace(temporary_path, self._path)
+        except OSError as exc:
+            PluginLogger.log(
+                "Table metadata cache {} could not be saved. Trace: {}".format(self._path, exc),
+                log_level=1,
+                push=False,
+            )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def metadata_cache() -> TableMetadataCache:
+    """Returns the cache of the plugin, in the settings directory of QGIS"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from qgis.core import QgsApplication
+
+            _cache = TableMetadataCache(
+                os.path.join(
+                    QgsApplication.qgisSettingsDirPath(), "delta_lake", "table_metadata.json"
+                )
+            )
+        return _cache
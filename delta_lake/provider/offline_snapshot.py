@@ -0,0 +1,210 @@
+"""
+    Offline snapshots: a version of a shared table pinned to a local directory, reopened
+    without the network.
+
+    A snapshot directory holds:
+
+    - ``table.arrow``: the rows, as an uncompressed Arrow IPC file read through a memory map
+    - ``bounds.npy``: the bounding box of each geometry, for tables with a geometry column
+    - ``indexes.npz``: the attribute indexes built when the snapshot was saved
+    - ``snapshot.json``: the description of the table (schema, version, statistics, ...),
+      written last, so that an interrupted save leaves no valid snapshot
+"""
+
+# standard
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime, timezone
+from typing import Union
+
+# 3rd party
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# project
+from .delta_lake_table import DeltaLakeTable, DeltaLakeTableLoader, FileStatistics
+from .geoparquet import arrow_schema
+from .indexes import HashIndex, SortedIndex
+
+SNAPSHOT_FORMAT = 1
+# rows converted to Arrow at once when saving a snapshot
+SNAPSHOT_BATCH_ROWS = 65536
+_TABLE_FILE = "table.arrow"
+_BOUNDS_FILE = "bounds.npy"
+_INDEXES_FILE = "indexes.npz"
+_DESCRIPTION_FILE = "snapshot.json"
+
+
+def write_snapshot(directory: str, table: DeltaLakeTable, description: dict) -> None:
+    """Saves a loaded table, with its geometry bounds and attribute indexes
+
+    :param directory: directory of the snapshot, created if needed; a previous
+        snapshot in it is replaced
+    :type directory: str
+    :param table: table snapshot to save
+    :type table: DeltaLakeTable
+    :param description: description of the table, see OfflineSnapshot
+    :type description: dict
+    """
+    os.makedirs(directory, exist_ok=True)
+    description_path = os.path.join(directory, _DESCRIPTION_FILE)
+    if os.path.exists(description_path):
+        os.remove(description_path)
+
+    dataframe = table.dataframe()
+    index_geometry_column = table.index_geometry_column()
+    geometry_column = None if index_geometry_column is None \
+        else dataframe.columns[index_geometry_column]
+    schema = arrow_schema(dataframe, geometry_column)
+    with pa.OSFile(os.path.join(directory, _TABLE_FILE), "wb") as sink, \
+            pa.ipc.new_file(sink, schema) as writer:
+        for start in range(0, len(dataframe), SNAPSHOT_BATCH_ROWS):
+            writer.write_batch(pa.RecordBatch.from_pandas(
+                dataframe.iloc[start:start + SNAPSHOT_BATCH_ROWS], schema=schema,
+                preserve_index=False,
+            ))
+    bounds_path = os.path.join(directory, _BOUNDS_FILE)
+    if geometry_column is not None:
+        np.save(bounds_path, table.geometry_bounds())
+    elif os.path.exists(bounds_path):
+        os.remove(bounds_path)
+    index_arrays = {}
+    for column_index, index in table.attribute_indexes().items():
+        arrays = index.arrays()
+        if arrays is not None:
+            kind = "sorted" if isinstance(index, SortedIndex) else "hash"
+            index_arrays.update({
+                f"{kind}.{column_index}.{name}": array for name, array in arrays.items()
+            })
+    np.savez(os.path.join(directory, _INDEXES_FILE), **index_arrays)
+
+    with open(description_path, "w", encoding="utf-8") as description_file:
+        json.dump(dict(
+            description,
+            format=SNAPSHOT_FORMAT,
+            row_count=table.row_count(),
+            extent=[None] * 4 if geometry_column is None
+            else [None if np.isnan(value) else value for value in table.extent()],
+            saved_at=datetime.now(timezone.utc).isoformat(),
+        ), description_file)
+
+
+class OfflineSnapshot:
+    """A snapshot saved by :func:`write_snapshot`.
+
+    The description holds ``table_uri``, ``version``, ``schema_string``,
+    ``file_statistics`` (row count and column ranges) and the ``row_count`` and
+    ``extent`` of the table.
+
+    :param directory: directory of the snapshot
+    :type directory: str
+    :raises FileNotFoundError: if the directory holds no complete snapshot
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, _DESCRIPTION_FILE), encoding="utf-8") as description_file:
+            self.description = json.load(description_file)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.isfile(os.path.join(directory, _DESCRIPTION_FILE))
+
+    def file_statistics(self) -> FileStatistics:
+        statistics = self.description.get("file_statistics") or {}
+        return FileStatistics(
+            statistics.get("row_count"),
+            {
+                name: tuple(value_range)
+                for name, value_range in statistics.get("column_ranges", {}).items()
+            },
+        )
+
+    def extent(self) -> tuple[float, float, float, float]:
+        return tuple(np.nan if value is None else value for value in self.description["extent"])
+
+    def read_dataframe(self, limit: Union[int, None] = None) -> pd.DataFrame:
+        """Reads the rows of the snapshot, or only the first ``limit`` rows
+
+        The file is memory-mapped: only the batches needed are read from disk, and they
+        are converted to pandas without an intermediate copy in memory. The dataframe
+        itself is a copy, as the one of a table downloaded from the server.
+        """
+        with pa.memory_map(os.path.join(self.directory, _TABLE_FILE)) as source:
+            reader = pa.ipc.open_file(source)
+            if limit is None:
+                arrow_table = reader.read_all()
+            else:
+                batches = []
+                row_count = 0
+                for batch_index in range(reader.num_record_batches):
+                    if row_count >= limit:
+                        break
+                    batch = reader.get_batch(batch_index)
+                    batches.append(batch)
+                    row_count += batch.num_rows
+                arrow_table = pa.Table.from_batches(batches, schema=reader.schema).slice(0, limit)
+            # same conversion as delta_sharing.load_as_pandas
+            return arrow_table.to_pandas(date_as_object=True)
+
+    def restore(self, table: DeltaLakeTable) -> None:
+        """Attaches the geometry bounds and attribute indexes of the snapshot to a table
+        loaded from it, so that they are not computed again. Bounds are memory-mapped.
+        """
+        bounds_path = os.path.join(self.directory, _BOUNDS_FILE)
+        if table.index_geometry_column() is not None and os.path.exists(bounds_path):
+            table.restore_cached("geometry_bounds", np.load(bounds_path, mmap_mode="r"))
+        index_path = os.path.join(self.directory, _INDEXES_FILE)
+        if not os.path.exists(index_path):
+            return
+        index_files = np.load(index_path)
+        arrays_by_index = {}
+        for name in index_files.files:
+            kind, column_index, array_name = name.split(".")
+            arrays = arrays_by_index.setdefault((kind, int(column_index)), {})
+            arrays[array_name] = index_files[name]
+        for (kind, column_index), arrays in arrays_by_index.items():
+            index_class = SortedIndex if kind == "sorted" else HashIndex
+            table.restore_cached(("attribute_index", column_index), index_class.from_arrays(arrays))
+
+
+class OfflineTableLoader(DeltaLakeTableLoader):
+    """Loads a table from an offline snapshot instead of the sharing server
+
+    :param snapshot: snapshot to read
+    :type snapshot: OfflineSnapshot
+    :param index_geometry_column: position of the geometry column, None without geometry
+    :type index_geometry_column: int
+    :param key_columns: columns feature ids are derived from, row positions if empty
+    :type key_columns: tuple[str, ...]
+    :param layer: key of the counters of the layer
+    :type layer: str
+    """
+
+    def __init__(self, snapshot: OfflineSnapshot, index_geometry_column: int,
+                 key_columns: tuple[str, ...] = (), layer: Union[str, None] = None):
+        super().__init__(
+            snapshot.description["table_uri"], snapshot.description["version"],
+            index_geometry_column, key_columns,
+            file_statistics=snapshot.file_statistics(), layer=layer,
+        )
+        self._snapshot = snapshot
+
+    def _read_key(self) -> tuple:
+        return "offline", os.path.abspath(self._snapshot.directory)
+
+    def _read(self, limit: Union[int, None] = None) -> pd.DataFrame:
+        return self._snapshot.read_dataframe(limit)
+
+    def evict(self, spill_directory: Union[str, None] = None) -> None:
+        # read back from the snapshot itself
+        super().evict()
+
+    def _build_table(self, dataframe: pd.DataFrame) -> DeltaLakeTable:
+        table = super()._build_table(dataframe)
+        if len(dataframe) == self._snapshot.description["row_count"]:
+            self._snapshot.restore(table)
+        return table
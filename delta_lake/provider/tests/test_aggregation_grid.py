@@ -0,0 +1,80 @@
+# coding=utf-8
+"""Aggregation grid tests"""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from delta_lake.provider.aggregation_grid import (
+    AggregationGrid,
+    format_grid_aggregates,
+    parse_grid_aggregates,
+)
+from delta_lake.provider.kernels import hex_bins, hex_centers
+
+
+class GridAggregatesTest(unittest.TestCase):
+    """Test the grid_aggregates uri parameter"""
+
+    def test_round_trip(self):
+        aggregates = parse_grid_aggregates(" SUM:pop , mean:income,")
+        self.assertEqual(aggregates, (("sum", "pop"), ("mean", "income")))
+        self.assertEqual(format_grid_aggregates(aggregates), "sum:pop,mean:income")
+
+    def test_empty(self):
+        self.assertEqual(parse_grid_aggregates(None), ())
+
+    def test_invalid(self):
+        for grid_aggregates in ("pop", "median:pop", "sum:"):
+            with self.assertRaises(ValueError):
+                parse_grid_aggregates(grid_aggregates)
+
+
+class AggregationGridTest(unittest.TestCase):
+    """Test binning and aggregation"""
+
+    def test_square_cells(self):
+        x = np.array([0.5, 1.5, 1.2, -0.5, np.nan])
+        y = np.array([0.5, 0.5, 0.8, -0.5, 0.0])
+        columns = {("sum", "pop"): pd.Series([1, 2, None, 4, 8]), ("max", "pop"): pd.Series([1, 2, None, 4, 8])}
+        grid = AggregationGrid.from_points(x, y, "square", 1.0, columns)
+        self.assertEqual(len(grid), 3)
+        order = np.lexsort((grid.bounds[:, 1], grid.bounds[:, 0]))
+        np.testing.assert_array_equal(grid.bounds[order], [[-1, -1, 0, 0], [0, 0, 1, 1], [1, 0, 2, 1]])
+        np.testing.assert_array_equal(grid.counts[order], [1, 1, 2])
+        np.testing.assert_array_equal(grid.values["sum_pop"][order], [4, 1, 2])
+        np.testing.assert_array_equal(grid.values["max_pop"][order], [4, 1, 2])
+        self.assertGreater(grid.nbytes, 0)
+
+    def test_cells_without_values(self):
+        grid = AggregationGrid.from_points(
+            np.array([0.5]), np.array([0.5]), "square", 1.0, {("sum", "pop"): pd.Series([None], dtype=float)}
+        )
+        self.assertTrue(np.isnan(grid.values["sum_pop"][0]))
+
+    def test_hexagons_hold_their_points(self):
+        rng = np.random.default_rng(0)
+        x, y = rng.uniform(-50, 50, 200), rng.uniform(-50, 50, 200)
+        grid = AggregationGrid.from_points(x, y, "hex", 7.0, {})
+        self.assertEqual(grid.counts.sum(), 200)
+        q, r = hex_bins(x, y, 7.0)
+        center_x, center_y = hex_centers(q, r, 7.0)
+        # each point lies within the circumradius of the center of its hexagon
+        self.assertTrue((np.hypot(x - center_x, y - center_y) <= 7.0 / np.sqrt(3) + 1e-9).all())
+        # the cells cover all the points
+        polygons = shapely.from_wkb(grid.polygons)
+        covered = shapely.covers(polygons[:, None], shapely.points(x, y)[None, :])
+        self.assertTrue(covered.any(axis=0).all())
+
+    def test_cell_lookups(self):
+        grid = AggregationGrid.from_points(
+            np.array([0.5, 5.5, 9.5]), np.array([0.5, 5.5, 9.5]), "square", 1.0, {}
+        )
+        self.assertEqual(len(grid.cells_in_rect((4.0, 4.0, 10.0, 10.0))), 2)
+        self.assertEqual(grid.cells_for_ids([grid.cell_ids[2], grid.cell_ids[0], -1]).tolist(), [0, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# coding=utf-8
+"""Table snapshot tests"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from delta_lake.provider.delta_lake_table import DeltaLakeTable, RowSelectionCache
+
+
+class TableMemoryTest(unittest.TestCase):
+    """Test the memory reported for the memory budget"""
+
+    def setUp(self) -> None:
+        lines = [shapely.LineString([(i, 0), (i + 0.5, 0.001), (i + 1, 0)]) for i in range(100)]
+        self.table = DeltaLakeTable(pd.DataFrame({
+            "value": np.arange(100),
+            "geometry": [shapely.to_wkb(line) for line in lines],
+        }), 1, 1).acquire()
+
+    def test_cached_structures(self):
+        size = self.table.nbytes()
+        bounds = self.table.geometry_bounds()
+        self.assertGreaterEqual(self.table.nbytes(), size + bounds.nbytes)
+        size = self.table.nbytes()
+        self.table.attribute_index(0)
+        self.assertGreater(self.table.nbytes(), size)
+
+    def test_levels_of_detail(self):
+        size = self.table.nbytes()
+        simplified = self.table.simplified_geometries(0.1)
+        # the WKB geometries themselves are counted, not only the array of references
+        self.assertGreater(self.table.nbytes() - size, simplified.nbytes + sum(map(len, simplified)) // 2)
+
+    def test_restored_memory_map(self):
+        size = self.table.nbytes()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bounds.npy")
+            np.save(path, np.zeros((100, 4)))
+            bounds = np.load(path, mmap_mode="r")
+            # on disk, not in memory
+            self.table.restore_cached("geometry_bounds", bounds)
+            self.assertEqual(self.table.nbytes(), size)
+            del bounds
+            self.table.release()
+
+    def test_released(self):
+        self.table.geometry_bounds()
+        self.table.release()
+        self.assertEqual(self.table.nbytes(), 0)
+
+
+class RowSelectionCacheTest(unittest.TestCase):
+    """Test the least recently used row selections"""
+
+    @staticmethod
+    def selection(row_count: int) -> tuple:
+        return np.arange(row_count, dtype=np.int64), True, None
+
+    def test_bytes(self):
+        cache = RowSelectionCache(10000)
+        cache.put("a", self.selection(100))
+        cache.put("b", (None, False, None))
+        self.assertEqual(cache.nbytes(), 64 + 800 + 64)
+        # replacing an entry does not count it twice
+        cache.put("a", self.selection(10))
+        self.assertEqual(cache.nbytes(), 64 + 80 + 64)
+        # shared between iterators
+        self.assertFalse(cache.get("a")[0].flags.writeable)
+
+    def test_least_recently_used_are_evicted(self):
+        cache = RowSelectionCache(3 * (64 + 800))
+        for signature in ("a", "b", "c"):
+            cache.put(signature, self.selection(100))
+        cache.get("a")
+        cache.put("d", self.selection(100))
+        self.assertIsNone(cache.get("b"))
+        for signature in ("a", "c", "d"):
+            self.assertIsNotNone(cache.get(signature))
+        self.assertEqual(cache.nbytes(), 3 * (64 + 800))
+
+    def test_selections_beyond_the_budget_are_not_cached(self):
+        cache = RowSelectionCache(1000)
+        cache.put("a", self.selection(10))
+        cache.put("b", self.selection(1000))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(cache.nbytes(), 64 + 80)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Feature iterator tests"""
+
+import gc
+import unittest
+from unittest import mock
+
+import pandas as pd
+from qgis.core import QgsCoordinateReferenceSystem, QgsFeatureRequest, QgsField, QgsFields
+from qgis.PyQt.QtCore import QVariant
+
+from delta_lake.provider.delta_lake_feature_iterator import BATCH_SIZE, DeltaLakeFeatureIterator
+from delta_lake.provider.delta_lake_table import DeltaLakeTable
+
+
+class _Source:
+    """Feature source of a table without geometry, reading ahead"""
+
+    def __init__(self, table: DeltaLakeTable):
+        self._table = table
+        self._fields = QgsFields()
+        self._fields.append(QgsField("value", QVariant.Int))
+
+    def isValid(self) -> bool:
+        return True
+
+    def fields(self) -> QgsFields:
+        return self._fields
+
+    def crs(self) -> QgsCoordinateReferenceSystem:
+        return QgsCoordinateReferenceSystem()
+
+    def index_geometry_column(self):
+        return None
+
+    def thinned_count_field(self) -> int:
+        return -1
+
+    def thinned(self) -> bool:
+        return False
+
+    def read_ahead(self) -> bool:
+        return True
+
+    def layer_key(self) -> str:
+        return "test"
+
+    def subset_string(self) -> str:
+        return ""
+
+    def subset_rows(self, table):
+        return None
+
+    def table(self, limit: int = -1) -> DeltaLakeTable:
+        return self._table
+
+
+class ReadAheadTest(unittest.TestCase):
+    """Test the read-ahead worker"""
+
+    def setUp(self) -> None:
+        dataframe = pd.DataFrame({"value": range(4 * BATCH_SIZE)})
+        self.source = _Source(DeltaLakeTable(dataframe, None, None).acquire())
+        self.request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+
+    def test_dropped_iterator_stops_its_worker(self):
+        iterator = DeltaLakeFeatureIterator(self.source, self.request)
+        thread = iterator._read_ahead_reader._thread
+        self.assertTrue(thread.is_alive())
+        # the worker stops when the last reference goes, not at the next garbage collection
+        gc.disable()
+        self.addCleanup(gc.enable)
+        del iterator
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+
+class RequestCacheTest(unittest.TestCase):
+    """Test the reuse of the rows selected by identical requests"""
+
+    def setUp(self) -> None:
+        self.source = _Source(DeltaLakeTable(pd.DataFrame({"value": range(100)}), 1, None).acquire())
+        self.source.read_ahead = lambda: False
+
+    def rows(self, expression: str) -> list:
+        request = QgsFeatureRequest().setFilterExpression(expression)
+        iterator = iter(DeltaLakeFeatureIterator(self.source, request.setFlags(QgsFeatureRequest.NoGeometry)))
+        try:
+            return iterator._rows.tolist()
+        finally:
+            iterator.close()
+
+    def test_identical_requests_reuse_rows(self):
+        self.assertEqual(self.rows('"value" >= 97'), [97, 98, 99])
+        with mock.patch.object(DeltaLakeFeatureIterator, "_select_rows", side_effect=AssertionError):
+            self.assertEqual(self.rows('"value" >= 97'), [97, 98, 99])
+            with self.assertRaises(AssertionError):
+                self.rows('"value" >= 98')
+
+    def test_new_version_selects_rows_again(self):
+        self.assertEqual(self.rows('"value" >= 97'), [97, 98, 99])
+        # a new version is a new snapshot, with its own cache
+        self.source._table = DeltaLakeTable(pd.DataFrame({"value": range(99, -1, -1)}), 2, None).acquire()
+        self.assertEqual(self.rows('"value" >= 97'), [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# coding=utf-8
+"""Geometry store tests"""
+
+import unittest
+
+import numpy as np
+import shapely
+
+from delta_lake.provider.geometry_store import GeometryStore, wkb_bounds
+
+
+def _store(geometries: list) -> GeometryStore:
+    return GeometryStore.from_wkb(np.array(
+        [None if geometry is None else shapely.to_wkb(geometry) for geometry in geometries], dtype=object
+    ))
+
+
+class GeometryStoreTest(unittest.TestCase):
+    """Test the ragged coordinate layout"""
+
+    def test_points(self):
+        store = _store([shapely.Point(1, 2), None, shapely.from_wkt("POINT EMPTY"), shapely.Point(-3, 4)])
+        self.assertEqual(len(store), 4)
+        np.testing.assert_array_equal(store.bounds()[0], [1, 2, 1, 2])
+        self.assertTrue(np.isnan(store.bounds()[1:3]).all())
+        geometries = store.geometries(np.array([3, 1, 2]))
+        self.assertTrue(shapely.equals(geometries[0], shapely.Point(-3, 4)))
+        self.assertIsNone(geometries[1])
+        self.assertTrue(shapely.is_empty(geometries[2]))
+
+    def test_single_and_multi_polygons(self):
+        polygon = shapely.box(0, 0, 1, 1)
+        multi_polygon = shapely.MultiPolygon([shapely.box(2, 2, 3, 3), shapely.box(5, 5, 6, 7)])
+        store = _store([polygon, multi_polygon, None])
+        np.testing.assert_array_equal(store.bounds()[1], [2, 2, 6, 7])
+        geometries = store.geometries(np.array([0, 1]))
+        # single parts keep their type
+        self.assertEqual(shapely.get_type_id(geometries[0]), shapely.GeometryType.POLYGON)
+        self.assertTrue(shapely.equals(geometries[0], polygon))
+        self.assertTrue(shapely.equals(geometries[1], multi_polygon))
+
+    def test_lines(self):
+        line = shapely.LineString([(0, 0), (4, -1), (2, 3)])
+        store = _store([None, line])
+        np.testing.assert_array_equal(store.bounds()[1], [0, -1, 4, 3])
+        self.assertTrue(shapely.equals(store.geometries(np.array([1]))[0], line))
+        self.assertGreater(store.nbytes, 0)
+
+    def test_mixed_families(self):
+        self.assertIsNone(_store([shapely.Point(0, 0), shapely.box(0, 0, 1, 1)]))
+
+    def test_no_geometry(self):
+        self.assertIsNone(_store([None, None]))
+
+
+class WkbBoundsTest(unittest.TestCase):
+    """Test bounds computed chunk by chunk"""
+
+    def test_chunks(self):
+        geometries = np.array([
+            shapely.to_wkb(geometry) if geometry is not None else None for geometry in (
+                shapely.Point(1, 2), None, shapely.box(0, 0, 3, 4),
+                shapely.LineString([(5, 5), (6, 8)]), shapely.Point(-1, -2),
+            )
+        ], dtype=object)
+        expected = shapely.bounds(shapely.from_wkb(geometries))
+        for chunk_size in (1, 2, 3, 10):
+            np.testing.assert_array_equal(wkb_bounds(geometries, chunk_size), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
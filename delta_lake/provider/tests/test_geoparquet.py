@@ -0,0 +1,86 @@
+# coding=utf-8
+"""GeoParquet export tests"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import shapely
+
+from delta_lake.provider import geoparquet
+from delta_lake.provider.geoparquet import write_geoparquet
+
+
+class WriteGeoParquetTest(unittest.TestCase):
+    """Test the written file and its metadata"""
+
+    def setUp(self) -> None:
+        geometries = [shapely.Point(10, 10), None, shapely.Point(0, 0), shapely.box(0, 0, 2, 1)]
+        self.dataframe = pd.DataFrame({
+            "name": ["far", "missing", "origin", "box"],
+            "value": [1, 2, 3, 4],
+            "geometry": [None if geometry is None else shapely.to_wkb(geometry) for geometry in geometries],
+        })
+        self.bounds = shapely.bounds(np.array(geometries, dtype=object))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "table.parquet")
+
+    def test_rows_and_bbox(self):
+        self.assertEqual(write_geoparquet(self.path, self.dataframe, "geometry", self.bounds), 4)
+        table = pq.read_table(self.path)
+        self.assertEqual(table.column_names, ["name", "value", "geometry", "bbox"])
+        rows = table.to_pylist()
+        # sorted along the Hilbert curve, missing geometries last
+        self.assertEqual(rows[-1]["name"], "missing")
+        self.assertIsNone(rows[-1]["bbox"])
+        boxes = {row["name"]: row["bbox"] for row in rows}
+        self.assertEqual(boxes["box"], {"xmin": 0.0, "ymin": 0.0, "xmax": 2.0, "ymax": 1.0})
+        self.assertEqual(boxes["far"], {"xmin": 10.0, "ymin": 10.0, "xmax": 10.0, "ymax": 10.0})
+
+    def test_geo_metadata(self):
+        write_geoparquet(self.path, self.dataframe, "geometry", self.bounds)
+        metadata = json.loads(pq.read_schema(self.path).metadata[b"geo"])
+        self.assertEqual(metadata["primary_column"], "geometry")
+        column = metadata["columns"]["geometry"]
+        self.assertEqual(column["encoding"], "WKB")
+        self.assertEqual(column["geometry_types"], ["Point", "Polygon"])
+        self.assertEqual(column["bbox"], [0.0, 0.0, 10.0, 10.0])
+        self.assertEqual(column["covering"]["bbox"]["xmin"], ["bbox", "xmin"])
+        # unknown CRS
+        self.assertIsNone(column["crs"])
+
+    def test_crs(self):
+        crs_projjson = json.dumps({
+            "type": "ProjectedCRS", "name": "Amersfoort / RD New", "id": {"authority": "EPSG", "code": 28992},
+        })
+        write_geoparquet(self.path, self.dataframe, "geometry", self.bounds, crs_projjson=crs_projjson)
+        metadata = json.loads(pq.read_schema(self.path).metadata[b"geo"])
+        self.assertEqual(metadata["columns"]["geometry"]["crs"]["id"]["code"], 28992)
+
+    def test_selected_rows_in_row_groups(self):
+        self.addCleanup(setattr, geoparquet, "ROW_GROUP_SIZE", geoparquet.ROW_GROUP_SIZE)
+        geoparquet.ROW_GROUP_SIZE = 2
+        count = write_geoparquet(self.path, self.dataframe, "geometry", self.bounds, rows=np.array([0, 2, 3]))
+        self.assertEqual(count, 3)
+        parquet_file = pq.ParquetFile(self.path)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+        self.assertCountEqual(parquet_file.read().column("name").to_pylist(), ["far", "origin", "box"])
+
+    def test_cancelled_export_is_removed(self):
+        self.addCleanup(setattr, geoparquet, "ROW_GROUP_SIZE", geoparquet.ROW_GROUP_SIZE)
+        geoparquet.ROW_GROUP_SIZE = 2
+        feedback = mock.Mock()
+        # cancelled after the first row group
+        feedback.isCanceled.side_effect = [False, True]
+        self.assertEqual(write_geoparquet(self.path, self.dataframe, "geometry", self.bounds, feedback=feedback), 0)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+# coding=utf-8
+"""Index tests"""
+
+import datetime
+import unittest
+
+import numpy as np
+import pandas as pd
+from qgis.core import QgsExpression, QgsExpressionContext, QgsField, QgsFields
+from qgis.PyQt.QtCore import QDate, QDateTime, QTime, QVariant
+
+from delta_lake.provider.delta_lake_table import DeltaLakeTable
+from delta_lake.provider.indexes import ExpressionPlanner, HashIndex, SortedIndex, build_index
+
+
+class SortedIndexTest(unittest.TestCase):
+    """Test sorted keys"""
+
+    def test_numbers(self):
+        index = SortedIndex(pd.Series([3.0, None, 1.0, 2.0]))
+        self.assertEqual(index.rows_between(lower=2.0).tolist(), [0, 3])
+        self.assertEqual(index.rows_between(upper=2.0, upper_inclusive=False).tolist(), [2])
+        self.assertEqual(index.null_rows().tolist(), [1])
+
+    def test_time_zone_aware_datetimes(self):
+        column = pd.Series(
+            pd.to_datetime(["2024-01-01T10:00:00Z", "2024-01-01T12:00:00Z", None], utc=True)
+        )
+        index = SortedIndex(column)
+        eleven = datetime.datetime(2024, 1, 1, 11, tzinfo=datetime.timezone.utc)
+        # the same instant, in UTC+2 and in the local time QGIS uses for QDateTime
+        values = (
+            eleven.astimezone(datetime.timezone(datetime.timedelta(hours=2))),
+            QDateTime.fromMSecsSinceEpoch(int(eleven.timestamp() * 1000)),
+        )
+        for value in values:
+            self.assertEqual(index.rows_between(upper=index.key(value)).tolist(), [0])
+            self.assertEqual(index.rows_between(lower=index.key(value)).tolist(), [1])
+
+    def test_dates_of_time_zone_aware_datetimes(self):
+        column = pd.Series(pd.to_datetime(["2024-01-01T10:00:00Z"], utc=True))
+        index = SortedIndex(column)
+        midnight = datetime.datetime(2024, 1, 1).astimezone(datetime.timezone.utc)
+        self.assertEqual(
+            index.key(QDate(2024, 1, 1)), np.datetime64(midnight.replace(tzinfo=None), "ns").astype(np.int64)
+        )
+        self.assertEqual(index.key(QDate(2024, 1, 1)), index.key(QDateTime(QDate(2024, 1, 1), QTime(0, 0))))
+
+    def test_naive_datetimes(self):
+        column = pd.Series(pd.to_datetime(["2024-01-01T10:00:00", "2024-01-01T12:00:00"]))
+        index = SortedIndex(column)
+        self.assertEqual(index.rows_between(upper=index.key(datetime.datetime(2024, 1, 1, 11))).tolist(), [0])
+
+    def test_arrays_round_trip(self):
+        column = pd.Series(pd.to_datetime(["2024-01-01T12:00:00Z", None, "2024-01-01T10:00:00Z"], utc=True))
+        index = SortedIndex.from_arrays(SortedIndex(column).arrays())
+        self.assertTrue(index.utc)
+        eleven = datetime.datetime(2024, 1, 1, 11, tzinfo=datetime.timezone.utc)
+        self.assertEqual(index.rows_between(lower=index.key(eleven)).tolist(), [0])
+        self.assertEqual(index.null_rows().tolist(), [1])
+
+
+class HashIndexTest(unittest.TestCase):
+    """Test rows by distinct value"""
+
+    def setUp(self) -> None:
+        self.index = HashIndex(pd.Series(["a", None, "b", "a", None]))
+
+    def test_rows(self):
+        self.assertEqual(self.index.rows_equal(["a", "c"]).tolist(), [0, 3])
+        self.assertEqual(self.index.rows_equal([]).tolist(), [])
+        self.assertEqual(self.index.null_rows().tolist(), [1, 4])
+        self.assertEqual(self.index.valid_rows().tolist(), [0, 2, 3])
+        self.assertIsNone(self.index.key(1))
+
+    def test_arrays_round_trip(self):
+        index = HashIndex.from_arrays(self.index.arrays())
+        self.assertEqual(index.rows_equal(["b", "a"]).tolist(), [0, 2, 3])
+        self.assertEqual(index.null_rows().tolist(), [1, 4])
+
+    def test_build_index(self):
+        self.assertIsInstance(build_index(pd.Series([1, 2])), SortedIndex)
+        self.assertIsInstance(build_index(pd.Series(["a", "b"])), HashIndex)
+        self.assertIsInstance(build_index(pd.Series([True, False])), HashIndex)
+        self.assertIsNone(build_index(pd.Series([{"a": 1}, {"a": 2}])))
+
+
+class ExpressionPlannerTest(unittest.TestCase):
+    """Test filter expressions resolved with the indexes"""
+
+    def setUp(self) -> None:
+        dataframe = pd.DataFrame({
+            "value": [1.0, None, 3.0, 2.0, 5.0],
+            "name": ["a", "b", None, "a", "c"],
+        })
+        self.table = DeltaLakeTable(dataframe, None, None).acquire()
+        self.addCleanup(self.table.release)
+        fields = QgsFields()
+        fields.append(QgsField("value", QVariant.Double))
+        fields.append(QgsField("name", QVariant.String))
+        self.planner = ExpressionPlanner(self.table, fields, QgsExpressionContext())
+
+    def plan(self, expression: str) -> tuple:
+        rows, exact = self.planner.candidate_rows(QgsExpression(expression))
+        return (None if rows is None else rows.tolist()), exact
+
+    def test_in(self):
+        self.assertEqual(self.plan('"value" IN (1, 3)'), ([0, 2], True))
+        self.assertEqual(self.plan('"name" IN (\'a\', \'c\')'), ([0, 3, 4], True))
+
+    def test_not_in_and_not_equal_skip_nulls(self):
+        self.assertEqual(self.plan('"value" NOT IN (1, 3)'), ([3, 4], True))
+        self.assertEqual(self.plan('"name" NOT IN (\'a\')'), ([1, 4], True))
+        self.assertEqual(self.plan('"name" <> \'a\''), ([1, 4], True))
+        self.assertEqual(self.plan('"value" <> 2'), ([0, 2, 4], True))
+
+    def test_null_constants_are_left_to_qgis(self):
+        self.assertEqual(self.plan('"value" IN (1, NULL)'), (None, False))
+        self.assertEqual(self.plan('"name" = NULL'), (None, False))
+
+    def test_null_tests(self):
+        self.assertEqual(self.plan('"value" IS NULL'), ([1], True))
+        self.assertEqual(self.plan('"name" IS NOT NULL'), ([0, 1, 3, 4], True))
+
+    def test_mirrored_ranges(self):
+        for expression, mirrored in (
+            ('"value" > 2', '2 < "value"'),
+            ('"value" >= 2', '2 <= "value"'),
+            ('"value" < 3', '3 > "value"'),
+            ('"value" <= 3', '3 >= "value"'),
+        ):
+            self.assertEqual(self.plan(expression), self.plan(mirrored))
+        self.assertEqual(self.plan('2 < "value"'), ([2, 4], True))
+        self.assertEqual(self.plan('3 >= "value"'), ([0, 2, 3], True))
+        self.assertEqual(self.plan('"value" = 1 + 1'), ([3], True))
+
+    def test_and(self):
+        self.assertEqual(self.plan('"value" > 1 AND "name" = \'a\''), ([3], True))
+        # the planned side narrows the rows, QGIS filters the others
+        self.assertEqual(self.plan('"value" > 1 AND length("name") = 1'), ([2, 3, 4], False))
+        self.assertEqual(self.plan('length("name") = 1 AND "value" < 2'), ([0], False))
+
+    def test_or(self):
+        self.assertEqual(self.plan('"value" < 2 OR "name" = \'c\''), ([0, 4], True))
+        self.assertEqual(self.plan('"value" < 2 OR length("name") = 1'), (None, False))
+        self.assertEqual(self.plan('"value" < 2 OR ("name" = \'c\' AND length("name") = 1)'), ([0, 4], False))
+
+    def test_unplanned(self):
+        self.assertEqual(self.plan('"name" > \'a\''), (None, False))
+        self.assertEqual(self.plan('"value" = "value"'), (None, False))
+        self.assertEqual(self.plan('"value" = $id'), (None, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+# coding=utf-8
+"""Kernel tests"""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from delta_lake.provider.kernels import (
+    _hinge_quartiles,
+    aggregate_column,
+    aggregate_groups,
+    compact_dataframe,
+    extreme_value,
+    hilbert_distances,
+    key_feature_ids,
+    simplify_wkb,
+    sort_permutation,
+    sortable,
+    unique_values,
+)
+
+
+class SortPermutationTest(unittest.TestCase):
+    """Test sort orders"""
+
+    def setUp(self) -> None:
+        self.dataframe = pd.DataFrame({
+            "name": ["b", "a", None, "a"],
+            "value": [1, 2, 3, 1],
+        })
+
+    def test_ascending(self):
+        rows = sort_permutation(self.dataframe, (("name", True, False),))
+        self.assertEqual(rows.tolist(), [1, 3, 0, 2])
+
+    def test_descending_nulls_first(self):
+        rows = sort_permutation(self.dataframe, (("name", False, True),))
+        self.assertEqual(rows.tolist(), [2, 0, 1, 3])
+
+    def test_secondary_key(self):
+        rows = sort_permutation(self.dataframe, (("name", True, False), ("value", True, False)))
+        self.assertEqual(rows.tolist(), [3, 1, 0, 2])
+
+    def test_no_key(self):
+        self.assertEqual(sort_permutation(self.dataframe, ()).tolist(), [0, 1, 2, 3])
+
+    def test_struct_and_array_columns(self):
+        dataframe = pd.DataFrame({
+            "struct": [None, {"a": 1}, {"a": 0}],
+            "array": [[2, 1], None, [0]],
+        })
+        for name in dataframe.columns:
+            self.assertFalse(sortable(dataframe[name]))
+            with self.assertRaises(TypeError):
+                sort_permutation(dataframe, ((name, True, False),))
+        self.assertTrue(sortable(self.dataframe["name"]))
+        self.assertTrue(sortable(self.dataframe["value"]))
+
+
+class UniqueValuesTest(unittest.TestCase):
+    """Test distinct values"""
+
+    def test_all_values(self):
+        column = pd.Series(["b", None, "a", "b"])
+        self.assertCountEqual(unique_values(column), ["a", "b"])
+
+    def test_limit_with_values_repeated_across_chunks(self):
+        column = pd.Series(list("abcde") * 2 + list("fghij"))
+        self.assertEqual(unique_values(column, 10, chunk_size=5), list("abcdefghij"))
+
+    def test_limit(self):
+        column = pd.Series(np.arange(100) % 7)
+        self.assertEqual(len(unique_values(column, 5, chunk_size=3)), 5)
+
+    def test_nullable_integers(self):
+        column = pd.Series([1, None, 2, 2], dtype="Int64")
+        self.assertEqual(unique_values(column, 3, chunk_size=2), [1, 2])
+
+
+class ExtremeValueTest(unittest.TestCase):
+    """Test minimum and maximum values"""
+
+    def test_numbers(self):
+        column = pd.Series([3.0, np.nan, -1.0])
+        self.assertEqual(extreme_value(column, False), -1.0)
+        self.assertEqual(extreme_value(column, True), 3.0)
+
+    def test_empty(self):
+        self.assertIsNone(extreme_value(pd.Series([None, None], dtype=object), True))
+
+    def test_categorical(self):
+        column = pd.Series(pd.Categorical(["b", "c"], categories=["c", "b", "a"]))
+        self.assertEqual(extreme_value(column, False), "b")
+
+
+class AggregateTest(unittest.TestCase):
+    """Test aggregates"""
+
+    def setUp(self) -> None:
+        self.column = pd.Series([4.0, 1.0, None, 3.0, 2.0, 2.0])
+
+    def test_counts(self):
+        self.assertEqual(aggregate_column(self.column, "count"), 5)
+        self.assertEqual(aggregate_column(self.column, "count_missing"), 1)
+        self.assertEqual(aggregate_column(self.column, "count_distinct"), 4)
+
+    def test_statistics(self):
+        self.assertEqual(aggregate_column(self.column, "sum"), 12.0)
+        self.assertAlmostEqual(aggregate_column(self.column, "mean"), 2.4)
+        self.assertEqual(aggregate_column(self.column, "range"), 3.0)
+        self.assertEqual(aggregate_column(self.column, "median"), 2.0)
+        self.assertEqual(aggregate_column(self.column, "majority"), 2.0)
+        self.assertAlmostEqual(aggregate_column(self.column, "stdev_sample"), np.std([4, 1, 3, 2, 2], ddof=1))
+
+    def test_empty(self):
+        empty = pd.Series([np.nan, np.nan])
+        self.assertEqual(aggregate_column(empty, "sum"), 0)
+        self.assertIsNone(aggregate_column(empty, "mean"))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            aggregate_column(self.column, "unknown")
+        with self.assertRaises(TypeError):
+            aggregate_column(pd.Series(["a", "b"]), "sum")
+
+    def test_hinge_quartiles(self):
+        # values of QgsStatisticalSummary
+        self.assertEqual(_hinge_quartiles(np.array([1.0, 2.0, 3.0, 4.0])), (1.5, 3.5))
+        self.assertEqual(_hinge_quartiles(np.array([1.0, 2.0, 3.0, 4.0, 5.0])), (2.0, 4.0))
+        self.assertEqual(_hinge_quartiles(np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0])), (2.5, 5.5))
+
+    def test_groups(self):
+        keys = pd.Series(["a", "b", "a", None, "b", "a"])
+        self.assertEqual(aggregate_groups(self.column, keys, "count"), {"a": 2, "b": 2, None: 1})
+
+
+class SimplifyWkbTest(unittest.TestCase):
+    """Test geometry simplification"""
+
+    def test_simplify(self):
+        line = shapely.LineString([(0, 0), (1, 0.01), (2, 0), (3, 5)])
+        point = shapely.Point(1, 1)
+        geometries = np.array([shapely.to_wkb(line), None, shapely.to_wkb(point)], dtype=object)
+        simplified = simplify_wkb(geometries, 0.1, batch_size=2)
+        self.assertEqual(len(shapely.get_coordinates(shapely.from_wkb(simplified[0]))), 3)
+        self.assertIsNone(simplified[1])
+        self.assertEqual(simplified[2], geometries[2])
+
+    def test_small_geometries_are_kept(self):
+        polygon = shapely.box(0, 0, 0.01, 0.01)
+        simplified = simplify_wkb(np.array([shapely.to_wkb(polygon)], dtype=object), 1.0)
+        self.assertTrue(shapely.equals(shapely.from_wkb(simplified[0]), polygon))
+
+
+class CompactDataframeTest(unittest.TestCase):
+    """Test compacted columns"""
+
+    def setUp(self) -> None:
+        self.dataframe = pd.DataFrame({
+            "small": np.array([-3, 0, 100, 7] * 50, dtype=np.int64),
+            "nullable": pd.array([1, None, 30000, 2] * 50, dtype="Int64"),
+            "large": np.array([0, 2 ** 40, 1, 2] * 50, dtype=np.int64),
+            "kind": ["road", "rail", None, "road"] * 50,
+            "geometry": [b"\x01", None, b"\x02", b"\x03"] * 50,
+        })
+
+    def test_values_are_unchanged(self):
+        compacted, report = compact_dataframe(self.dataframe, skip_columns=(4,))
+        self.assertEqual(compacted["small"].dtype, np.int8)
+        self.assertEqual(compacted["nullable"].dtype, "Int16")
+        self.assertEqual(compacted["large"].dtype, np.int64)
+        self.assertIsInstance(compacted["kind"].dtype, pd.CategoricalDtype)
+        self.assertCountEqual(report, ["small", "nullable", "kind"])
+        for name in self.dataframe.columns:
+            self.assertEqual(
+                [None if pd.isna(value) else value for value in compacted[name]],
+                [None if pd.isna(value) else value for value in self.dataframe[name]],
+            )
+
+    def test_sort_order_is_unchanged(self):
+        compacted, _ = compact_dataframe(self.dataframe)
+        order_keys = (("kind", True, False), ("small", False, False))
+        np.testing.assert_array_equal(
+            sort_permutation(compacted, order_keys), sort_permutation(self.dataframe, order_keys)
+        )
+
+    def test_feature_ids_are_unchanged(self):
+        compacted, _ = compact_dataframe(self.dataframe)
+        for key_columns in (("small",), ("small", "kind"), ("nullable", "kind")):
+            np.testing.assert_array_equal(
+                key_feature_ids(compacted, key_columns), key_feature_ids(self.dataframe, key_columns)
+            )
+
+
+class HilbertDistancesTest(unittest.TestCase):
+    """Test positions along the Hilbert curve"""
+
+    def test_first_order(self):
+        x = np.array([0.0, 0.0, 1.0, 1.0])
+        y = np.array([0.0, 1.0, 1.0, 0.0])
+        self.assertEqual(hilbert_distances(x, y, (0.0, 0.0, 1.0, 1.0), order=1).tolist(), [0, 1, 2, 3])
+
+    def test_neighbours_are_consecutive(self):
+        x, y = np.meshgrid(np.arange(8.0), np.arange(8.0))
+        x, y = x.ravel(), y.ravel()
+        distances = hilbert_distances(x, y, (0.0, 0.0, 7.0, 7.0), order=3)
+        self.assertEqual(sorted(distances.tolist()), list(range(64)))
+        order = np.argsort(distances)
+        steps = np.abs(np.diff(x[order])) + np.abs(np.diff(y[order]))
+        self.assertTrue((steps == 1).all())
+
+    def test_missing_points_are_last(self):
+        distances = hilbert_distances(
+            np.array([np.nan, 5.0, 0.0]), np.array([0.0, 5.0, np.nan]), (0.0, 0.0, 5.0, 5.0), order=4
+        )
+        self.assertEqual(distances[0], distances[2])
+        self.assertGreater(distances[0], distances[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+# coding=utf-8
+"""Offline snapshot tests"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from delta_lake.provider.delta_lake_table import DeltaLakeTable
+from delta_lake.provider.offline_snapshot import OfflineSnapshot, write_snapshot
+
+
+class OfflineSnapshotTest(unittest.TestCase):
+    """Test saving and reading snapshots"""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_round_trip(self):
+        dataframe = pd.DataFrame({
+            "name": ["a", "b", None],
+            "geometry": [shapely.to_wkb(shapely.Point(1, 2)), None, shapely.to_wkb(shapely.Point(3, 5))],
+        })
+        table = DeltaLakeTable(dataframe, 4, 1)
+        table.attribute_index(0)
+        write_snapshot(self.directory, table, {"table_uri": "profile#s.s.t", "version": 4})
+        snapshot = OfflineSnapshot(self.directory)
+        self.assertEqual(snapshot.description["row_count"], 3)
+        self.assertEqual(snapshot.extent(), (1, 2, 3, 5))
+        pd.testing.assert_frame_equal(snapshot.read_dataframe(), dataframe)
+        self.assertEqual(len(snapshot.read_dataframe(limit=2)), 2)
+        restored = DeltaLakeTable(snapshot.read_dataframe(), 4, 1)
+        snapshot.restore(restored)
+        np.testing.assert_array_equal(restored.geometry_bounds(), table.geometry_bounds())
+        self.assertEqual(restored.attribute_index(0).rows_equal(["b"]).tolist(), [1])
+
+    def test_table_without_geometry(self):
+        dataframe = pd.DataFrame({"name": ["a", "b"], "value": [1.5, 2.5]})
+        write_snapshot(self.directory, DeltaLakeTable(dataframe, 1, None), {"version": 1})
+        snapshot = OfflineSnapshot(self.directory)
+        self.assertTrue(all(np.isnan(snapshot.extent())))
+        restored = DeltaLakeTable(snapshot.read_dataframe(), 1, None)
+        snapshot.restore(restored)
+        pd.testing.assert_frame_equal(restored.dataframe(), dataframe)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+# coding=utf-8
+"""Table loader tests"""
+
+import sys
+import threading
+import types
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from delta_lake.provider.delta_lake_table import DeltaLakeTable, DeltaLakeTableLoader, TableRegistry
+from delta_lake.provider.toolbelt.instrumentation import instrumentation, layer_key
+
+
+class CachedVersionTest(unittest.TestCase):
+    """Test reads of tables opened from cached metadata"""
+
+    def setUp(self) -> None:
+        self.versions = []
+        self.columns = ["name", "geometry"]
+        self.history_shared = True
+        delta_sharing = types.ModuleType("delta_sharing")
+        delta_sharing.load_as_pandas = self._load_as_pandas
+        patcher = mock.patch.dict(sys.modules, {"delta_sharing": delta_sharing})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loader = DeltaLakeTableLoader("profile.share#share.schema.table", 3, 1,
+                                           cached_columns=("name", "geometry"))
+
+    def _load_as_pandas(self, table_uri, limit=None, version=None):
+        self.versions.append(version)
+        if version is not None and not self.history_shared:
+            raise RuntimeError("Reading a table version needs its history")
+        return pd.DataFrame({name: [None] for name in self.columns})
+
+    def test_cached_version_is_read(self):
+        self.columns = ["name", "value", "geometry"]
+        self.loader._read()
+        self.assertEqual(self.versions, [3])
+
+    def test_latest_version_without_history(self):
+        self.history_shared = False
+        self.assertEqual(list(self.loader._read().columns), ["name", "geometry"])
+        self.loader._read(limit=10)
+        self.assertEqual(self.versions, [3, None, None])
+
+    def test_changed_columns_without_history(self):
+        self.history_shared = False
+        self.columns = ["name", "value", "geometry"]
+        with self.assertRaises(ValueError):
+            self.loader._read()
+
+
+class ConcurrentLoadTest(unittest.TestCase):
+    """Test previews while the whole table is being downloaded"""
+
+    def setUp(self) -> None:
+        self.download_started = threading.Event()
+        self.download_allowed = threading.Event()
+        delta_sharing = types.ModuleType("delta_sharing")
+        delta_sharing.load_as_pandas = self._load_as_pandas
+        patcher = mock.patch.dict(sys.modules, {"delta_sharing": delta_sharing})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.download_allowed.set)
+        self.loader = DeltaLakeTableLoader("profile.share#share.schema.table", 3, 1)
+
+    def _load_as_pandas(self, table_uri, limit=None, version=None):
+        if limit is None:
+            self.download_started.set()
+            self.assertTrue(self.download_allowed.wait(10))
+            limit = 100
+        return pd.DataFrame({"name": ["a"] * limit, "geometry": [None] * limit})
+
+    def test_preview_during_download(self):
+        tables = []
+        thread = threading.Thread(target=lambda: tables.append(self.loader.table()))
+        thread.start()
+        self.assertTrue(self.download_started.wait(10))
+        self.assertEqual(self.loader.preview(10).row_count(), 10)
+        self.assertIsNone(self.loader.known_file_statistics())
+        self.download_allowed.set()
+        thread.join(10)
+        self.assertEqual(tables[0].row_count(), 100)
+        # the whole table supersedes the preview
+        self.assertIs(self.loader.preview(10), tables[0])
+        self.loader.unload()
+
+
+class SharedSnapshotTest(unittest.TestCase):
+    """Test snapshots shared by the layers of the same table"""
+
+    def setUp(self) -> None:
+        self.downloads = 0
+        delta_sharing = types.ModuleType("delta_sharing")
+        delta_sharing.load_as_pandas = self._load_as_pandas
+        patcher = mock.patch.dict(sys.modules, {"delta_sharing": delta_sharing})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _load_as_pandas(self, table_uri, limit=None, version=None):
+        self.downloads += 1
+        return pd.DataFrame({"name": ["a", "b"], "geometry": [None, None]})
+
+    def loader(self, version: int = 3) -> DeltaLakeTableLoader:
+        return DeltaLakeTableLoader("profile.share#share.schema.shared", version, 1)
+
+    def test_loaders_of_the_same_table_share_a_snapshot(self):
+        loaders = [self.loader(), self.loader()]
+        table = loaders[0].table()
+        self.assertIs(loaders[1].table(), table)
+        self.assertEqual(self.downloads, 1)
+        self.assertEqual(table.reference_count(), 2)
+        # another version is another snapshot
+        other = self.loader(4)
+        self.assertIsNot(other.table(), table)
+        other.unload()
+        for loader in loaders:
+            loader.unload()
+
+    def test_release_frees_the_snapshot(self):
+        loaders = [self.loader(), self.loader()]
+        table = loaders[0].table()
+        loaders[1].table()
+        loaders[0].unload()
+        self.assertEqual(table.row_count(), 2)
+        loaders[1].unload()
+        self.assertEqual(table.nbytes(), 0)
+        # the registry holds no reference: the next layer downloads the table again
+        loader = self.loader()
+        self.assertIsNot(loader.table(), table)
+        self.assertEqual(self.downloads, 2)
+        loader.unload()
+
+    def test_register_keeps_the_first_snapshot(self):
+        registry = TableRegistry()
+        first = DeltaLakeTable(pd.DataFrame({"name": ["a"]}), 3, None).acquire()
+        second = DeltaLakeTable(pd.DataFrame({"name": ["a"]}), 3, None).acquire()
+        self.assertIs(registry.register("key", first), first)
+        self.assertIs(registry.register("key", second), first)
+        self.assertEqual(second.nbytes(), 0)
+        self.assertIs(registry.get("key"), first)
+        self.assertEqual(first.reference_count(), 3)
+        for _ in range(3):
+            first.release()
+        self.assertIsNone(registry.get("key"))
+
+
+class LayerCountersTest(unittest.TestCase):
+    """Test the keys of the counters of the layers"""
+
+    def setUp(self) -> None:
+        instrumentation.enabled = True
+        self.addCleanup(instrumentation.reset)
+        self.addCleanup(setattr, instrumentation, "enabled", False)
+
+    def test_layers_of_the_same_table(self):
+        table_uri = "profile.share#share.schema.table"
+        loaders = [
+            DeltaLakeTableLoader(table_uri, 3, 1, layer=layer_key(table_uri, number))
+            for number in (1, 2)
+        ]
+        instrumentation.count(loaders[0].layer_key(), "rows_loaded", 10)
+        instrumentation.count(loaders[1].layer_key(), "rows_loaded", 5)
+        self.assertEqual(
+            instrumentation.layer_counters(loaders[0].layer_key())["counters"], {"rows_loaded": 10}
+        )
+        self.assertEqual(len(instrumentation.as_dict()), 2)
+
+    def test_tables_of_other_profiles(self):
+        loaders = [
+            DeltaLakeTableLoader(f"{profile}#share.schema.table", 3, 1)
+            for profile in ("first.share", "second.share")
+        ]
+        self.assertNotEqual(loaders[0].layer_key(), loaders[1].layer_key())
+
+
+if __name__ == "__main__":
+    unittest.main()
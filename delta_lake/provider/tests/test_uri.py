@@ -11,6 +11,7 @@ from delta_lake.provider.delta_lake_provider import (
     _uri_intermediate_structure,
     encode_uri_from_values, decode_uri,
     relative_to_absolute_uri, absolute_to_relative_uri)
+from delta_lake.provider.delta_lake_grid_provider import decode_grid_uri, grid_uri_from_table_uri
 from qgis.core import (
     QgsReadWriteContext,
 )
@@ -59,6 +60,47 @@ class UriTest(unittest.TestCase):
                               "epsg_id": self.epsg_id}
                              )
 
+    def test_uri_options(self):
+        """Test the optional parameters"""
+        uri = encode_uri_from_values(self.connection_profile_path,
+                                     self.share_name, self.schema_name, self.table_name, self.epsg_id,
+                                     fid_columns="id,sub id")
+        self.assertTrue(uri.endswith(" fid_columns=id%2Csub+id"))
+        self.assertEqual(decode_uri(uri)["fid_columns"], "id,sub id")
+        self.assertNotIn("fid_columns", decode_uri(encode_uri_from_values(self.connection_profile_path,
+                                                                          self.share_name, self.schema_name,
+                                                                          self.table_name, self.epsg_id)))
+
+    def test_uri_time_travel(self):
+        """Test the version and timestamp parameters"""
+        uri = encode_uri_from_values(self.connection_profile_path,
+                                     self.share_name, self.schema_name, self.table_name, self.epsg_id,
+                                     version=3, timestamp="2024-01-31T00:00:00Z")
+        self.assertTrue(uri.endswith(" version=3 timestamp=2024-01-31T00%3A00%3A00Z"))
+        self.assertEqual(decode_uri(uri)["version"], "3")
+        self.assertEqual(decode_uri(uri)["timestamp"], "2024-01-31T00:00:00Z")
+
+    def test_uri_offline_path(self):
+        """Test the offline_path parameter"""
+        uri = encode_uri_from_values(self.connection_profile_path,
+                                     self.share_name, self.schema_name, self.table_name, self.epsg_id,
+                                     version=3, offline_path="/data/snapshots/table 1")
+        self.assertTrue(uri.endswith(" version=3 offline_path=%2Fdata%2Fsnapshots%2Ftable+1"))
+        self.assertEqual(decode_uri(uri)["offline_path"], "/data/snapshots/table 1")
+        self.assertEqual(relative_to_absolute_uri(uri, QgsReadWriteContext()), uri)
+
+    def test_grid_uri(self):
+        """Test the uri of the aggregation grid of a table"""
+        table_uri = encode_uri_from_values(self.connection_profile_path,
+                                           self.share_name, self.schema_name, self.table_name, self.epsg_id,
+                                           version=3)
+        uri = grid_uri_from_table_uri(table_uri, "hex", (("sum", "pop"), ("mean", "income")))
+        self.assertEqual(uri, table_uri + " grid_shape=hex grid_aggregates=sum%3Apop%2Cmean%3Aincome")
+        parts = decode_grid_uri(uri)
+        self.assertEqual(parts["grid_aggregates"], "sum:pop,mean:income")
+        self.assertEqual(parts["version"], "3")
+        self.assertNotIn("grid_shape", decode_uri(uri))
+
     def test_uri_relative_to_absolute(self):
         uri = (f"connection_profile_path={urllib.parse.quote_plus(self.connection_profile_path, safe='/')} "
                f"share_name={self.share_name} schema_name={self.schema_name} "
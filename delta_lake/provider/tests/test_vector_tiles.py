@@ -0,0 +1,106 @@
+# coding=utf-8
+"""Vector tiles tests"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import shapely
+
+from delta_lake.provider import vector_tiles
+from delta_lake.provider.vector_tiles import MBTilesWriter, tiles_of_geometries, write_mbtiles
+
+
+class TilesOfGeometriesTest(unittest.TestCase):
+    """Test the tiles each geometry is listed in"""
+
+    def setUp(self) -> None:
+        self.bounds = shapely.bounds(np.array([
+            shapely.Point(5e6, 5e6), None, shapely.box(-1e6, -1e6, 1e6, 1e6),
+        ], dtype=object))
+
+    def test_first_zoom_level(self):
+        tile_x, tile_y, rows = tiles_of_geometries(self.bounds, 0)
+        self.assertEqual(tile_x.tolist(), [0, 0])
+        self.assertEqual(tile_y.tolist(), [0, 0])
+        # missing geometries are in no tile
+        self.assertEqual(rows.tolist(), [0, 2])
+
+    def test_geometries_across_tiles(self):
+        tile_x, tile_y, rows = tiles_of_geometries(self.bounds, 1)
+        # sorted by tile, rows counted from the top
+        self.assertEqual(list(zip(tile_x.tolist(), tile_y.tolist(), rows.tolist())), [
+            (0, 0, 2), (0, 1, 2), (1, 0, 0), (1, 0, 2), (1, 1, 2),
+        ])
+
+    def test_geometries_beyond_the_square(self):
+        bounds = np.array([[-3e7, -3e7, -2.5e7, -2.5e7]])
+        tile_x, tile_y, rows = tiles_of_geometries(bounds, 2)
+        self.assertEqual((tile_x.tolist(), tile_y.tolist(), rows.tolist()), ([0], [3], [0]))
+
+
+class MBTilesWriterTest(unittest.TestCase):
+    """Test the MBTiles file layout"""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "tiles.mbtiles")
+
+    def test_tiles_and_metadata(self):
+        with open(self.path, "w") as file:
+            file.write("replaced")
+        writer = MBTilesWriter(self.path)
+        writer.write_tiles([(2, 1, 0, b"top"), (2, 1, 3, b"bottom")])
+        writer.write_metadata({"name": "layer", "json": {"vector_layers": []}})
+        writer.close()
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        # MBTiles counts rows from the bottom
+        self.assertEqual(
+            connection.execute("SELECT * FROM tiles ORDER BY tile_row").fetchall(),
+            [(2, 1, 0, b"bottom"), (2, 1, 3, b"top")],
+        )
+        metadata = dict(connection.execute("SELECT * FROM metadata").fetchall())
+        self.assertEqual(metadata["name"], "layer")
+        self.assertEqual(json.loads(metadata["json"]), {"vector_layers": []})
+
+
+@unittest.skipIf(vector_tiles.mapbox_vector_tile is None, "mapbox-vector-tile is not installed")
+class WriteMBTilesTest(unittest.TestCase):
+    """Test the tiles written for a layer"""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "tiles.mbtiles")
+        self.geometries = np.array([
+            shapely.Point(5e6, 5e6), None, shapely.box(-1e6, -1e6, 1e6, 1e6),
+        ], dtype=object)
+        self.attributes = {"name": ["point", "missing", "box"]}
+
+    def test_tiles(self):
+        tile_count = write_mbtiles(self.path, "layer", self.geometries, self.attributes, 0, 1, processes=0)
+        self.assertEqual(tile_count, 5)
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        self.assertEqual(connection.execute("SELECT count(*) FROM tiles").fetchone()[0], 5)
+        metadata = dict(connection.execute("SELECT * FROM metadata").fetchall())
+        self.assertEqual((metadata["minzoom"], metadata["maxzoom"]), ("0", "1"))
+
+    def test_cancelled_export_is_removed(self):
+        feedback = mock.Mock()
+        feedback.isCanceled.side_effect = [False, True]
+        tile_count = write_mbtiles(
+            self.path, "layer", self.geometries, self.attributes, 0, 1, processes=0, feedback=feedback
+        )
+        self.assertEqual(tile_count, 0)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+"""
+    Performance counters and timings of the layers, recorded in debug mode.
+"""
+
+# standard
+import json
+import threading
+import time
+from collections import Counter
+from typing import Union
+
+# project
+from .preferences import PluginOptionsManager
+from .tracing import tracer
+
+# (hits, misses) counters reported as hit rates
+HIT_RATES = {
+    "request_cache_hit_rate": ("request_cache_hits", "request_cache_misses"),
+    "metadata_cache_hit_rate": ("metadata_cache_hits", "metadata_cache_misses"),
+    "shared_table_hit_rate": ("shared_table_hits", "shared_table_misses"),
+}
+
+
+def layer_key(table_uri: str, layer_number: Union[int, None] = None) -> str:
+    """Returns the key of the counters of a layer: the url of its table, connection
+    profile included, and its number, so that layers of the same table keep their own
+
+    :param table_uri: table url, as understood by delta_sharing
+    :type table_uri: str
+    :param layer_number: number of the layer in the session, None for the table alone
+    :type layer_number: int
+    """
+    if layer_number is None:
+        return table_uri
+    return f"{table_uri} [{layer_number}]"
+
+
+class _Timer:
+    """Records the time spent in a with block, as a timing and a trace span"""
+
+    __slots__ = ("_instrumentation", "_layer", "_timing", "_start")
+
+    def __init__(self, instrumentation, layer: str, timing: str):
+        self._instrumentation = instrumentation
+        self._layer = layer
+        self._timing = timing
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._instrumentation.elapsed(self._layer, self._timing, self._start)
+        return False
+
+
+class _NullTimer:
+    """Timer doing nothing, used when instrumentation is off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Instrumentation:
+    """Counters and timings by layer, e.g. rows loaded or time spent selecting rows.
+
+    Recording only happens while :attr:`enabled`, which follows the ``debug_mode``
+    setting (see :meth:`refresh`): otherwise each call returns after one test.
+    Timings keep their count, total and maximum duration, in seconds. While the
+    tracer is enabled, they are also recorded as spans of the trace, see
+    :mod:`~delta_lake.provider.toolbelt.tracing`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}
+
+    def refresh(self, debug_mode=None) -> bool:
+        """Enables recording in debug mode
+
+        :param debug_mode: value of the debug_mode setting, read from the settings if None
+        :type debug_mode: bool
+        :return: whether recording is enabled
+        :rtype: bool
+        """
+        if debug_mode is None:
+            debug_mode = PluginOptionsManager.get_plg_settings().debug_mode
+        self.enabled = bool(debug_mode)
+        return self.enabled
+
+    @property
+    def timing(self) -> bool:
+        """Tells whether durations are recorded, as timings or trace spans"""
+        return self.enabled or tracer.enabled
+
+    def count(self, layer: str, counter: str, value: int = 1) -> None:
+        """Adds a value to a counter of a layer"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters.setdefault(layer, Counter())[counter] += value
+
+    def record(self, layer: str, timing: str, seconds: float) -> None:
+        """Adds a duration to a timing of a layer"""
+        if not self.enabled:
+            return
+        with self._lock:
+            statistics = self._timings.setdefault(layer, {}).setdefault(timing, [0, 0.0, 0.0])
+            statistics[0] += 1
+            statistics[1] += seconds
+            statistics[2] = max(statistics[2], seconds)
+
+    def elapsed(self, layer: str, timing: str, start: float, **args) -> None:
+        """Records the time elapsed since start, as a timing and a trace span
+
+        :param start: start of the timing, as returned by time.perf_counter
+        :type start: float
+        :param args: values shown with the span in the trace
+        """
+        seconds = time.perf_counter() - start
+        self.record(layer, timing, seconds)
+        tracer.add_span(timing, layer, start, seconds, args)
+
+    def timed(self, layer: str, timing: str):
+        """Returns a context manager recording the time spent in its block
+
+        :Example:
+
+        .. code-block:: python
+
+            with instrumentation.timed(layer, "row_selection"):
+                rows = select_rows()
+        """
+        if not self.timing:
+            return _NULL_TIMER
+        return _Timer(self, layer, timing)
+
+    def layer_counters(self, layer: str) -> dict:
+        """Returns the counters, timings and derived rates of a layer"""
+        with self._lock:
+            counters = dict(self._counters.get(layer, {}))
+            timings = {
+                name: {"count": count, "total_seconds": total, "max_seconds": maximum}
+                for name, (count, total, maximum) in self._timings.get(layer, {}).items()
+            }
+        rates = {}
+        for rate, (hits, misses) in HIT_RATES.items():
+            lookups = counters.get(hits, 0) + counters.get(misses, 0)
+            if lookups:
+                rates[rate] = counters.get(hits, 0) / lookups
+        iteration = timings.get("iteration")
+        if iteration and iteration["total_seconds"] > 0:
+            rates["features_per_second"] = (
+                counters.get("features_fetched", 0) / iteration["total_seconds"]
+            )
+        return {"counters": counters, "timings": timings, "rates": rates}
+
+    def as_dict(self) -> dict:
+        """Returns the counters of all the layers, by layer"""
+        with self._lock:
+            layers = sorted(set(self._counters) | set(self._timings))
+        return {layer: self.layer_counters(layer) for layer in layers}
+
+    def export_json(self, path: str) -> None:
+        """Writes the counters of all the layers to a JSON file"""
+        with open(path, "w", encoding="utf-8") as json_file:
+            json.dump(self.as_dict(), json_file, indent=2)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = {}
+            self._timings = {}
+
+
+# counters of all the layers
+instrumentation = Instrumentation()
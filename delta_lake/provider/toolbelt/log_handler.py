@@ -6,6 +6,7 @@ from typing import Callable
 # PyQGIS
 from qgis.core import QgsMessageLog, QgsMessageOutput
 from qgis.gui import QgsMessageBar
+from qgis.PyQt.QtCore import QCoreApplication, QThread
 from qgis.PyQt.QtWidgets import QPushButton, QWidget
 from qgis.utils import iface
 
@@ -107,7 +108,10 @@ class PluginLogger(logging.Handler):
         )
 
         # optionally, display message on QGIS Message bar (above the map canvas)
-        if push and iface is not None:
+        # widgets only live in the main thread: messages of the layers created or
+        # loaded in the background only go to the messages panel
+        if push and iface is not None \
+                and QThread.currentThread() == QCoreApplication.instance().thread():
             msg_bar = None
 
             # QGIS or custom dialog
@@ -24,6 +24,21 @@ class PluginSettingsStructure:
     debug_mode: bool = False
     version: str = __version__
 
+    # performance
+    read_ahead: bool = False
+    # tables of a project are downloaded in the background as soon as their layer is created
+    prefetch_on_open: bool = False
+    # number of tables downloaded at the same time
+    load_workers: int = 4
+    # memory the loaded tables of all layers may use, 0 for no limit
+    memory_budget_mb: int = 0
+    # tables evicted beyond the budget are written to a temporary directory and read back from it
+    memory_spill: bool = True
+    # repetitive strings and small integers are stored in compact types once loaded
+    compact_dtypes: bool = False
+    # spans of the loading and rendering threads are recorded, for a Chrome trace export
+    trace_enabled: bool = False
+
 
 class PluginOptionsManager:
     @staticmethod
@@ -0,0 +1,115 @@
+"""
+    Timeline of the loading and rendering activity, exported in the Chrome trace format
+    (chrome://tracing, https://ui.perfetto.dev).
+"""
+
+# standard
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# project
+from .preferences import PluginOptionsManager
+
+# spans kept, the oldest ones are dropped beyond
+TRACE_BUFFER_EVENTS = 100000
+
+
+class Tracer:
+    """Spans of the threads of the plugin, kept in a ring buffer.
+
+    A span is a named duration on the thread which ran it, e.g. a table download on a
+    worker of the load pool or a feature iteration on a render thread. Recording only
+    happens while :attr:`enabled`, which follows the ``trace_enabled`` setting (see
+    :meth:`refresh`).
+
+    :param capacity: number of spans kept
+    :type capacity: int
+    """
+
+    def __init__(self, capacity: int = TRACE_BUFFER_EVENTS):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._spans = deque(maxlen=capacity)
+        self._thread_names = {}
+        self._origin = time.perf_counter()
+
+    def refresh(self, trace_enabled=None) -> bool:
+        """Enables recording when the trace_enabled setting is on
+
+        :param trace_enabled: value of the trace_enabled setting, read from the settings if None
+        :type trace_enabled: bool
+        :return: whether recording is enabled
+        :rtype: bool
+        """
+        if trace_enabled is None:
+            trace_enabled = PluginOptionsManager.get_plg_settings().trace_enabled
+        self.enabled = bool(trace_enabled)
+        return self.enabled
+
+    def add_span(self, name: str, category: str, start: float, seconds: float,
+                 args: dict = None) -> None:
+        """Records a span of the current thread
+
+        :param name: name of the span, e.g. ``table_download``
+        :type name: str
+        :param category: category of the span, e.g. the table it concerns
+        :type category: str
+        :param start: start of the span, as returned by time.perf_counter
+        :type start: float
+        :param seconds: duration of the span
+        :type seconds: float
+        :param args: values shown with the span
+        :type args: dict
+        """
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        with self._lock:
+            self._thread_names[thread.ident] = thread.name
+            self._spans.append((name, category, start, seconds, thread.ident, args))
+
+    def chrome_trace(self) -> dict:
+        """Returns the recorded spans as a Chrome trace, with the names of their threads"""
+        with self._lock:
+            spans = list(self._spans)
+            thread_names = dict(self._thread_names)
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        for name, category, start, seconds, tid, args in spans:
+            event = {
+                "name": name, "cat": category, "ph": "X", "pid": pid, "tid": tid,
+                # microseconds since the tracer was created
+                "ts": (start - self._origin) * 1e6, "dur": seconds * 1e6,
+            }
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str) -> int:
+        """Writes the recorded spans to a Chrome trace JSON file
+
+        :param path: path of the file, replaced if it exists
+        :type path: str
+        :return: number of written spans
+        :rtype: int
+        """
+        trace = self.chrome_trace()
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(trace, trace_file)
+        return sum(1 for event in trace["traceEvents"] if event["ph"] == "X")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+            self._thread_names = {}
+
+
+# spans of all the layers
+tracer = Tracer()
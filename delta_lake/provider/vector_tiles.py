@@ -0,0 +1,453 @@
+"""
+    Mapbox Vector Tiles of a table, written to an MBTiles file and served over HTTP.
+
+    This module does not depend on QGIS: tiles are encoded by worker processes which
+    only import it.
+"""
+
+# standard
+from __future__ import annotations
+
+import gzip
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from typing import Union
+
+# 3rd party
+import numpy as np
+import shapely
+
+# optional dependencies
+try:
+    import mapbox_vector_tile
+except ImportError:
+    mapbox_vector_tile = None
+try:
+    import pyproj
+except ImportError:
+    pyproj = None
+
+# half of the width of the Web Mercator square, in meters
+WEB_MERCATOR_HALF_WIDTH = 20037508.342789244
+_EARTH_RADIUS = 6378137.0
+# resolution of the tiles, in tile units
+TILE_EXTENT = 4096
+# geometries are clipped to their tile plus this margin, in tile units, so that
+# strokes and labels do not stop at tile borders
+TILE_BUFFER = 64
+# number of tiles handed out to the encoding workers at once
+TILES_PER_CHUNK = 256
+
+
+def tile_size(zoom: int) -> float:
+    """Returns the width of the tiles of a zoom level, in Web Mercator meters"""
+    return 2 * WEB_MERCATOR_HALF_WIDTH / 2 ** zoom
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """Returns the bounds of a XYZ tile (rows counted from the top), in Web Mercator"""
+    size = tile_size(zoom)
+    return (
+        -WEB_MERCATOR_HALF_WIDTH + x * size, WEB_MERCATOR_HALF_WIDTH - (y + 1) * size,
+        -WEB_MERCATOR_HALF_WIDTH + (x + 1) * size, WEB_MERCATOR_HALF_WIDTH - y * size,
+    )
+
+
+def to_web_mercator(geometries: np.ndarray, crs: str) -> np.ndarray:
+    """Transforms geometries to Web Mercator
+
+    :param geometries: shapely geometries
+    :type geometries: np.ndarray
+    :param crs: CRS of the geometries, as an authority id (e.g. ``EPSG:28992``)
+    :type crs: str
+    """
+    if crs.upper() == "EPSG:3857":
+        return geometries
+    if pyproj is None:
+        raise ImportError("Vector tiles of tables not in EPSG:3857 need the pyproj package")
+    transformer = pyproj.Transformer.from_crs(crs, "EPSG:3857", always_xy=True)
+    return shapely.transform(geometries, lambda coordinates: np.column_stack(
+        transformer.transform(coordinates[:, 0], coordinates[:, 1])
+    ))
+
+
+def tiles_of_geometries(bounds: np.ndarray, zoom: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Lists the tiles of a zoom level each geometry intersects
+
+    :param bounds: (xmin, ymin, xmax, ymax) of each geometry in Web Mercator, NaN for
+        missing ones
+    :type bounds: np.ndarray
+    :param zoom: zoom level
+    :type zoom: int
+    :return: column and row of each tile, and the position of its geometry, sorted by tile
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray]
+    """
+    located = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+    bounds = bounds[located]
+    size = tile_size(zoom)
+    last = 2 ** zoom - 1
+    x0, x1 = (
+        np.clip(np.floor((bounds[:, i] + WEB_MERCATOR_HALF_WIDTH) / size), 0, last).astype(np.int64)
+        for i in (0, 2)
+    )
+    y0, y1 = (
+        np.clip(np.floor((WEB_MERCATOR_HALF_WIDTH - bounds[:, i]) / size), 0, last).astype(np.int64)
+        for i in (3, 1)
+    )
+    # one entry per (geometry, tile) pair, tiles of a geometry enumerated row by row
+    columns = x1 - x0 + 1
+    counts = columns * (y1 - y0 + 1)
+    geometries = np.repeat(np.arange(len(bounds)), counts)
+    starts = np.zeros(len(bounds), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    offsets = np.arange(len(geometries)) - starts[geometries]
+    tile_x = x0[geometries] + offsets % columns[geometries]
+    tile_y = y0[geometries] + offsets // columns[geometries]
+    order = np.lexsort((geometries, tile_y, tile_x))
+    return tile_x[order], tile_y[order], located[geometries[order]]
+
+
+def _mvt_value(value):
+    """Converts an attribute to a type vector tiles can hold, None to leave it out"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _field_type(values: list) -> str:
+    """Returns the type of an attribute in the TileJSON metadata, from its first value"""
+    value = next((value for value in values if value is not None), None)
+    if isinstance(value, bool):
+        return "Boolean"
+    if isinstance(value, (int, float)):
+        return "Number"
+    return "String"
+
+
+def encode_tile(layer_name: str, zoom: int, x: int, y: int, geometries_wkb: list,
+                properties: list) -> bytes:
+    """Encodes a tile, gzip compressed as MBTiles expects it
+
+    :param layer_name: name of the layer of the tile
+    :type layer_name: str
+    :param zoom: zoom level
+    :type zoom: int
+    :param x: column of the tile
+    :type x: int
+    :param y: row of the tile, counted from the top
+    :type y: int
+    :param geometries_wkb: WKB geometries in Web Mercator, clipped to the tile
+    :type geometries_wkb: list
+    :param properties: attributes of each geometry, by name
+    :type properties: list[dict]
+    """
+    features = [
+        {
+            "geometry": geometry_wkb,
+            "properties": {
+                name: _mvt_value(value)
+                for name, value in feature_properties.items() if value is not None
+            },
+        }
+        for geometry_wkb, feature_properties in zip(geometries_wkb, properties)
+    ]
+    tile = mapbox_vector_tile.encode(
+        [{"name": layer_name, "features": features}],
+        default_options={"quantize_bounds": tile_bounds(zoom, x, y), "extents": TILE_EXTENT},
+    )
+    return gzip.compress(tile)
+
+
+def _encode_tiles(tasks: list) -> list:
+    """Encodes several tiles in a worker process"""
+    return [(task[1], task[2], task[3], encode_tile(*task)) for task in tasks]
+
+
+class MBTilesWriter:
+    """Writes vector tiles to a new MBTiles file
+
+    :param path: path of the file, replaced if it exists
+    :type path: str
+    """
+
+    def __init__(self, path: str):
+        if os.path.exists(path):
+            os.remove(path)
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(
+            "CREATE TABLE metadata (name TEXT, value TEXT);"
+            "CREATE TABLE tiles ("
+            "zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);"
+        )
+
+    def write_tiles(self, tiles: list) -> None:
+        """Writes (zoom, x, y, data) tiles, with XYZ rows"""
+        self._connection.executemany(
+            "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+            # MBTiles counts rows from the bottom
+            [(zoom, x, 2 ** zoom - 1 - y, data) for zoom, x, y, data in tiles],
+        )
+
+    def write_metadata(self, metadata: dict) -> None:
+        self._connection.executemany("INSERT INTO metadata VALUES (?, ?)", [
+            (name, value if isinstance(value, str) else json.dumps(value))
+            for name, value in metadata.items()
+        ])
+
+    def close(self) -> None:
+        self._connection.execute(
+            "CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)"
+        )
+        self._connection.commit()
+        self._connection.close()
+
+
+def _lon_lat(x: float, y: float) -> tuple[float, float]:
+    """Converts Web Mercator coordinates to longitude and latitude"""
+    return (
+        math.degrees(x / _EARTH_RADIUS),
+        math.degrees(2 * math.atan(math.exp(y / _EARTH_RADIUS)) - math.pi / 2),
+    )
+
+
+def _python_executable() -> Union[str, None]:
+    """Returns the Python interpreter of the worker processes, None if it is not found.
+
+    Inside QGIS, sys.executable is usually the QGIS binary, which spawned workers would
+    launch instead of Python: the interpreter is then looked up under sys.exec_prefix.
+    """
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    if os.name == "nt":
+        names = ["pythonw.exe", "python.exe"]
+    else:
+        names = [
+            os.path.join("bin", f"python{sys.version_info.major}.{sys.version_info.minor}"),
+            os.path.join("bin", f"python{sys.version_info.major}"),
+        ]
+    for name in names:
+        executable = os.path.join(sys.exec_prefix, name)
+        if os.path.isfile(executable):
+            return executable
+    return None
+
+
+def write_mbtiles(path: str, layer_name: str, geometries: np.ndarray, attributes: dict[str, list],
+                  min_zoom: int, max_zoom: int, field_min_zooms: Union[dict[str, int], None] = None,
+                  processes: Union[int, None] = None, feedback=None) -> int:
+    """Writes the vector tiles of a layer to an MBTiles file.
+
+    At each zoom level, geometries are simplified to the resolution of the tiles and
+    clipped to them, then tiles are encoded by a pool of worker processes.
+
+    :param path: path of the file, replaced if it exists
+    :type path: str
+    :param layer_name: name of the layer in the tiles
+    :type layer_name: str
+    :param geometries: shapely geometries in Web Mercator, None for missing ones
+    :type geometries: np.ndarray
+    :param attributes: values of each attribute, aligned with the geometries
+    :type attributes: dict[str, list]
+    :param min_zoom: first zoom level
+    :type min_zoom: int
+    :param max_zoom: last zoom level
+    :type max_zoom: int
+    :param field_min_zooms: first zoom level of some attributes, to keep the tiles of
+        low zoom levels small; other attributes are in all tiles
+    :type field_min_zooms: dict[str, int]
+    :param processes: number of worker processes, 0 to encode in the calling thread,
+        None for one per CPU; tiles are encoded in the calling thread when no Python
+        interpreter is found for the workers
+    :type processes: int
+    :param feedback: progress and cancellation (setProgress, isCanceled), optional
+    :type feedback: QgsFeedback
+    :return: number of written tiles, 0 when cancelled: the file is then removed
+    :rtype: int
+    """
+    if mapbox_vector_tile is None:
+        raise ImportError("Vector tiles need the mapbox-vector-tile package")
+    field_min_zooms = field_min_zooms or {}
+    workers = processes if processes is not None else os.cpu_count() or 1
+    executor = None
+    if workers > 0:
+        executable = _python_executable()
+        if executable is None:
+            workers = 0
+        else:
+            context = get_context("spawn")
+            context.set_executable(executable)
+            executor = ProcessPoolExecutor(workers, mp_context=context)
+    writer = MBTilesWriter(path)
+    is_line_or_polygon = shapely.get_dimensions(geometries) > 0
+    tile_count = 0
+    cancelled = False
+    try:
+        for zoom in range(min_zoom, max_zoom + 1):
+            resolution = tile_size(zoom) / TILE_EXTENT
+            zoom_geometries = geometries.copy()
+            zoom_geometries[is_line_or_polygon] = shapely.simplify(
+                geometries[is_line_or_polygon], resolution, preserve_topology=False
+            )
+            bounds = shapely.bounds(zoom_geometries)
+            names = [name for name in attributes if field_min_zooms.get(name, min_zoom) <= zoom]
+            tile_x, tile_y, rows = tiles_of_geometries(bounds, zoom)
+            tile_starts = np.flatnonzero(
+                np.r_[True, (np.diff(tile_x) != 0) | (np.diff(tile_y) != 0)]
+            )
+            tile_stops = np.r_[tile_starts[1:], len(rows)]
+            for chunk_start in range(0, len(tile_starts), TILES_PER_CHUNK):
+                if feedback is not None and feedback.isCanceled():
+                    cancelled = True
+                    break
+                tasks = []
+                for start, stop in zip(tile_starts[chunk_start:chunk_start + TILES_PER_CHUNK],
+                                       tile_stops[chunk_start:chunk_start + TILES_PER_CHUNK]):
+                    x, y = int(tile_x[start]), int(tile_y[start])
+                    xmin, ymin, xmax, ymax = tile_bounds(zoom, x, y)
+                    margin = TILE_BUFFER * resolution
+                    tile_rows = rows[start:stop]
+                    clipped = shapely.clip_by_rect(
+                        zoom_geometries[tile_rows],
+                        xmin - margin, ymin - margin, xmax + margin, ymax + margin,
+                    )
+                    kept = ~shapely.is_empty(clipped)
+                    if not kept.any():
+                        continue
+                    tile_rows = tile_rows[kept]
+                    properties = [
+                        dict(zip(names, values))
+                        for values in zip(*(
+                            [attributes[name][row] for row in tile_rows] for name in names
+                        ))
+                    ] if names else [{}] * len(tile_rows)
+                    tasks.append((
+                        layer_name, zoom, x, y, shapely.to_wkb(clipped[kept]).tolist(), properties
+                    ))
+                if executor is None:
+                    tiles = _encode_tiles(tasks)
+                else:
+                    # each worker gets a share of the chunk
+                    share = max(1, len(tasks) // (workers * 4))
+                    tiles = [
+                        tile for encoded in executor.map(
+                            _encode_tiles, [tasks[i:i + share] for i in range(0, len(tasks), share)]
+                        ) for tile in encoded
+                    ]
+                writer.write_tiles(tiles)
+                tile_count += len(tiles)
+            if cancelled:
+                break
+            if feedback is not None:
+                feedback.setProgress(100 * (zoom - min_zoom + 1) / (max_zoom - min_zoom + 1))
+
+        if cancelled:
+            return 0
+        bounds = shapely.bounds(geometries)
+        if np.isnan(bounds).all():
+            west, south, east, north = -180.0, -85.0511, 180.0, 85.0511
+        else:
+            west, south = _lon_lat(*np.nanmin(bounds[:, :2], axis=0))
+            east, north = _lon_lat(*np.nanmax(bounds[:, 2:], axis=0))
+        writer.write_metadata({
+            "name": layer_name,
+            "format": "pbf",
+            "type": "overlay",
+            "minzoom": str(min_zoom),
+            "maxzoom": str(max_zoom),
+            "bounds": f"{west},{south},{east},{north}",
+            "center": f"{(west + east) / 2},{(south + north) / 2},{min_zoom}",
+            "json": {"vector_layers": [{
+                "id": layer_name,
+                "fields": {name: _field_type(values) for name, values in attributes.items()},
+                "minzoom": min_zoom,
+                "maxzoom": max_zoom,
+            }]},
+        })
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        writer.close()
+        if cancelled:
+            # without metadata, the file is not a valid MBTiles one
+            os.remove(path)
+    return tile_count
+
+
+class _TileRequestHandler(BaseHTTPRequestHandler):
+    _TILE_PATH = re.compile(r"^/(\d+)/(\d+)/(\d+)\.pbf$")
+
+    def do_GET(self):
+        match = self._TILE_PATH.match(self.path.split("?")[0])
+        if match is None:
+            self.send_error(404)
+            return
+        zoom, x, y = (int(group) for group in match.groups())
+        data = self.server.tile_server.tile(zoom, x, y)
+        if data is None:
+            # missing tiles are empty ones
+            self.send_response(204)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.mapbox-vector-tile")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TileServer:
+    """Serves the tiles of an MBTiles file at ``http://127.0.0.1:<port>/{z}/{x}/{y}.pbf``
+
+    The server runs on a background thread until :meth:`stop` is called.
+
+    :param path: path of the MBTiles file
+    :type path: str
+    :param port: port to listen to, 0 for any free port
+    :type port: int
+    """
+
+    def __init__(self, path: str, port: int = 0):
+        self._path = path
+        self._local = threading.local()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _TileRequestHandler)
+        self._server.daemon_threads = True
+        self._server.tile_server = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="delta_lake_tiles", daemon=True
+        )
+        self._thread.start()
+
+    def tile(self, zoom: int, x: int, y: int) -> Union[bytes, None]:
+        """Returns the gzip compressed data of a tile, None if it is empty"""
+        # sqlite connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(
+                f"file:{self._path}?mode=ro", uri=True
+            )
+        row = connection.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (zoom, x, 2 ** zoom - 1 - y),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def url_template(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/{{z}}/{{x}}/{{y}}.pbf"
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
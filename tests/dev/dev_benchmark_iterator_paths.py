@@ -0,0 +1,95 @@
+"""Script to roughly compare the iterator paths selected from the request flags
+
+The generic path (attributes and geometry) is timed against the attribute-only path
+(NoGeometry) and the geometry-only path (empty subset of attributes), on a synthetic
+table of points.
+
+Usage, with the Python interpreter of QGIS:
+
+    python tests/dev/dev_benchmark_iterator_paths.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, f"{Path('.').resolve()}")  # move into project package
+
+import numpy as np
+import pandas as pd
+import shapely
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsFeatureIterator,
+    QgsFeatureRequest,
+    QgsField,
+    QgsFields,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from delta_lake.provider.delta_lake_feature_iterator import DeltaLakeFeatureIterator
+from delta_lake.provider.delta_lake_table import DeltaLakeTable
+
+ROW_COUNT = 200_000
+
+qgs = QgsApplication([], False)
+qgs.initQgis()
+
+rng = np.random.default_rng(0)
+dataframe = pd.DataFrame(
+    {
+        "name": rng.choice(["a", "b", "c", "d"], ROW_COUNT),
+        "value": rng.random(ROW_COUNT),
+        "count": rng.integers(0, 1000, ROW_COUNT),
+        "geometry": shapely.to_wkb(shapely.points(rng.random((ROW_COUNT, 2)) * 1000)),
+    }
+)
+fields = QgsFields()
+fields.append(QgsField("name", QVariant.String))
+fields.append(QgsField("value", QVariant.Double))
+fields.append(QgsField("count", QVariant.Int))
+fields.append(QgsField("geometry", QVariant.ByteArray))
+table = DeltaLakeTable(dataframe, 0, 3).acquire()
+
+
+class BenchmarkSource:
+    """Stands for DeltaLakeFeatureSource, over the synthetic table"""
+
+    def isValid(self):
+        return True
+
+    def fields(self):
+        return fields
+
+    def crs(self):
+        return QgsCoordinateReferenceSystem("EPSG:3857")
+
+    def index_geometry_column(self):
+        return 3
+
+    def read_ahead(self):
+        return False
+
+    def table(self, limit=-1):
+        return table
+
+
+def iterate(request: QgsFeatureRequest) -> None:
+    iterator = QgsFeatureIterator(DeltaLakeFeatureIterator(BenchmarkSource(), request))
+    feature = QgsFeature()
+    while iterator.nextFeature(feature):
+        pass
+
+
+requests = {
+    "generic": QgsFeatureRequest(),
+    "attributes only": QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry),
+    "geometry only": QgsFeatureRequest().setSubsetOfAttributes([]),
+}
+for name, request in requests.items():
+    duration = min(timeit.repeat(lambda: iterate(request), number=1, repeat=3))
+    print(f"{name:>16}: {duration:.3f} s, {ROW_COUNT / duration:,.0f} features/s")
+
+qgs.exitQgis()